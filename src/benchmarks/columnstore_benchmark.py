@@ -0,0 +1,145 @@
+"""
+Benchmark the optional stat-table columnstore indexes: full-history scan time
+and nightly load time, with and without them.
+
+Run from src/:
+    python -m benchmarks.columnstore_benchmark
+
+For PlayerStatistics and TeamStatistics this
+  - builds the NCCI_* index if it is missing and logs the build time,
+  - times a per-game aggregate and a full fetch of every row, reading the
+    columnstore index (batch mode) and then the rowstore with
+    IGNORE_NONCLUSTERED_COLUMNSTORE_INDEX,
+  - times a nightly-sized load (delete and re-insert the newest
+    BENCHMARK_LOAD_GAMES games, default 15, then update them as a MERGE
+    would) with the index enabled and disabled, rolling each load back.
+
+DB_* must point at a disposable local copy: indexes are built, disabled and
+rebuilt. BENCHMARK_KEEP_COLUMNSTORE=0 drops the indexes again at the end.
+"""
+import os
+import sys
+import time
+from utils.db_utils import get_db_connection
+from benchmarks.results import log_message
+
+INDEXES = {
+    'PlayerStatistics': 'NCCI_PlayerStatistics',
+    'TeamStatistics': 'NCCI_TeamStatistics',
+}
+
+FETCH_ROWS = 50000
+
+
+def get_columns(cursor, table):
+    cursor.execute("SELECT name FROM sys.columns WHERE object_id = OBJECT_ID(?) ORDER BY column_id", table)
+    return [row[0] for row in cursor.fetchall()]
+
+
+def ensure_index(cursor, table, index):
+    """Create the columnstore index on every column if it is missing; returns build seconds or None"""
+    cursor.execute("SELECT is_disabled FROM sys.indexes WHERE object_id = OBJECT_ID(?) AND name = ?", table, index)
+    existing = cursor.fetchone()
+    if existing:
+        if existing[0]:
+            cursor.execute(f"ALTER INDEX [{index}] ON [{table}] REBUILD")  # left disabled by an interrupted run
+            cursor.commit()
+        return None
+    column_list = ', '.join(f"[{column}]" for column in get_columns(cursor, table))
+    start_time = time.time()
+    cursor.execute(f"CREATE NONCLUSTERED COLUMNSTORE INDEX [{index}] ON [{table}] ({column_list}) "
+                   "WITH (MAXDOP = 1)")
+    cursor.commit()
+    return time.time() - start_time
+
+
+def time_query(cursor, query):
+    """Seconds to run query and fetch every row"""
+    start_time = time.time()
+    cursor.execute(query)
+    while cursor.fetchmany(FETCH_ROWS):
+        pass
+    return time.time() - start_time
+
+
+def time_scans(cursor, table, index):
+    """Aggregate and full-fetch times for the columnstore and rowstore paths"""
+    aggregate = f"SELECT gameId, COUNT(*), SUM(CAST(assists AS bigint)) FROM [{table}] {{hint}} GROUP BY gameId {{option}}"
+    full = f"SELECT * FROM [{table}] {{hint}} {{option}}"
+    results = {}
+    for name, query in [('aggregate', aggregate), ('full fetch', full)]:
+        results[f'{name} columnstore'] = time_query(
+            cursor, query.format(hint=f"WITH (INDEX({index}))", option=''))
+        results[f'{name} rowstore'] = time_query(
+            cursor, query.format(hint='', option='OPTION (IGNORE_NONCLUSTERED_COLUMNSTORE_INDEX)'))
+    return results
+
+
+def time_load(cursor, table, games):
+    """Seconds for a nightly-sized delete, re-insert and update of the given games, rolled back"""
+    columns = get_columns(cursor, table)
+    column_list = ', '.join(f"[{column}]" for column in columns)
+    id_list = ', '.join(str(game_id) for game_id in games)
+    cursor.execute("SELECT OBJECTPROPERTY(OBJECT_ID(?), 'TableHasIdentity')", table)
+    has_identity = cursor.fetchone()[0] == 1
+
+    cursor.execute(f"SELECT {column_list} INTO #LoadSource FROM [{table}] WHERE gameId IN ({id_list})")
+    try:
+        start_time = time.time()
+        cursor.execute(f"DELETE FROM [{table}] WHERE gameId IN ({id_list})")
+        if has_identity:
+            cursor.execute(f"SET IDENTITY_INSERT [{table}] ON")
+        cursor.execute(f"INSERT INTO [{table}] ({column_list}) SELECT {column_list} FROM #LoadSource")
+        if has_identity:
+            cursor.execute(f"SET IDENTITY_INSERT [{table}] OFF")
+        cursor.execute(f"UPDATE [{table}] SET assists = ISNULL(assists, 0) + 1 WHERE gameId IN ({id_list})")
+        elapsed = time.time() - start_time
+    finally:
+        cursor.rollback()
+    return elapsed
+
+
+def main():
+    if 'rds.amazonaws.com' in os.getenv('DB_SERVER', ''):
+        sys.exit("columnstore_benchmark rebuilds indexes; point DB_* at a local copy, not RDS")
+
+    load_games = int(os.getenv('BENCHMARK_LOAD_GAMES', 15))
+    keep = os.getenv('BENCHMARK_KEEP_COLUMNSTORE', '1') == '1'
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"SELECT TOP ({load_games}) gameId FROM Games ORDER BY gameDate DESC")
+        games = [row[0] for row in cursor.fetchall()]
+        cursor.commit()
+
+        for table, index in INDEXES.items():
+            log_message(f"{'='*50}")
+            build_time = ensure_index(cursor, table, index)
+            if build_time is not None:
+                log_message(f"{index}: built in {build_time:.1f}s")
+
+            for name, seconds in time_scans(cursor, table, index).items():
+                log_message(f"{table} {name}: {seconds:.2f}s")
+            cursor.commit()
+
+            with_index = time_load(cursor, table, games)
+            cursor.execute(f"ALTER INDEX [{index}] ON [{table}] DISABLE")
+            cursor.commit()
+            try:
+                without_index = time_load(cursor, table, games)
+            finally:
+                cursor.execute(f"ALTER INDEX [{index}] ON [{table}] REBUILD")
+                cursor.commit()
+            log_message(f"{table} load of {len(games)} games: {with_index:.2f}s with columnstore, "
+                        f"{without_index:.2f}s without")
+
+            if not keep:
+                cursor.execute(f"DROP INDEX [{index}] ON [{table}]")
+                cursor.commit()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark indexed single-season reads of an exported CSV against a full
+pandas load, and check both return the same rows.
+
+Run from src/ with BENCHMARK_EXPORT_DIR pointing at an uncompressed export
+(OUTPUT_COMPRESSION=none, OUTPUT_VOLUME_MB=0):
+    python -m benchmarks.csv_index_benchmark
+
+For each view CSV there (BENCHMARK_FILES, default PlayerStatistics.csv,
+TeamStatistics.csv and Games.csv) this times, best of BENCHMARK_REPEATS
+(default 3):
+  - pd.read_csv of the whole file filtered to the season,
+  - IndexedCsv.season(), which parses only that season's byte range, and
+  - IndexedCsv.game() for the newest game in the season.
+BENCHMARK_SEASON picks the season (default: the newest in the index).
+No database connection is made.
+"""
+import os
+import sys
+import time
+import pandas as pd
+from utils.csv_index import IndexedCsv, index_path, season_of
+from benchmarks.results import log_message
+
+
+def best_of(repeats, function):
+    """(best seconds, result of the last call)"""
+    best = None
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def same_rows(expected, actual):
+    """Equal values; dtypes may differ where a slice happens to hold no NULLs"""
+    try:
+        pd.testing.assert_frame_equal(expected, actual, check_dtype=False)
+        return True
+    except AssertionError:
+        return False
+
+
+def full_load_season(csv_path, season):
+    df = pd.read_csv(csv_path)
+    return df[df['gameId'].map(season_of) == season].reset_index(drop=True)
+
+
+def benchmark_file(csv_path, season, repeats):
+    with IndexedCsv(csv_path) as indexed:
+        season = season or indexed.seasons[0]
+        full_time, expected = best_of(repeats, lambda: full_load_season(csv_path, season))
+        indexed_time, actual = best_of(repeats, lambda: indexed.season(season))
+        if not same_rows(expected, actual):
+            log_message(f"{csv_path}: indexed read of {season} differs from the full load "
+                        f"({len(actual)} rows vs {len(expected)})")
+            return False
+
+        game_id = int(expected['gameId'].iloc[0]) if len(expected) else None
+        game_time = None
+        if game_id is not None:
+            game_time, game_df = best_of(repeats, lambda: indexed.game(game_id))
+            if not same_rows(expected[expected['gameId'] == game_id].reset_index(drop=True), game_df):
+                log_message(f"{csv_path}: indexed read of game {game_id} differs from the full load")
+                return False
+
+    size_mb = os.path.getsize(csv_path) / 1024 / 1024
+    log_message(f"{csv_path} ({size_mb:.1f} MB), season {season}, {len(expected)} rows: "
+                f"full load {full_time:.2f}s, indexed {indexed_time:.3f}s "
+                f"({full_time / max(indexed_time, 1e-9):.1f}x faster)")
+    if game_time is not None:
+        log_message(f"{csv_path}: single game {game_id} indexed in {game_time * 1000:.1f}ms")
+    return True
+
+
+def main():
+    export_dir = os.getenv('BENCHMARK_EXPORT_DIR', '.')
+    files = os.getenv('BENCHMARK_FILES', 'PlayerStatistics.csv,TeamStatistics.csv,Games.csv').split(',')
+    season = os.getenv('BENCHMARK_SEASON')
+    repeats = int(os.getenv('BENCHMARK_REPEATS', 3))
+
+    ok = True
+    for name in files:
+        csv_path = os.path.join(export_dir, name.strip())
+        if not os.path.exists(index_path(csv_path)):
+            log_message(f"{csv_path}: no sidecar index, skipping")
+            continue
+        log_message(f"{'='*50}")
+        ok = benchmark_file(csv_path, season, repeats) and ok
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark create_sql_dump: dump throughput from the configured database and
+restore time of the output on a local SQL Server instance, for both the
+INSERT script and the bulk-format export.
+
+Run from src/:
+    python -m benchmarks.dump_benchmark
+
+The source database comes from the usual DB_* variables. The restore target is
+LOCAL_DB_SERVER / LOCAL_DB_USERNAME / LOCAL_DB_PASSWORD (defaults suit the
+mcr.microsoft.com/mssql/server container on localhost). Each restore drops and
+recreates NBA_Database on that server, so never point it at RDS.
+
+BULK INSERT reads data files from the server's filesystem. When the server runs
+in a container, mount the bulk output directory into it and set
+BENCHMARK_BULK_SERVER_DIR to the path the container sees.
+BENCHMARK_MODES selects what runs (default "sql,bulk"; "sharded" restores the
+sharded dump stage by stage with up to BENCHMARK_RESTORE_WORKERS concurrent
+sqlcmd sessions per stage).
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from utils.db_utils import get_db_connection
+from create_sql_dump import create_bulk_dump, create_dump, create_sharded_dump
+from benchmarks.results import log_message
+
+
+def restore_dump(filename, variables=None):
+    """Replay a script with sqlcmd against the local instance and return the elapsed seconds"""
+    command = [
+        'sqlcmd',
+        '-S', os.getenv('LOCAL_DB_SERVER', 'localhost'),
+        '-U', os.getenv('LOCAL_DB_USERNAME', 'sa'),
+        '-P', os.getenv('LOCAL_DB_PASSWORD', ''),
+        '-b',  # stop on the first error so a broken dump can't report a fast restore
+        '-i', filename,
+    ]
+    for name, value in (variables or {}).items():
+        command += ['-v', f'{name}={value}']
+    start_time = time.time()
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+    return time.time() - start_time
+
+
+def restore_sharded(output_dir):
+    """Restore a sharded dump from its manifest, loading each stage's files concurrently"""
+    with open(os.path.join(output_dir, 'manifest.json'), encoding='utf-8') as f:
+        manifest = json.load(f)
+    workers = int(os.getenv('BENCHMARK_RESTORE_WORKERS', 4))
+
+    start_time = time.time()
+    restore_dump(os.path.join(output_dir, manifest['schema']))
+    for stage in manifest['stages']:
+        files = [os.path.join(output_dir, shard['file']) for table in stage for shard in table['files']]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(restore_dump, files))
+    restore_dump(os.path.join(output_dir, manifest['constraints']))
+    return time.time() - start_time
+
+
+def report(label, dump_bytes, dump_time, restore_time):
+    dump_mb = dump_bytes / 1024 / 1024
+    log_message(f"{label} dump: {dump_mb:.1f} MB in {dump_time:.1f}s ({dump_mb / dump_time:.2f} MB/s)")
+    log_message(f"{label} restore: {restore_time:.1f}s ({dump_mb / restore_time:.2f} MB/s)")
+
+
+def main():
+    modes = os.getenv('BENCHMARK_MODES', 'sql,bulk').split(',')
+    filename = os.getenv('BENCHMARK_DUMP_FILE', 'NBA_Database.benchmark.sql')
+    bulk_dir = os.path.abspath(os.getenv('BENCHMARK_BULK_DIR', 'NBA_Database_bulk.benchmark'))
+    shard_dir = os.getenv('BENCHMARK_SHARD_DIR', 'NBA_Database_shards.benchmark')
+    results = {}
+
+    conn = get_db_connection()
+    try:
+        if 'sql' in modes:
+            start_time = time.time()
+            dump_bytes = create_dump(conn, filename)
+            results['sql'] = (dump_bytes, time.time() - start_time)
+        if 'bulk' in modes:
+            start_time = time.time()
+            dump_bytes = create_bulk_dump(conn, bulk_dir)
+            results['bulk'] = (dump_bytes, time.time() - start_time)
+        if 'sharded' in modes:
+            start_time = time.time()
+            dump_bytes = create_sharded_dump(conn, shard_dir)
+            results['sharded'] = (dump_bytes, time.time() - start_time)
+    finally:
+        conn.close()
+
+    if 'sql' in results:
+        report('INSERT script', *results['sql'], restore_dump(filename))
+    if 'bulk' in results:
+        server_dir = os.getenv('BENCHMARK_BULK_SERVER_DIR', bulk_dir)
+        restore_time = restore_dump(os.path.join(bulk_dir, 'restore.sql'), {'DataDir': server_dir})
+        report('Bulk format', *results['bulk'], restore_time)
+    if 'sharded' in results:
+        report('Sharded', *results['sharded'], restore_sharded(shard_dir))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
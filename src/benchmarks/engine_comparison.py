@@ -0,0 +1,102 @@
+"""
+Compare EXPORT_ENGINE=server and EXPORT_ENGINE=local on the same database:
+whether they write the same Detailed* CSVs, and what each costs RDS in CPU.
+
+Build the dataset first (see benchmarks.synthetic_db), then run from src/:
+    python -m benchmarks.engine_comparison
+
+export_tables.py runs once per engine in its own directory under
+COMPARISON_OUTPUT_DIR (default: a temporary directory), uncompressed and in
+one volume so the files can be compared byte for byte. Per view it logs
+whether the two CSVs are identical (or the first line where they differ),
+and both engines' wall time and RDS session CPU time side by side, from the
+'view' metrics each run records. Outputs are removed afterwards unless
+COMPARISON_KEEP_OUTPUT=1 or something differed.
+"""
+import filecmp
+import json
+import os
+import shutil
+import sys
+import tempfile
+from itertools import zip_longest
+from benchmarks.results import log_message
+from benchmarks.export_harness import run_script, STDOUT_FILE, METRICS_FILE
+
+ENGINES = ['server', 'local']
+VIEW_FILES = {
+    'DetailedGames': 'Games.csv',
+    'DetailedTeamStatistics': 'TeamStatistics.csv',
+    'DetailedPlayerStatistics': 'PlayerStatistics.csv',
+}
+
+
+def view_costs(metrics_path):
+    """{view: (seconds, RDS CPU seconds)} from a run's 'view' metrics"""
+    costs = {}
+    with open(metrics_path, encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line) if line.strip() else {}
+            if record.get('stage') == 'view':
+                costs[record['table']] = (record['duration_ms'] / 1000, record['rds_cpu_ms'] / 1000)
+    return costs
+
+
+def first_difference(left_path, right_path):
+    """1-based line number and both lines where two text files first differ"""
+    with open(left_path, encoding='utf-8') as left, open(right_path, encoding='utf-8') as right:
+        for number, (left_line, right_line) in enumerate(zip_longest(left, right), start=1):
+            if left_line != right_line:
+                return number, (left_line or '<end of file>').rstrip('\n'), (right_line or '<end of file>').rstrip('\n')
+    return None
+
+
+def main():
+    base_dir = os.getenv('COMPARISON_OUTPUT_DIR') or tempfile.mkdtemp(prefix='nba_engine_comparison_')
+    keep_output = os.getenv('COMPARISON_KEEP_OUTPUT', '0') == '1'
+
+    costs = {}
+    for engine in ENGINES:
+        output_dir = os.path.join(base_dir, engine)
+        shutil.rmtree(output_dir, ignore_errors=True)
+        os.makedirs(output_dir)
+        env = dict(os.environ, EXPORT_ENGINE=engine, OUTPUT_COMPRESSION='none', OUTPUT_VOLUME_MB='0',
+                   METRICS_FORMAT='json', METRICS_FILE=os.path.join(output_dir, METRICS_FILE))
+        log_message(f"Running export_tables.py with EXPORT_ENGINE={engine} in {output_dir}")
+        exit_code, seconds, _ = run_script('export_tables.py', env, output_dir)
+        if exit_code != 0:
+            sys.exit(f"{engine} export failed with exit code {exit_code}; "
+                     f"see {os.path.join(output_dir, STDOUT_FILE)}")
+        costs[engine] = view_costs(os.path.join(output_dir, METRICS_FILE))
+        log_message(f"{engine} export finished in {seconds:.1f}s")
+
+    differences = 0
+    for view, file_name in VIEW_FILES.items():
+        server_path, local_path = (os.path.join(base_dir, engine, file_name) for engine in ENGINES)
+        if filecmp.cmp(server_path, local_path, shallow=False):
+            outcome = 'identical'
+        else:
+            differences += 1
+            number, server_line, local_line = first_difference(server_path, local_path)
+            outcome = f"DIFFERENT from line {number}:\n  server: {server_line}\n  local:  {local_line}"
+        (server_seconds, server_cpu), (local_seconds, local_cpu) = (
+            costs[engine].get(view, (0.0, 0.0)) for engine in ENGINES)
+        log_message(f"{view}: server {server_seconds:.1f}s, RDS CPU {server_cpu:.1f}s; "
+                    f"local {local_seconds:.1f}s, RDS CPU {local_cpu:.1f}s; {outcome}")
+
+    server_cpu, local_cpu = (sum(cpu for _, cpu in costs[engine].values()) for engine in ENGINES)
+    log_message(f"All views: RDS CPU server {server_cpu:.1f}s, local {local_cpu:.1f}s"
+                + (f" ({(1 - local_cpu / server_cpu) * 100:.0f}% less with local)" if server_cpu else ''))
+
+    if differences:
+        log_message(f"{differences} view(s) differ; outputs kept in {base_dir}")
+        sys.exit(1)
+    if not keep_output:
+        for engine in ENGINES:
+            shutil.rmtree(os.path.join(base_dir, engine), ignore_errors=True)
+        if not os.getenv('COMPARISON_OUTPUT_DIR'):
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
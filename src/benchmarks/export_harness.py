@@ -0,0 +1,178 @@
+"""
+Run each exporter against the configured database and record its throughput,
+peak RSS and output size, as a baseline for export changes.
+
+Build the dataset first (see benchmarks.synthetic_db), then run from src/:
+    python -m benchmarks.export_harness
+
+Each run is the real script in a fresh directory under HARNESS_OUTPUT_DIR
+(default: a temporary directory), with its own environment on top of yours:
+  export-server  export_tables.py, EXPORT_ENGINE=server
+  export-local   export_tables.py, EXPORT_ENGINE=local
+  dump-sql       create_sql_dump.py, DUMP_FORMAT=sql
+  dump-bulk      create_sql_dump.py, DUMP_FORMAT=bulk
+HARNESS_RUNS picks a subset (default: all). Rows come from the scripts' own
+"write" stage metrics, peak RSS from the kernel's accounting for the child
+process, and output size from every file the run leaves behind except its log,
+metrics and metadata sidecars. Results are appended to HARNESS_RESULTS (default
+export_harness_results.jsonl) with the commit and the database's row counts,
+and compared with the previous result for the same run on the same data.
+Outputs are removed after measuring unless HARNESS_KEEP_OUTPUT=1.
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from utils.db_utils import get_db_connection
+from utils.output_writer import METADATA_DIR
+from benchmarks.results import git_commit, load_results, log_message
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RUNS = {
+    'export-server': ('export_tables.py', {'EXPORT_ENGINE': 'server'}),
+    'export-local': ('export_tables.py', {'EXPORT_ENGINE': 'local'}),
+    'dump-sql': ('create_sql_dump.py', {'DUMP_FORMAT': 'sql'}),
+    'dump-bulk': ('create_sql_dump.py', {'DUMP_FORMAT': 'bulk'}),
+}
+STDOUT_FILE = 'harness.stdout.log'
+METRICS_FILE = 'harness.metrics.jsonl'
+SCALE_TABLES = ['Games', 'TeamStatistics', 'PlayerStatistics']
+
+
+def database_scale():
+    """Row counts of the big tables, so results are only compared on the same data"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        scale = {}
+        for table in SCALE_TABLES:
+            cursor.execute(f"SELECT SUM(row_count) FROM sys.dm_db_partition_stats "
+                           f"WHERE object_id = OBJECT_ID('dbo.{table}') AND index_id IN (0, 1)")
+            scale[table] = int(cursor.fetchone()[0] or 0)
+        return scale
+    finally:
+        conn.close()
+
+
+def run_script(script, env, output_dir):
+    """Run script in output_dir; returns (exit code, seconds, peak RSS in bytes)"""
+    with open(os.path.join(output_dir, STDOUT_FILE), 'wb') as stdout:
+        start_time = time.time()
+        process = subprocess.Popen([sys.executable, os.path.join(SRC_DIR, script)], cwd=output_dir,
+                                   env=env, stdout=stdout, stderr=subprocess.STDOUT)
+        # wait4 reports this child's own rusage, unlike RUSAGE_CHILDREN which
+        # keeps the maximum over every child so far
+        _, status, usage = os.wait4(process.pid, 0)
+        seconds = time.time() - start_time
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return process.returncode, seconds, usage.ru_maxrss * 1024  # ru_maxrss is KB on Linux
+
+
+def rows_written(metrics_path):
+    if not os.path.exists(metrics_path):
+        return 0
+    with open(metrics_path, encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return sum(record.get('rows', 0) for record in records if record.get('stage') == 'write')
+
+
+def output_bytes(output_dir):
+    """Size of what a run publishes: its outputs, without sidecars, logs or metrics"""
+    total = 0
+    for root, directories, files in os.walk(output_dir):
+        directories[:] = [name for name in directories if name != METADATA_DIR]
+        for name in files:
+            if name not in (STDOUT_FILE, METRICS_FILE) and not name.endswith('.log'):
+                total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def compare(result, previous, threshold_pct):
+    """Log the change against previous and return the regressions found"""
+    speed_change = (result['rows_per_sec'] / previous['rows_per_sec'] - 1) * 100
+    memory_change = (result['peak_rss_mb'] / previous['peak_rss_mb'] - 1) * 100
+    size_change = (result['output_mb'] / previous['output_mb'] - 1) * 100 if previous['output_mb'] else 0
+    log_message(f"  vs {previous['timestamp']} ({previous.get('commit')}): rows/sec {speed_change:+.1f}%, "
+                f"peak RSS {memory_change:+.1f}%, output {size_change:+.1f}%")
+    regressions = []
+    if speed_change < -threshold_pct:
+        regressions.append(f"{result['run']}: rows/sec down {-speed_change:.1f}%")
+    if memory_change > threshold_pct:
+        regressions.append(f"{result['run']}: peak RSS up {memory_change:.1f}%")
+    return regressions
+
+
+def main():
+    names = [name.strip() for name in os.getenv('HARNESS_RUNS', ','.join(RUNS)).split(',') if name.strip()]
+    unknown = [name for name in names if name not in RUNS]
+    if unknown:
+        sys.exit(f"Unknown HARNESS_RUNS {unknown}; choose from {', '.join(RUNS)}")
+    results_path = os.path.abspath(os.getenv('HARNESS_RESULTS', 'export_harness_results.jsonl'))
+    threshold_pct = float(os.getenv('BENCHMARK_REGRESSION_PCT', 10))
+    keep_output = os.getenv('HARNESS_KEEP_OUTPUT', '0') == '1'
+    base_dir = os.getenv('HARNESS_OUTPUT_DIR') or tempfile.mkdtemp(prefix='nba_export_harness_')
+    history = load_results(results_path)
+    commit = git_commit()
+    scale = database_scale()
+    log_message(f"Database scale: {scale}")
+
+    regressions = []
+    failed = []
+    for name in names:
+        script, overrides = RUNS[name]
+        output_dir = os.path.join(base_dir, name)
+        shutil.rmtree(output_dir, ignore_errors=True)
+        os.makedirs(output_dir)
+        env = dict(os.environ, METRICS_FORMAT='json', METRICS_FILE=os.path.join(output_dir, METRICS_FILE),
+                   **overrides)
+
+        log_message(f"Running {name} ({script}, {overrides}) in {output_dir}")
+        exit_code, seconds, peak_rss = run_script(script, env, output_dir)
+        if exit_code != 0:
+            log_message(f"{name} failed with exit code {exit_code}; see {os.path.join(output_dir, STDOUT_FILE)}")
+            failed.append(name)
+            continue
+
+        rows = rows_written(os.path.join(output_dir, METRICS_FILE))
+        result = {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': commit,
+            'run': name,
+            'settings': overrides,
+            'scale': scale,
+            'seconds': round(seconds, 2),
+            'rows': rows,
+            'rows_per_sec': round(rows / seconds, 1),
+            'peak_rss_mb': round(peak_rss / 1024 / 1024, 1),
+            'output_mb': round(output_bytes(output_dir) / 1024 / 1024, 1),
+        }
+        log_message(f"{name}: {rows} rows in {seconds:.1f}s, {result['rows_per_sec']:.0f} rows/sec, "
+                    f"peak RSS {result['peak_rss_mb']:.0f} MB, output {result['output_mb']:.0f} MB")
+
+        previous = [entry for entry in history if entry['run'] == name and entry['scale'] == scale
+                    and entry['settings'] == overrides]
+        if previous:
+            regressions += compare(result, previous[-1], threshold_pct)
+        with open(results_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(result) + '\n')
+        if not keep_output:
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+    if not keep_output and not failed and not os.getenv('HARNESS_OUTPUT_DIR'):
+        shutil.rmtree(base_dir, ignore_errors=True)
+    log_message(f"Results appended to {results_path}")
+    for regression in regressions:
+        log_message(f"REGRESSION: {regression}")
+    if failed:
+        log_message(f"FAILED: {', '.join(failed)}")
+    if regressions or failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+In-process stand-in for the pyodbc connection the Lambda uses, for offline benchmarks.
+
+It answers the schema check as if every object exists, the schedule lookup
+with the benchmark's gameIds, all due, reference cache version checks with a
+constant and CommonPlayerInfo with fixture rows, accepts everything else
+without doing it, and counts statements and rows per temp table. Each server
+round trip sleeps round_trip_ms to model network latency to RDS; like pyodbc
+without fast_executemany, executemany costs one round trip per row.
+"""
+import re
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+TEMP_TABLE = re.compile(r'INSERT\s+INTO\s+(#\w+)', re.IGNORECASE)
+
+
+class FakeConnection:
+    def __init__(self, game_ids, player_info=(None, []), round_trip_ms=1.0):
+        self.game_ids = list(game_ids)
+        self.player_columns, self.player_rows = player_info
+        self.round_trip_seconds = round_trip_ms / 1000
+        self.round_trips = 0
+        self.statements = Counter()
+        self.rows_loaded = Counter()
+        self.commits = 0
+
+    def round_trip(self, count=1):
+        self.round_trips += count
+        if self.round_trip_seconds:
+            time.sleep(self.round_trip_seconds * count)
+
+    def answer(self, sql):
+        """(rows, description) for a query; only the reads the Lambda depends on return rows"""
+        if sql.startswith('SELECT OBJECT_ID(?)'):
+            return [(1,)], [('object_id', int, None, None, None, None, True)]
+        if 'CHECKSUM_AGG' in sql or 'dm_db_partition_stats' in sql:
+            return [(len(self.player_rows), 0)], [('version', int, None, None, None, None, True)] * 2
+        if 'sys.tables' in sql:
+            return [('LeagueSchedule24_25',)], [('name', str, None, None, None, None, False)]
+        if 'LeagueSchedule' in sql:
+            tipoff = datetime.now() - timedelta(hours=4)
+            return [(game_id, tipoff, 'due') for game_id in self.game_ids], [
+                ('gameId', int, None, None, None, None, True), ('tipoff', datetime, None, None, None, None, True),
+                ('status', str, None, None, None, None, False)]
+        if 'CommonPlayerInfo' in sql and self.player_columns:
+            return list(self.player_rows), [(column, str, None, None, None, None, True)
+                                            for column in self.player_columns]
+        return [], None
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.round_trip()
+        self.commits += 1
+
+    def rollback(self):
+        self.round_trip()
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+        self.description = None
+        self.rowcount = -1
+        self.fast_executemany = False
+
+    def execute(self, sql, *params):
+        self.conn.round_trip()
+        self.conn.statements[sql.split(None, 1)[0].upper() if sql.strip() else ''] += 1
+        self.rows, self.description = self.conn.answer(sql)
+        self.rowcount = len(self.rows)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        rows = list(seq_of_params)
+        self.conn.round_trip(1 if self.fast_executemany else len(rows))
+        self.conn.statements['EXECUTEMANY'] += 1
+        match = TEMP_TABLE.search(sql)
+        self.conn.rows_loaded[match.group(1) if match else '?'] += len(rows)
+        self.rows, self.description = [], None
+        self.rowcount = len(rows)
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchmany(self, size=1):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        pass
@@ -0,0 +1,176 @@
+"""
+Game page fixtures for the offline Lambda benchmarks.
+
+Recorded NBA.com game pages live in benchmarks/game_pages/<gameId>.html.gz.
+Record some (needs network access) from src/ with:
+    python -m benchmarks.fixtures record 22400001 22400002 ...
+
+When a benchmark needs more games than are recorded, recorded pages are reused
+under new gameIds; with none recorded, synthetic pages are generated that
+carry every field the Lambda's collect_* functions read, padded to
+BENCHMARK_PAGE_KB (default 400) to approximate a real page's parse cost.
+"""
+import glob
+import gzip
+import json
+import os
+import random
+import sys
+import requests
+from bs4 import BeautifulSoup
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'game_pages')
+
+FIRST_TEAM_ID = 1610612737
+PLAYER_POOL = 600
+FIRST_PERSON_ID = 1630000
+
+STAT_NAMES = ['assists', 'blocks', 'fieldGoalsAttempted', 'fieldGoalsMade', 'foulsPersonal',
+              'freeThrowsAttempted', 'freeThrowsMade', 'plusMinusPoints', 'points',
+              'reboundsDefensive', 'reboundsOffensive', 'reboundsTotal', 'steals',
+              'threePointersAttempted', 'threePointersMade', 'turnovers']
+
+
+def player_stats(rng, minutes):
+    stats = {name: rng.randint(0, 12) for name in STAT_NAMES}
+    stats['minutes'] = f"{minutes}:{rng.randint(0, 59):02d}"
+    for kind in ['fieldGoals', 'freeThrows', 'threePointers']:
+        attempted = stats[f'{kind}Attempted']
+        stats[f'{kind}Made'] = min(stats[f'{kind}Made'], attempted)
+        stats[f'{kind}Percentage'] = round(stats[f'{kind}Made'] / attempted, 3) if attempted else 0.0
+    return stats
+
+
+def synthetic_team(rng, team_id, score):
+    players = []
+    for person_id in rng.sample(range(FIRST_PERSON_ID, FIRST_PERSON_ID + PLAYER_POOL), 13):
+        players.append({
+            'personId': person_id,
+            'firstName': f"Player{person_id}",
+            'familyName': f"Synthetic{person_id % 97}",
+            'position': rng.choice(['G', 'F', 'C', 'G-F', 'F-C', '']),
+            'statistics': player_stats(rng, rng.randint(0, 40)),
+        })
+    quarter = score // 4
+    statistics = player_stats(rng, 240)
+    statistics.update(minutes='PT240M00.00S', points=score)
+    return {
+        'teamId': team_id,
+        'teamCity': f"City{team_id % 100}",
+        'teamName': f"Team{team_id % 100}",
+        'score': score,
+        'timeoutsRemaining': rng.randint(0, 3),
+        'teamWins': rng.randint(0, 60),
+        'teamLosses': rng.randint(0, 60),
+        'periods': [{'period': period, 'score': quarter + (score % 4 if period == 4 else 0)}
+                    for period in range(1, 5)],
+        'statistics': statistics,
+        'players': players,
+    }
+
+
+def synthetic_game(game_id):
+    """A game dict shaped like NBA.com's pageProps.game, deterministic per gameId"""
+    rng = random.Random(game_id)
+    home_id, away_id = rng.sample(range(FIRST_TEAM_ID, FIRST_TEAM_ID + 30), 2)
+    home_score, away_score = rng.randint(85, 135), rng.randint(85, 135)
+    if home_score == away_score:
+        home_score += 1
+    charts = {f'{side}Team': {'statistics': {
+        name: rng.randint(0, 40) for name in ['benchPoints', 'biggestLead', 'biggestScoringRun', 'leadChanges',
+                                              'pointsFastBreak', 'pointsFromTurnovers', 'pointsInThePaint',
+                                              'pointsSecondChance', 'timesTied']}} for side in ['home', 'away']}
+    return {
+        'gameId': f"00{game_id}",
+        'gameEt': f"2024-{rng.randint(11, 12)}-{rng.randint(10, 28)}T19:30:00-05:00",
+        'attendance': rng.randint(15000, 21000),
+        'duration': f"PT{rng.randint(125, 160)}M",
+        'homeTeam': synthetic_team(rng, home_id, home_score),
+        'awayTeam': synthetic_team(rng, away_id, away_score),
+        'postgameCharts': charts,
+    }
+
+
+def render_page(game, padding_kb=0):
+    """HTML the scraper can parse: pageProps.game in the application/json script tag"""
+    page_props = {'game': game}
+    if padding_kb:
+        # Real pages carry far more JSON than the scraper reads
+        page_props['padding'] = ['x' * 1000] * padding_kb
+    data = json.dumps({'props': {'pageProps': page_props}})
+    return (f'<!DOCTYPE html><html><head><title>Game {game["gameId"]}</title></head><body>'
+            f'<div id="__next"></div>'
+            f'<script id="__NEXT_DATA__" type="application/json">{data}</script>'
+            f'</body></html>').encode('utf-8')
+
+
+def recorded_pages():
+    """{gameId: page bytes} for every recorded fixture"""
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, '*.html.gz'))):
+        with gzip.open(path, 'rb') as f:
+            pages[int(os.path.basename(path).split('.')[0])] = f.read()
+    return pages
+
+
+def extract_game(page):
+    script_tag = BeautifulSoup(page, 'html.parser').find('script', type='application/json')
+    return json.loads(script_tag.string)['props']['pageProps']['game']
+
+
+def build_pages(game_ids):
+    """
+    Pages for game_ids and the source they came from ('recorded' or 'synthetic').
+    Recorded pages are served as-is for their own gameIds and re-numbered for others.
+    """
+    recorded = recorded_pages()
+    if not recorded:
+        padding_kb = int(os.getenv('BENCHMARK_PAGE_KB', 400))
+        return {game_id: render_page(synthetic_game(game_id), padding_kb) for game_id in game_ids}, 'synthetic'
+
+    templates = [extract_game(page) for page in recorded.values()]
+    pages = {}
+    for number, game_id in enumerate(game_ids):
+        if game_id in recorded:
+            pages[game_id] = recorded[game_id]
+        else:
+            game = dict(templates[number % len(templates)], gameId=f"00{game_id}")
+            pages[game_id] = render_page(game)
+    return pages, 'recorded'
+
+
+def player_info_rows():
+    """
+    CommonPlayerInfo columns and rows for half the synthetic player pool, so the
+    benchmark covers players both found in and missing from CommonPlayerInfo
+    """
+    columns = ['person_id', 'first_name', 'last_name', 'birthdate', 'school', 'country', 'height',
+               'weight', 'position', 'draft_year', 'draft_round', 'draft_number', 'dleague_flag']
+    rows = []
+    for person_id in range(FIRST_PERSON_ID, FIRST_PERSON_ID + PLAYER_POOL, 2):
+        rng = random.Random(person_id)
+        rows.append((person_id, f"Player{person_id}", f"Synthétic{person_id % 97}", '1998-03-14',
+                     'State University', 'USA', f"6-{rng.randint(0, 11)}", str(rng.randint(180, 260)),
+                     rng.choice(['Guard', 'Forward', 'Center', 'Guard-Forward']),
+                     rng.choice(['2018', '2020', 'Undrafted']), '1', str(rng.randint(1, 60)), 'N'))
+    return columns, rows
+
+
+def record(game_ids):
+    """Fetch real game pages from NBA.com into FIXTURE_DIR"""
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                             '(KHTML, like Gecko) Chrome/106.0.0.0 Safari/537.36'}
+    for game_id in game_ids:
+        response = requests.get(f'https://www.nba.com/game/00{game_id}', headers=headers, timeout=10)
+        response.raise_for_status()
+        extract_game(response.content)  # refuse to save a page the scraper can't read
+        with gzip.open(os.path.join(FIXTURE_DIR, f"{game_id}.html.gz"), 'wb') as f:
+            f.write(response.content)
+        print(f"Recorded game {game_id}: {len(response.content) / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != 'record':
+        sys.exit("usage: python -m benchmarks.fixtures record <gameId> [<gameId> ...]")
+    record([int(game_id) for game_id in sys.argv[2:]])
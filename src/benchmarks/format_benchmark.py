@@ -0,0 +1,103 @@
+"""
+Benchmark and verify the per-table row formatters in create_sql_dump.
+
+For each table this samples BENCHMARK_SAMPLE_ROWS rows from the configured
+database, then
+  - times the generic format_value path against the compiled row formatter
+    and logs rows/sec for both, and
+  - round-trips the formatted literals through the server by selecting them
+    from a VALUES list cast back to the declared column types, and checks that
+    every value comes back identical to the original.
+
+Run from src/:
+    python -m benchmarks.format_benchmark
+
+Only SELECTs are issued, so any database with the NBA schema will do.
+"""
+import os
+import sys
+import time
+from utils.db_utils import get_db_connection
+from create_sql_dump import (build_row_formatter, column_type_sql, format_value,
+                             get_column_metadata, log_message, MAX_INSERT_ROWS)
+
+
+def time_formatter(format_row, rows, repeats=3):
+    """Best-of-repeats formatting throughput in rows/sec"""
+    best = None
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        for row in rows:
+            format_row(row)
+        elapsed = time.perf_counter() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    return len(rows) / best if best else float('inf')
+
+
+def round_trip(cursor, columns, format_row, rows):
+    """Return (row_index, column_name, original, restored) for every value that doesn't survive"""
+    aliases = [f"c{i}" for i in range(len(columns))]
+    select_list = ', '.join(f"CAST({alias} AS {column_type_sql(column)})"
+                            for alias, column in zip(aliases, columns))
+    mismatches = []
+    for start in range(0, len(rows), MAX_INSERT_ROWS):
+        batch = rows[start:start + MAX_INSERT_ROWS]
+        values = ',\n'.join(format_row(row) for row in batch)
+        # The row number keeps results aligned with the originals regardless of plan order
+        cursor.execute(f"""
+        SELECT rn, {select_list}
+        FROM (
+            SELECT *, ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) AS rn
+            FROM (VALUES {values}) AS v({', '.join(aliases)})
+        ) AS numbered
+        ORDER BY rn
+        """)
+        for offset, restored in enumerate(cursor.fetchall()):
+            original = batch[offset]
+            for i, column in enumerate(columns):
+                if original[i] != restored[i + 1]:
+                    mismatches.append((start + offset, column.column_name, original[i], restored[i + 1]))
+    return mismatches
+
+
+def main():
+    sample_rows = int(os.getenv('BENCHMARK_SAMPLE_ROWS', 20000))
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    failed = False
+
+    try:
+        tables = {}
+        for column in get_column_metadata(cursor):
+            tables.setdefault((column.schema_name, column.table_name), []).append(column)
+
+        for (schema_name, table_name), columns in tables.items():
+            cursor.execute(f"SELECT TOP ({sample_rows}) * FROM [{schema_name}].[{table_name}]")
+            rows = cursor.fetchall()
+            if not rows:
+                log_message(f"{table_name}: no rows, skipped")
+                continue
+
+            def format_generic(row):
+                return '(' + ', '.join(format_value(val) for val in row) + ')'
+
+            format_row = build_row_formatter([column.data_type for column in columns])
+            generic_rate = time_formatter(format_generic, rows)
+            compiled_rate = time_formatter(format_row, rows)
+
+            mismatches = round_trip(cursor, columns, format_row, rows)
+            failed = failed or bool(mismatches)
+
+            log_message(f"{table_name}: {len(rows)} rows, generic {generic_rate:,.0f} rows/sec, "
+                        f"compiled {compiled_rate:,.0f} rows/sec ({compiled_rate / generic_rate:.2f}x), "
+                        f"round trip {'OK' if not mismatches else f'{len(mismatches)} mismatches'}")
+            for row_index, column_name, original, restored in mismatches[:10]:
+                log_message(f"  row {row_index} {column_name}: {original!r} came back as {restored!r}")
+    finally:
+        conn.close()
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+Offline benchmark of the Lambda's update path, update_NBA_db, without NBA.com or RDS.
+
+Run from src/:
+    python -m benchmarks.lambda_benchmark
+
+For each game count in BENCHMARK_GAME_COUNTS (default 1,15,100) this serves
+fixture pages (see benchmarks.fixtures) from a local stand-in server, points
+the real scraper at it with no rate-limit sleeps, and runs update_NBA_db end
+to end against a fake connection that models BENCHMARK_DB_ROUND_TRIP_MS
+(default 1.0) of latency per round trip. It reports games/sec, the per-stage
+totals from the Lambda's metrics and, in a second run under tracemalloc, peak
+traced memory.
+
+The fake connection runs no SQL, so the database stages (find, load, merge,
+commit) measure only the modelled round trips: their times show how many
+round trips the Lambda makes, not what RDS spends executing them. Results
+record this as 'database': 'fake'; for real load and merge costs, run the
+Lambda against a local SQL Server built with benchmarks.synthetic_db.
+
+Each result is appended to BENCHMARK_RESULTS (default
+lambda_benchmark_results.jsonl) and compared with the previous result for the
+same game count, fixtures and latency. Throughput or peak memory worse by more
+than BENCHMARK_REGRESSION_PCT (default 10) is reported as a regression and
+the exit status is 1.
+"""
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+os.environ.setdefault('METRICS_FORMAT', 'off')  # the totals are read directly; skip per-stage records
+import lamba_function
+from benchmarks.fake_db import FakeConnection
+from benchmarks.fixtures import build_pages, player_info_rows
+from benchmarks.nba_standin import StandInServer
+from benchmarks.results import git_commit, load_results, log_message
+
+FIRST_GAME_ID = 22400001
+# Stages whose time under FakeConnection is only its modelled round-trip latency
+MODELLED_STAGES = ['find', 'load', 'merge', 'commit']
+
+
+def run_update(pages, round_trip_ms, trace_memory=False):
+    """Run update_NBA_db once over pages; returns (seconds, peak traced bytes, connection)"""
+    conn = FakeConnection(pages, player_info_rows(), round_trip_ms)
+    if trace_memory:
+        tracemalloc.start()
+    start_time = time.perf_counter()
+    result = lamba_function.update_NBA_db(conn, conn.cursor(), when='last_three_days')
+    elapsed = time.perf_counter() - start_time
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    if result is not None:
+        raise RuntimeError(f"update_NBA_db did not complete: returned {type(result).__name__} "
+                           f"of {len(result)}")
+    if conn.rows_loaded['#TempGames'] != len(pages):
+        raise RuntimeError(f"Loaded {conn.rows_loaded['#TempGames']} of {len(pages)} games")
+    return elapsed, peak, conn
+
+
+def compare(result, previous, threshold_pct):
+    """Log the change against previous and return the regressions found"""
+    regressions = []
+    speed_change = (result['games_per_sec'] / previous['games_per_sec'] - 1) * 100
+    memory_change = (result['peak_traced_mb'] / previous['peak_traced_mb'] - 1) * 100
+    log_message(f"  vs {previous['timestamp']} ({previous.get('commit')}): "
+                f"games/sec {speed_change:+.1f}%, peak memory {memory_change:+.1f}%")
+    if speed_change < -threshold_pct:
+        regressions.append(f"{result['games']} games: games/sec down {-speed_change:.1f}%")
+    if memory_change > threshold_pct:
+        regressions.append(f"{result['games']} games: peak memory up {memory_change:.1f}%")
+    return regressions
+
+
+def main():
+    counts = [int(count) for count in os.getenv('BENCHMARK_GAME_COUNTS', '1,15,100').split(',')]
+    round_trip_ms = float(os.getenv('BENCHMARK_DB_ROUND_TRIP_MS', 1.0))
+    results_path = os.getenv('BENCHMARK_RESULTS', 'lambda_benchmark_results.jsonl')
+    threshold_pct = float(os.getenv('BENCHMARK_REGRESSION_PCT', 10))
+    history = load_results(results_path)
+    commit = git_commit()
+
+    regressions = []
+    for count in counts:
+        pages, source = build_pages(range(FIRST_GAME_ID, FIRST_GAME_ID + count))
+        with StandInServer(pages) as server:
+            os.environ.update(NBA_BASE_URL=server.url, SCRAPE_DELAY_SECONDS='0',
+                              SCRAPE_BACKOFF_SECONDS='0')
+            seconds, _, conn = run_update(pages, round_trip_ms)
+            stages = {name: round(total['seconds'], 4)
+                      for name, total in lamba_function.metrics.totals.items()}
+            _, peak, _ = run_update(pages, round_trip_ms, trace_memory=True)
+
+        result = {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': commit,
+            'games': count,
+            'fixtures': source,
+            'database': 'fake',
+            'round_trip_ms': round_trip_ms,
+            'seconds': round(seconds, 4),
+            'games_per_sec': round(count / seconds, 3),
+            'peak_traced_mb': round(peak / 1024 / 1024, 2),
+            'round_trips': conn.round_trips,
+            'rows_loaded': dict(conn.rows_loaded),
+            'stages': stages,
+        }
+        log_message(f"{'='*50}")
+        log_message(f"{count} {source} games: {seconds:.2f}s, {result['games_per_sec']:.2f} games/sec, "
+                    f"peak {result['peak_traced_mb']:.1f} MB traced, {conn.round_trips} round trips")
+        log_message(f"  stages: {', '.join(f'{name} {value:.3f}s' for name, value in stages.items())}")
+        log_message(f"  {', '.join(name for name in MODELLED_STAGES if name in stages)}: modelled "
+                    f"{round_trip_ms} ms round trips only, no SQL executed")
+
+        previous = [entry for entry in history if entry['games'] == count and entry['fixtures'] == source
+                    and entry['round_trip_ms'] == round_trip_ms]
+        if previous:
+            regressions += compare(result, previous[-1], threshold_pct)
+        with open(results_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(result) + '\n')
+
+    log_message(f"Results appended to {results_path}")
+    if regressions:
+        for regression in regressions:
+            log_message(f"REGRESSION: {regression}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Local stand-in for NBA.com's game pages, for benchmarks and tests.
+
+Serves {gameId: page bytes} at http://127.0.0.1:<port>/game/00<gameId>; point
+the Lambda's scraper at it with NBA_BASE_URL=<server.url>.
+
+Pass faults (see Faults.from_spec) to degrade it the way the real upstream
+degrades: latency drawn from a distribution, injected error statuses, 429
+throttling with Retry-After, connections cut mid-body and pages truncated
+before the game JSON ends.
+"""
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+GAME_PATH = re.compile(r'^/game/00(\d+)/?$')
+
+
+class Faults:
+    """
+    What the stand-in does wrong, parsed from a spec such as
+        latency=lognormal:120:0.8,status=503:0.05;500:0.01,throttle=4,partial=0.02,truncate=0.02
+    latency    fixed:<ms> | uniform:<min ms>:<max ms> | exp:<mean ms> | lognormal:<median ms>:<sigma>
+    status     <status>:<probability> pairs separated by ';'
+    throttle   requests per second allowed before answering 429
+    retry_after  'on' (default) to send Retry-After with 429s, 'off' to omit it
+    partial    probability of cutting the connection partway through the body
+    truncate   probability of a complete 200 whose page stops before the game JSON ends
+    seed       random seed, for repeatable runs (default 0)
+    """
+
+    def __init__(self, latency=None, statuses=None, throttle_rps=None, retry_after=True,
+                 partial=0.0, truncate=0.0, seed=0):
+        self.latency = latency
+        self.statuses = statuses or {}
+        self.throttle_rps = throttle_rps
+        self.retry_after = retry_after
+        self.partial = partial
+        self.truncate = truncate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.tokens = throttle_rps or 0
+        self.refilled = time.monotonic()
+
+    @classmethod
+    def from_spec(cls, spec):
+        options = {}
+        for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+            key, _, value = item.partition('=')
+            if key == 'latency':
+                kind, *params = value.split(':')
+                if kind not in ('fixed', 'uniform', 'exp', 'lognormal'):
+                    raise ValueError(f"Unknown latency distribution {kind!r}")
+                options['latency'] = (kind, [float(param) for param in params])
+            elif key == 'status':
+                options['statuses'] = {int(status): float(probability) for status, probability in
+                                       (pair.split(':') for pair in value.split(';'))}
+            elif key == 'throttle':
+                options['throttle_rps'] = float(value)
+            elif key == 'retry_after':
+                options['retry_after'] = value != 'off'
+            elif key in ('partial', 'truncate'):
+                options[key] = float(value)
+            elif key == 'seed':
+                options['seed'] = int(value)
+            else:
+                raise ValueError(f"Unknown fault {key!r} in {spec!r}")
+        return cls(**options)
+
+    def delay(self):
+        """Seconds to wait before answering"""
+        if self.latency is None:
+            return 0.0
+        kind, params = self.latency
+        with self.lock:
+            if kind == 'fixed':
+                ms = params[0]
+            elif kind == 'uniform':
+                ms = self.rng.uniform(params[0], params[1])
+            elif kind == 'exp':
+                ms = self.rng.expovariate(1 / params[0])
+            else:
+                ms = self.rng.lognormvariate(math.log(params[0]), params[1])
+        return ms / 1000
+
+    def throttled(self):
+        """Seconds until the next request would be allowed, or None if this one may proceed"""
+        if not self.throttle_rps:
+            return None
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.throttle_rps, self.tokens + (now - self.refilled) * self.throttle_rps)
+            self.refilled = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return None
+            return (1 - self.tokens) / self.throttle_rps
+
+    def draw(self):
+        """The fault for one found page: an injected status, 'partial', 'truncate' or None"""
+        with self.lock:
+            roll = self.rng.random()
+        for outcome, probability in list(self.statuses.items()) + [('partial', self.partial),
+                                                                  ('truncate', self.truncate)]:
+            if roll < probability:
+                return outcome
+            roll -= probability
+        return None
+
+
+class StandInServer:
+    """Threaded HTTP server on localhost that answers game page requests from pages"""
+
+    def __init__(self, pages, port=0, faults=None):
+        self.pages = pages
+        self.faults = faults
+        self.requests = 0
+        self.outcomes = Counter()
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._handler_class())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler_class(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with standin.lock:
+                    standin.requests += 1
+                standin.respond(self)
+
+            def log_message(self, format, *args):
+                pass  # keep benchmark output readable
+
+        return Handler
+
+    def respond(self, handler):
+        match = GAME_PATH.match(handler.path)
+        page = self.pages.get(int(match.group(1))) if match else None
+        if self.faults is None:
+            outcome = self.answer(handler, page, None)
+        else:
+            time.sleep(self.faults.delay())
+            wait = self.faults.throttled()
+            if wait is not None:
+                headers = {'Retry-After': str(math.ceil(wait))} if self.faults.retry_after else None
+                send(handler, 429, b'Too Many Requests', headers)
+                outcome = 429
+            else:
+                outcome = self.answer(handler, page, self.faults.draw() if page is not None else None)
+        with self.lock:
+            self.outcomes[outcome] += 1
+
+    def answer(self, handler, page, fault):
+        """Send page, or what fault makes of it; returns the outcome to count"""
+        if page is None:
+            send(handler, 404, b'Not found')
+            return 404
+        if isinstance(fault, int):
+            send(handler, fault, f"Injected {fault}".encode())
+            return fault
+        if fault == 'partial':
+            # Promise the whole page, send part of it and hang up
+            send(handler, 200, page[:len(page) // 2], {'Content-Length': str(len(page))})
+            handler.close_connection = True
+            return 'partial'
+        if fault == 'truncate':
+            cut = page.find(b'"game"')
+            send(handler, 200, page[:cut + len(b'"game": {')] if cut >= 0 else page[:len(page) // 2])
+            return 'truncated'
+        send(handler, 200, page)
+        return 200
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def send(handler, status, body, headers=None):
+    headers = dict({'Content-Length': str(len(body))}, **(headers or {}))
+    handler.send_response(status)
+    handler.send_header('Content-Type', 'text/html; charset=utf-8')
+    for name, value in headers.items():
+        handler.send_header(name, value)
+    handler.end_headers()
+    handler.wfile.write(body)
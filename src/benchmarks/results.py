@@ -0,0 +1,27 @@
+"""Logging, and result history for the benchmarks that append to a JSON-lines file."""
+import json
+import os
+import subprocess
+from utils.metrics import get_logger
+
+# Kept apart from the exporter's and dump's logs, which the benchmarks would otherwise append to
+logger = get_logger('nba_benchmark.log')
+
+
+def log_message(message):
+    logger.info(message)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_results(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
@@ -0,0 +1,112 @@
+"""
+Benchmark the Lambda's scraper, get_new_games, against a degraded NBA.com stand-in.
+
+Run from src/:
+    python -m benchmarks.scraper_benchmark
+
+For each scenario in SCRAPER_SCENARIOS (default: all of SCENARIOS below) this
+serves SCRAPER_GAMES (default 20) fixture pages from a local stand-in with the
+scenario's faults (see benchmarks.nba_standin.Faults), plus
+SCRAPER_MISSING_GAMES (default 2) gameIds it answers with 404, like games not
+played yet. It reports time-to-complete, the success rate over the games that
+exist, requests per game and what the stand-in answered. Custom scenarios can
+be given inline, e.g. SCRAPER_SCENARIOS="clean,bursty=throttle=1;latency=exp:200".
+Inline specs use ';' between faults and '|' between status pairs.
+
+The scraper's own pacing comes from SCRAPE_DELAY_SECONDS and
+SCRAPE_BACKOFF_SECONDS, which default to 0 and 0.5 here so a run takes
+seconds rather than minutes; set them to measure production pacing. Results
+are appended to SCRAPER_RESULTS (default scraper_benchmark_results.jsonl).
+"""
+import json
+import os
+import time
+from collections import Counter
+from datetime import datetime
+
+os.environ.setdefault('METRICS_FORMAT', 'off')
+os.environ.setdefault('SCRAPE_DELAY_SECONDS', '0')
+os.environ.setdefault('SCRAPE_BACKOFF_SECONDS', '0.5')
+import lamba_function
+from benchmarks.fixtures import build_pages
+from benchmarks.nba_standin import Faults, StandInServer
+from benchmarks.results import git_commit
+from benchmarks.results import log_message
+
+FIRST_GAME_ID = 22400001
+
+SCENARIOS = {
+    'clean': '',
+    'slow': 'latency=lognormal:400:0.6',
+    'flaky': 'latency=exp:80,status=503:0.1;500:0.03,partial=0.03',
+    'throttled': 'latency=fixed:20,throttle=2',
+    'throttled-no-retry-after': 'latency=fixed:20,throttle=2,retry_after=off',
+    'truncated': 'truncate=0.1,partial=0.05',
+}
+
+
+def parse_scenarios(value):
+    """[(name, spec)] from SCRAPER_SCENARIOS: known names or name=spec with ';' and '|' separators"""
+    scenarios = []
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        name, _, spec = item.partition('=')
+        if spec:
+            scenarios.append((name, spec.replace(';', ',').replace('|', ';')))
+        elif name in SCENARIOS:
+            scenarios.append((name, SCENARIOS[name]))
+        else:
+            raise SystemExit(f"Unknown scenario {name!r}; choose from {', '.join(SCENARIOS)} or use name=spec")
+    return scenarios
+
+
+def run_scenario(pages, game_ids, spec, seed):
+    """Scrape game_ids through a stand-in with spec's faults; returns (seconds, games found, server)"""
+    with StandInServer(pages, faults=Faults.from_spec(f"{spec},seed={seed}")) as server:
+        os.environ['NBA_BASE_URL'] = server.url
+        start_time = time.perf_counter()
+        games = lamba_function.get_new_games(set(game_ids))
+        seconds = time.perf_counter() - start_time
+    return seconds, games, server
+
+
+def main():
+    count = int(os.getenv('SCRAPER_GAMES', 20))
+    missing = int(os.getenv('SCRAPER_MISSING_GAMES', 2))
+    seed = int(os.getenv('SCRAPER_SEED', 0))
+    results_path = os.getenv('SCRAPER_RESULTS', 'scraper_benchmark_results.jsonl')
+    scenarios = parse_scenarios(os.getenv('SCRAPER_SCENARIOS', ','.join(SCENARIOS)))
+    commit = git_commit()
+
+    pages, source = build_pages(range(FIRST_GAME_ID, FIRST_GAME_ID + count))
+    game_ids = list(pages) + list(range(FIRST_GAME_ID + count, FIRST_GAME_ID + count + missing))
+
+    for name, spec in scenarios:
+        seconds, games, server = run_scenario(pages, game_ids, spec, seed)
+        found = {int(game['gameId']) for game in games}
+        outcomes = Counter({str(outcome): total for outcome, total in server.outcomes.items()})
+        result = {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': commit,
+            'scenario': name,
+            'faults': spec,
+            'fixtures': source,
+            'games': count,
+            'missing_games': missing,
+            'seconds': round(seconds, 3),
+            'found': len(found & set(pages)),
+            'success_rate': round(len(found & set(pages)) / count, 3),
+            'requests': server.requests,
+            'requests_per_game': round(server.requests / len(game_ids), 2),
+            'outcomes': dict(outcomes),
+        }
+        log_message(f"{name}: {result['found']}/{count} games in {seconds:.1f}s "
+                    f"({result['success_rate']:.0%}), {server.requests} requests, "
+                    f"answers {dict(outcomes)}")
+        with open(results_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(result) + '\n')
+
+    log_message(f"Results appended to {results_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Check that export_tables produces a consistent export while the database is
+being written to, by running it against a local instance under concurrent
+updates and cross-checking the CSVs.
+
+Run from src/:
+    python -m benchmarks.snapshot_validation
+
+DB_* must point at a disposable local copy of NBA_Database (for example one
+restored by benchmarks.dump_benchmark): the run enables SNAPSHOT isolation on
+it and keeps rewriting Games.attendance, TeamStatistics.benchPoints and
+PlayerStatistics.points of the newest and oldest games. Each rewrite sets all
+three to the same counter in one transaction, so any export that saw a single
+committed state has one counter value across Games.csv, TeamStatistics.csv and
+PlayerStatistics.csv for those games, and the same rows the database has.
+
+VALIDATION_MODES selects the EXPORT_CONSISTENCY values to try (default
+"snapshot,nolock"); only a snapshot failure fails the run, nolock results are
+reported for comparison. Exports run with EXPORT_WORKERS (default 3 here) so the
+views are read in parallel, and writes land every VALIDATION_WRITE_INTERVAL
+seconds (default 2).
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import pandas as pd
+from utils.db_utils import get_db_connection
+from benchmarks.results import log_message
+
+EXPORT_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'export_tables.py')
+
+# CSV and column each marker game's counter is checked in
+COUNTER_COLUMNS = {
+    'Games.csv': 'attendance',
+    'TeamStatistics.csv': 'benchPoints',
+    'PlayerStatistics.csv': 'points',
+}
+
+
+def pick_marker_games(conn):
+    """The newest and oldest games, which land in the first and last export windows"""
+    games = pd.read_sql("""
+    SELECT gameId FROM (
+        SELECT TOP 1 gameId FROM GameTeams ORDER BY gameDate DESC, gameId DESC
+    ) newest
+    UNION
+    SELECT gameId FROM (
+        SELECT TOP 1 gameId FROM GameTeams ORDER BY gameDate ASC, gameId ASC
+    ) oldest
+    """, conn)
+    return [int(game_id) for game_id in games['gameId']]
+
+
+def count_rows(conn, game_ids):
+    """Rows each CSV should hold for the marker games"""
+    id_list = ', '.join(str(game_id) for game_id in game_ids)
+    counts = {}
+    for csv_name, table in [('Games.csv', 'Games'), ('TeamStatistics.csv', 'TeamStatistics'),
+                            ('PlayerStatistics.csv', 'PlayerStatistics')]:
+        query = f"SELECT COUNT(*) as count FROM {table} WHERE gameId IN ({id_list})"
+        counts[csv_name] = int(pd.read_sql(query, conn).iloc[0]['count'])
+    return counts
+
+
+def write_loop(game_ids, interval, stop, stats):
+    """Set the marker games' counter columns to the next value in one transaction each time"""
+    conn = get_db_connection()
+    id_list = ', '.join(str(game_id) for game_id in game_ids)
+    cursor = conn.cursor()
+    counter = 0
+    try:
+        while not stop.is_set():
+            counter += 1
+            cursor.execute(f"UPDATE Games SET attendance = {counter} WHERE gameId IN ({id_list})")
+            cursor.execute(f"UPDATE TeamStatistics SET benchPoints = {counter} WHERE gameId IN ({id_list})")
+            cursor.execute(f"UPDATE PlayerStatistics SET points = {counter} WHERE gameId IN ({id_list})")
+            conn.commit()
+            stats['writes'] = counter
+            stop.wait(interval)
+    finally:
+        conn.close()
+
+
+def check_export(output_dir, game_ids, expected_rows):
+    """Return a list of consistency problems found in one export's CSVs"""
+    problems = []
+    counters = set()
+    for csv_name, column in COUNTER_COLUMNS.items():
+        df = pd.read_csv(os.path.join(output_dir, csv_name), usecols=['gameId', column])
+        marker_rows = df[df['gameId'].isin(game_ids)]
+        if len(marker_rows) != expected_rows[csv_name]:
+            problems.append(f"{csv_name}: {len(marker_rows)} marker rows, expected {expected_rows[csv_name]}")
+        values = set(marker_rows[column].dropna().astype(int))
+        if len(values) > 1:
+            problems.append(f"{csv_name}: mixed {column} values {sorted(values)} within one export")
+        counters |= values
+    if len(counters) > 1:
+        problems.append(f"CSVs disagree on the counter: {sorted(counters)}")
+    return problems
+
+
+def run_export(consistency, output_dir):
+    """Run export_tables in output_dir with the given consistency mode, returning seconds"""
+    env = dict(os.environ,
+               EXPORT_CONSISTENCY=consistency,
+               EXPORT_WORKERS=os.getenv('EXPORT_WORKERS', '3'),
+               OUTPUT_COMPRESSION='none',
+               OUTPUT_VOLUME_MB='0')
+    start_time = time.time()
+    subprocess.run([sys.executable, EXPORT_SCRIPT], cwd=output_dir, env=env,
+                   check=True, stdout=subprocess.DEVNULL)
+    return time.time() - start_time
+
+
+def main():
+    if 'rds.amazonaws.com' in os.getenv('DB_SERVER', ''):
+        sys.exit("snapshot_validation writes to the database; point DB_* at a local copy, not RDS")
+
+    modes = os.getenv('VALIDATION_MODES', 'snapshot,nolock').split(',')
+    interval = float(os.getenv('VALIDATION_WRITE_INTERVAL', 2))
+
+    conn = get_db_connection()
+    try:
+        conn.autocommit = True  # ALTER DATABASE cannot run inside a transaction
+        conn.execute("ALTER DATABASE CURRENT SET ALLOW_SNAPSHOT_ISOLATION ON")
+        conn.autocommit = False
+        game_ids = pick_marker_games(conn)
+        expected_rows = count_rows(conn, game_ids)
+    finally:
+        conn.close()
+    log_message(f"Marker games {game_ids}, expected rows {expected_rows}")
+
+    failed = False
+    for consistency in modes:
+        stop = threading.Event()
+        stats = {'writes': 0}
+        writer = threading.Thread(target=write_loop, args=(game_ids, interval, stop, stats))
+        writer.start()
+        try:
+            with tempfile.TemporaryDirectory(prefix=f'export_{consistency}_') as output_dir:
+                elapsed = run_export(consistency, output_dir)
+                problems = check_export(output_dir, game_ids, expected_rows)
+        finally:
+            stop.set()
+            writer.join()
+
+        log_message(f"{consistency}: export took {elapsed:.1f}s with {stats['writes']} concurrent writes")
+        if problems:
+            for problem in problems:
+                log_message(f"{consistency}: {problem}")
+            failed = failed or consistency == 'snapshot'
+        else:
+            log_message(f"{consistency}: consistent")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
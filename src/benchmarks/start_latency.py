@@ -0,0 +1,91 @@
+"""
+Measure export start latency with the per-run #GameTeams copy against the
+PersistedGameTeams table, and check the persisted table is in sync with the
+UniqueGameTeams view.
+
+Start latency is the time from opening a connection until the first date
+window of DetailedGames has been read: connect, GameTeams setup (session only),
+the per-day histogram and the first window query.
+
+Run from src/:
+    python -m benchmarks.start_latency
+
+Only SELECTs and temp tables are used, so any database with the NBA schema
+will do. BENCHMARK_REPEATS sets the runs per source (default 3, best is kept).
+"""
+import os
+import time
+import pandas as pd
+from utils.db_utils import get_db_connection
+from export_tables import gameteams_table, get_date_histogram, setup_session_gameteams
+from benchmarks.results import log_message
+
+
+def time_to_first_window(source):
+    """Seconds from connect until the first DetailedGames window is read with the given source"""
+    os.environ['EXPORT_GAMETEAMS'] = source
+    start_time = time.time()
+    conn = get_db_connection()
+    try:
+        if source == 'session' and not setup_session_gameteams(conn):
+            raise Exception("Failed to create session GameTeams table")
+        histogram = get_date_histogram(conn, 'DetailedGames')
+        newest_day = histogram['gameDay'].iloc[0].strftime('%Y-%m-%d')
+        pd.read_sql(f"""
+        SELECT GT.*, G.arenaId, G.attendance, G.gameType, G.tournamentRound
+        FROM {gameteams_table()} GT
+        INNER JOIN Games G ON GT.gameId = G.gameId
+        WHERE GT.gameDate >= '{newest_day}'
+        ORDER BY GT.gameDate DESC, GT.gameId DESC
+        """, conn)
+        return time.time() - start_time
+    finally:
+        conn.close()
+
+
+def check_in_sync(conn):
+    """Log games that differ between the UniqueGameTeams view and PersistedGameTeams"""
+    drift = pd.read_sql("""
+    SELECT
+        (SELECT COUNT(*) FROM (
+            SELECT gameId, gameDate, hometeamId, awayteamId, homeScore, awayScore, winner,
+                   hometeamCity, hometeamName, awayteamCity, awayteamName
+            FROM UniqueGameTeams
+            EXCEPT
+            SELECT gameId, gameDate, hometeamId, awayteamId, homeScore, awayScore, winner,
+                   hometeamCity, hometeamName, awayteamCity, awayteamName
+            FROM PersistedGameTeams) missing) as missing_or_stale,
+        (SELECT COUNT(*) FROM PersistedGameTeams P
+         WHERE NOT EXISTS (SELECT 1 FROM UniqueGameTeams GT WHERE GT.gameId = P.gameId)) as extra
+    """, conn).iloc[0]
+    log_message(f"PersistedGameTeams drift: {int(drift['missing_or_stale'])} missing or stale, "
+                f"{int(drift['extra'])} extra")
+
+
+def main():
+    repeats = int(os.getenv('BENCHMARK_REPEATS', 3))
+    source_before = os.getenv('EXPORT_GAMETEAMS')
+
+    conn = get_db_connection()
+    try:
+        check_in_sync(conn)
+    finally:
+        conn.close()
+
+    results = {}
+    try:
+        for source in ['session', 'persisted']:
+            results[source] = min(time_to_first_window(source) for _ in range(repeats))
+            log_message(f"Start latency with {source} GameTeams: {results[source]:.2f}s")
+    finally:
+        if source_before is None:
+            os.environ.pop('EXPORT_GAMETEAMS', None)
+        else:
+            os.environ['EXPORT_GAMETEAMS'] = source_before
+
+    log_message(f"Persisted GameTeams saves {results['session'] - results['persisted']:.2f}s "
+                f"({results['session'] / results['persisted']:.1f}x faster start)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,391 @@
+"""
+Build a synthetic, full-scale NBA database for export benchmarks.
+
+Run from src/ with DB_* pointing at an empty local database:
+    python -m benchmarks.synthetic_db
+
+The schema comes from sql/create_database.sql, and sql/upgrade_database.sql
+backfills PersistedGameTeams once the data is in. The data is about
+SYNTHETIC_GAMES games (default 66000), two TeamStatistics rows per game and
+about SYNTHETIC_PLAYER_ROWS PlayerStatistics rows (default 1500000), skewed
+the way the real history is:
+  - seasons grow with the league, from 8-17 teams before 1967 to 30, with
+    shortened lockout seasons,
+  - later eras have more players per box score,
+  - stats not yet tracked are NULL: blocks and steals before 1973-74,
+    three-pointers before 1979-80, quarter and chart stats before 1996-97,
+  - games cluster on the busier weekdays, and playoffs are sparser.
+CommonPlayerInfo and Arenas, which the exports read but the schema script
+does not create, are created with the columns the pipeline uses.
+SYNTHETIC_SEED (default 42) makes the data reproducible. SYNTHETIC_REPLACE=1
+drops an existing NBA schema first. SYNTHETIC_COLUMNSTORE=1 also builds the
+optional columnstore indexes from sql/columnstore_indexes.sql after loading.
+"""
+import os
+import random
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+from utils.db_utils import get_db_connection
+from benchmarks.results import log_message
+
+SQL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'sql')
+SCHEMA_PATH = os.path.join(SQL_DIR, 'create_database.sql')
+UPGRADE_PATH = os.path.join(SQL_DIR, 'upgrade_database.sql')
+COLUMNSTORE_PATH = os.path.join(SQL_DIR, 'columnstore_indexes.sql')
+
+FIRST_SEASON = 1946
+LAST_SEASON = 2024
+FIRST_TEAM_ID = 1610612737
+TEAM_COUNT = 30
+FIRST_PERSON_ID = 100000
+BATCH_ROWS = 20000
+
+# (first season, teams in the league from then on)
+LEAGUE_SIZE = [(1946, 11), (1947, 8), (1948, 12), (1949, 17), (1950, 11), (1951, 10), (1953, 9),
+               (1954, 8), (1961, 9), (1966, 10), (1967, 12), (1968, 14), (1970, 17), (1974, 18),
+               (1976, 22), (1980, 23), (1988, 25), (1989, 27), (1995, 29), (2004, 30)]
+SHORT_SEASONS = {1998: 50, 2011: 66, 2019: 72, 2020: 72}
+WEEKDAY_WEIGHTS = [0.6, 1.0, 1.2, 0.7, 1.2, 1.1, 0.8]
+
+VIEWS = ['DetailedTeamStatistics', 'DetailedPlayerStatistics', 'DetailedGames', 'UniqueGameTeams', 'GameTeams']
+TABLES = ['LiveGames', 'FailedGames', 'PersistedGameTeams', 'TeamStatistics', 'PlayerStatistics', 'CoachHistory', 'TeamHistories',
+          'LeagueSchedule24_25', 'Games', 'Players', 'Coaches', 'Teams', 'CommonPlayerInfo', 'Arenas']
+
+EXTRA_TABLES = """
+CREATE TABLE [dbo].[CommonPlayerInfo] (
+    [person_id] int NOT NULL PRIMARY KEY,
+    [first_name] nvarchar(50) NULL,
+    [last_name] nvarchar(50) NULL,
+    [birthdate] date NULL,
+    [school] nvarchar(100) NULL,
+    [country] nvarchar(50) NULL,
+    [height] nvarchar(10) NULL,
+    [weight] nvarchar(10) NULL,
+    [position] nvarchar(30) NULL,
+    [draft_year] nvarchar(10) NULL,
+    [draft_round] nvarchar(10) NULL,
+    [draft_number] nvarchar(10) NULL,
+    [dleague_flag] nvarchar(1) NULL
+);
+CREATE TABLE [dbo].[Arenas] (
+    [arenaId] int NOT NULL PRIMARY KEY,
+    [arenaName] nvarchar(100) NULL,
+    [arenaCity] nvarchar(50) NULL,
+    [arenaState] nvarchar(50) NULL
+);
+"""
+
+
+def teams_in(season):
+    return [teams for first, teams in LEAGUE_SIZE if first <= season][-1]
+
+
+def games_per_team(season):
+    if season in SHORT_SEASONS:
+        return SHORT_SEASONS[season]
+    return 70 if season < 1961 else 80 if season < 1967 else 82
+
+
+def players_per_game(season):
+    return 18 if season < 1964 else 22 if season < 1996 else 26
+
+
+def season_plan(target_games, target_player_rows):
+    """[(season, regular games, playoff games, players per game)] scaled to the targets"""
+    natural = []
+    for season in range(FIRST_SEASON, LAST_SEASON + 1):
+        teams = min(teams_in(season), TEAM_COUNT)
+        natural.append((season, teams * games_per_team(season) // 2, int(min(teams, 16) * 5.3)))
+    game_scale = target_games / sum(regular + playoff for _, regular, playoff in natural)
+    plan = [(season, round(regular * game_scale), round(playoff * game_scale))
+            for season, regular, playoff in natural]
+    natural_rows = sum((regular + playoff) * players_per_game(season) for season, regular, playoff in plan)
+    row_scale = target_player_rows / natural_rows
+    return [(season, regular, playoff, players_per_game(season) * row_scale)
+            for season, regular, playoff in plan]
+
+
+def script_batches(path):
+    """A UTF-16 script from sql/ split on GO"""
+    with open(path, 'rb') as f:
+        script = f.read().decode('utf-16').replace('\r\n', '\n')
+    return [batch.strip() for batch in re.split(r'^GO\s*$', script, flags=re.MULTILINE) if batch.strip()]
+
+
+def schema_batches(with_columnstore):
+    """
+    (schema, load-time) batches: create_database.sql, then after loading
+    upgrade_database.sql's PersistedGameTeams backfill and, with_columnstore,
+    the optional columnstore indexes
+    """
+    deferred = script_batches(UPGRADE_PATH)
+    if with_columnstore:
+        deferred += script_batches(COLUMNSTORE_PATH)
+    return script_batches(SCHEMA_PATH), deferred
+
+
+def drop_schema(cursor):
+    for view in VIEWS:
+        cursor.execute(f"DROP VIEW IF EXISTS [dbo].[{view}]")
+    for table in TABLES:
+        cursor.execute(f"DROP TABLE IF EXISTS [dbo].[{table}]")
+
+
+def insert_rows(cursor, table, columns, rows):
+    """Bulk insert rows in batches with fast_executemany; returns the row count"""
+    sql = f"INSERT INTO [dbo].[{table}] ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    count = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_ROWS:
+            cursor.executemany(sql, batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        cursor.executemany(sql, batch)
+        count += len(batch)
+    cursor.commit()
+    return count
+
+
+def team_rows(rng):
+    teams, histories = [], []
+    for index in range(TEAM_COUNT):
+        team_id = FIRST_TEAM_ID + index
+        city, name = f"City {index:02d}", f"Team {index:02d}"
+        teams.append((team_id, name, city))
+        if index % 6 == 0:
+            # A relocation whose ranges share 1980, so GameTeams returns those games twice
+            histories.append((team_id, f"Old City {index:02d}", name, f"O{index:02d}", FIRST_SEASON, 1980))
+            histories.append((team_id, city, name, f"T{index:02d}", 1980, 2100))
+        else:
+            histories.append((team_id, city, name, f"T{index:02d}", FIRST_SEASON, 2100))
+    return teams, histories
+
+
+FIRST_NAMES = ['James', 'Michael', 'Chris', 'Anthony', 'Kevin', 'Jalen', 'Luka', 'Nikola', 'José', 'Stephen']
+LAST_NAMES = ['Johnson', 'Williams', 'Brown', 'Davis', 'Miller', 'Wilson', 'Dončić', 'Jokić', 'Thompson', 'Green']
+
+
+def player_rows(rng, count):
+    players, info = [], []
+    for index in range(count):
+        person_id = FIRST_PERSON_ID + index
+        debut = FIRST_SEASON + index * (LAST_SEASON - FIRST_SEASON + 1) // count
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        birthdate = datetime(debut - rng.randint(19, 23), rng.randint(1, 12), rng.randint(1, 28)).date()
+        height, weight = rng.randint(70, 88), rng.randint(170, 290)
+        position = rng.choice(['Guard', 'Forward', 'Center', 'Guard-Forward', 'Forward-Center'])
+        drafted = rng.random() < 0.8
+        draft_round, draft_number = (rng.randint(1, 2), rng.randint(1, 60)) if drafted else (None, None)
+        players.append((person_id, first, last, birthdate, 'State University', 'USA', height, weight,
+                        'Guard' in position, 'Forward' in position, 'Center' in position,
+                        debut if drafted else None, draft_round, draft_number, rng.random() < 0.1))
+        info.append((person_id, first, last, birthdate, 'State University', 'USA',
+                     f"{height // 12}-{height % 12}", str(weight), position,
+                     str(debut) if drafted else 'Undrafted', str(draft_round) if drafted else 'Undrafted',
+                     str(draft_number) if drafted else 'Undrafted', 'N'))
+    return players, info
+
+
+def season_days(start, days):
+    """Candidate game days and their weekday weights"""
+    candidates = [start + timedelta(days=offset) for offset in range(days)]
+    return candidates, [WEEKDAY_WEIGHTS[day.weekday()] for day in candidates]
+
+
+def season_games(rng, season, regular, playoff):
+    """[(gameId, gameDate, hometeamId, awayteamId, gameType)] for one season in date order"""
+    teams = [FIRST_TEAM_ID + index for index in range(min(teams_in(season), TEAM_COUNT))]
+    start = datetime(season, 10, 22) if season >= 1980 else datetime(season, 11, 1)
+    days, weights = season_days(start, 170)
+    playoff_days, _ = season_days(start + timedelta(days=175), 60)
+    games = []
+    for game_type, type_digit, count, candidates, day_weights in [
+            ('Regular Season', 2, regular, days, weights),
+            ('Playoffs', 4, playoff, playoff_days, [1.0] * len(playoff_days))]:
+        dates = sorted(day + timedelta(hours=rng.randint(19, 22), minutes=rng.choice([0, 30]))
+                       for day in rng.choices(candidates, day_weights, k=count))
+        for number, game_date in enumerate(dates, start=1):
+            home, away = rng.sample(teams, 2)
+            games.append((int(f"{type_digit}{season % 100:02d}{number:05d}"), game_date, home, away, game_type))
+    games.sort(key=lambda game: game[1])
+    return games
+
+
+def shooting(rng, attempted_max, tracked=True):
+    if not tracked:
+        return None, None, None
+    attempted = rng.randint(0, attempted_max)
+    made = rng.randint(0, attempted)
+    return attempted, made, round(made / attempted, 3) if attempted else None
+
+
+def player_stat_row(rng, row_id, person_id, game_id, team_id, season):
+    minutes = rng.randint(0, 44)
+    fga, fgm, fgp = shooting(rng, minutes // 2)
+    fta, ftm, ftp = shooting(rng, minutes // 5)
+    tpa, tpm, tpp = shooting(rng, minutes // 6, season >= 1979)
+    defensive, offensive = rng.randint(0, minutes // 4), rng.randint(0, minutes // 8)
+    modern = season >= 1973
+    return (row_id, person_id, game_id, team_id, rng.randint(0, minutes // 4),
+            rng.randint(0, 3) if modern else None, fga, fgm, fgp, rng.randint(0, 6), fta, ftm, ftp,
+            minutes, rng.randint(-20, 20) if season >= 1996 else None,
+            2 * fgm + ftm + (tpm or 0), defensive, offensive, defensive + offensive,
+            rng.randint(0, 4) if modern else None, tpa, tpm, tpp,
+            rng.randint(0, 5) if modern else None)
+
+
+def team_stat_row(rng, team_id, game_id, home, win, score, season, record):
+    tracked = season >= 1996
+    fga, fgm, fgp = shooting(rng, 100)
+    fta, ftm, ftp = shooting(rng, 35)
+    tpa, tpm, tpp = shooting(rng, 45, season >= 1979)
+    quarters = [score // 4] * 3 + [score - 3 * (score // 4)]
+    return ((team_id, game_id, home, win, rng.randint(1, 100), rng.randint(15, 35),
+             rng.randint(0, 10) if season >= 1973 else None, fga, fgm, fgp, rng.randint(10, 30),
+             fta, ftm, ftp, 240, rng.randint(-30, 30), score, rng.randint(25, 40), rng.randint(5, 15),
+             None, rng.randint(3, 12) if season >= 1973 else None, tpa, tpm, tpp, rng.randint(8, 20))
+            + (tuple(quarters) if tracked else (None,) * 4)
+            + tuple(rng.randint(0, 40) if tracked else None for _ in range(9))
+            + (rng.randint(0, 3) if tracked else None, record[0], record[1]))
+
+
+PLAYER_STAT_COLUMNS = ['id', 'personId', 'gameId', 'teamId', 'assists', 'blocks', 'fieldGoalsAttempted',
+                       'fieldGoalsMade', 'fieldGoalsPercentage', 'foulsPersonal', 'freeThrowsAttempted',
+                       'freeThrowsMade', 'freeThrowsPercentage', 'numMinutes', 'plusMinusPoints', 'points',
+                       'reboundsDefensive', 'reboundsOffensive', 'reboundsTotal', 'steals',
+                       'threePointersAttempted', 'threePointersMade', 'threePointersPercentage', 'turnovers']
+TEAM_STAT_COLUMNS = ['teamId', 'gameId', 'home', 'win', 'coachId', 'assists', 'blocks', 'fieldGoalsAttempted',
+                     'fieldGoalsMade', 'fieldGoalsPercentage', 'foulsPersonal', 'freeThrowsAttempted',
+                     'freeThrowsMade', 'freeThrowsPercentage', 'numMinutes', 'plusMinusPoints', 'points',
+                     'reboundsDefensive', 'reboundsOffensive', 'reboundsTotal', 'steals',
+                     'threePointersAttempted', 'threePointersMade', 'threePointersPercentage', 'turnovers',
+                     'q1Points', 'q2Points', 'q3Points', 'q4Points', 'benchPoints', 'biggestLead',
+                     'biggestScoringRun', 'leadChanges', 'pointsFastBreak', 'pointsFromTurnovers',
+                     'pointsInThePaint', 'pointsSecondChance', 'timesTied', 'timeoutsRemaining',
+                     'seasonWins', 'seasonLosses']
+
+
+def generate_seasons(rng, plan, player_count):
+    """Yield (games, team stats, player stats) row lists one season at a time, keeping memory flat"""
+    row_id = 1
+    for season, regular, playoff, per_game in plan:
+        # Players active this season are a sliding window over the debut-ordered ids
+        center = (season - FIRST_SEASON) * player_count // (LAST_SEASON - FIRST_SEASON + 1)
+        width = max(400, min(teams_in(season), TEAM_COUNT) * 30)
+        low = max(0, min(center - width // 2, player_count - width))
+        active = range(FIRST_PERSON_ID + low, FIRST_PERSON_ID + min(low + width, player_count))
+
+        records = {}
+        games, team_stats, player_stats = [], [], []
+        for game_id, game_date, home, away, game_type in season_games(rng, season, regular, playoff):
+            home_score, away_score = rng.randint(80, 135), rng.randint(80, 135)
+            if home_score == away_score:
+                home_score += 1
+            winner = home if home_score > away_score else away
+            for team in (home, away):
+                wins, losses = records.get(team, (0, 0))
+                records[team] = (wins + 1, losses) if team == winner else (wins, losses + 1)
+            games.append((game_id, game_date, f"2:{rng.randint(0, 59):02d}", home, away,
+                          home_score, away_score, winner, home - FIRST_TEAM_ID + 1,
+                          rng.randint(8000, 21000), game_type, None))
+            team_stats.append(team_stat_row(rng, home, game_id, True, winner == home, home_score, season,
+                                            records[home]))
+            team_stats.append(team_stat_row(rng, away, game_id, False, winner == away, away_score, season,
+                                            records[away]))
+
+            count = int(per_game) + (rng.random() < per_game - int(per_game))
+            people = rng.sample(active, min(count, len(active)))
+            for number, person_id in enumerate(people):
+                team = home if number % 2 == 0 else away
+                player_stats.append(player_stat_row(rng, row_id, person_id, game_id, team, season))
+                row_id += 1
+        yield season, games, team_stats, player_stats
+
+
+def schedule_rows(games):
+    return [(f"00{game_id}", game_date.strftime('%Y-%m-%dT%H:%M:%SZ'), game_date.strftime('%A'),
+             None, None, None, None, None, None, None, None, None, None, home, away)
+            for game_id, game_date, _, home, away, *_ in games]
+
+
+def main():
+    if 'rds.amazonaws.com' in os.getenv('DB_SERVER', ''):
+        sys.exit("synthetic_db rebuilds the schema; point DB_* at a local database, not RDS")
+
+    target_games = int(os.getenv('SYNTHETIC_GAMES', 66000))
+    target_player_rows = int(os.getenv('SYNTHETIC_PLAYER_ROWS', 1500000))
+    player_count = int(os.getenv('SYNTHETIC_PLAYERS', 5000))
+    rng = random.Random(int(os.getenv('SYNTHETIC_SEED', 42)))
+    start_time = time.time()
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.fast_executemany = True
+    try:
+        cursor.execute("SELECT OBJECT_ID('dbo.Games')")
+        if cursor.fetchone()[0] is not None:
+            if os.getenv('SYNTHETIC_REPLACE', '0') != '1':
+                sys.exit("Database already has an NBA schema; set SYNTHETIC_REPLACE=1 to drop it")
+            drop_schema(cursor)
+            cursor.commit()
+
+        schema, deferred = schema_batches(os.getenv('SYNTHETIC_COLUMNSTORE', '0') == '1')
+        for batch in schema + [EXTRA_TABLES]:
+            cursor.execute(batch)
+        cursor.commit()
+        log_message("Created schema from create_database.sql")
+
+        teams, histories = team_rows(rng)
+        insert_rows(cursor, 'Teams', ['teamId', 'currentTeamName', 'currentTeamCity'], teams)
+        insert_rows(cursor, 'TeamHistories', ['teamId', 'teamCity', 'teamName', 'teamAbbrev', 'yearFounded',
+                                              'yearActiveTill'], histories)
+        insert_rows(cursor, 'Arenas', ['arenaId', 'arenaName', 'arenaCity', 'arenaState'],
+                    [(index + 1, f"Arena {index:02d}", f"City {index:02d}", 'State') for index in range(TEAM_COUNT)])
+        insert_rows(cursor, 'Coaches', ['coachId', 'firstName', 'lastName'],
+                    [(coach_id, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)) for coach_id in range(1, 101)])
+        players, info = player_rows(rng, player_count)
+        insert_rows(cursor, 'Players', ['personId', 'firstName', 'lastName', 'birthdate', 'school', 'country',
+                                        'height', 'bodyWeight', 'guard', 'forward', 'center', 'draftYear',
+                                        'draftRound', 'draftNumber', 'dleague'], players)
+        insert_rows(cursor, 'CommonPlayerInfo', ['person_id', 'first_name', 'last_name', 'birthdate', 'school',
+                                                 'country', 'height', 'weight', 'position', 'draft_year',
+                                                 'draft_round', 'draft_number', 'dleague_flag'], info)
+        log_message(f"Loaded {len(teams)} teams and {len(players)} players")
+
+        totals = {'Games': 0, 'TeamStatistics': 0, 'PlayerStatistics': 0}
+        plan = season_plan(target_games, target_player_rows)
+        for season, games, team_stats, player_stats in generate_seasons(rng, plan, player_count):
+            totals['Games'] += insert_rows(cursor, 'Games', ['gameId', 'gameDate', 'gameDuration', 'hometeamId',
+                                                             'awayteamId', 'homeScore', 'awayScore', 'winner',
+                                                             'arenaId', 'attendance', 'gameType',
+                                                             'tournamentRound'], games)
+            totals['TeamStatistics'] += insert_rows(cursor, 'TeamStatistics', TEAM_STAT_COLUMNS, team_stats)
+            totals['PlayerStatistics'] += insert_rows(cursor, 'PlayerStatistics', PLAYER_STAT_COLUMNS,
+                                                      player_stats)
+            if season == LAST_SEASON:
+                insert_rows(cursor, 'LeagueSchedule24_25', [
+                    'gameId', 'gameDateTimeEst', 'gameDay', 'arenaCity', 'arenaState', 'arenaName', 'gameLabel',
+                    'gameSubLabel', 'gameSubtype', 'gameSequence', 'seriesGameNumber', 'seriesText',
+                    'weekNumber', 'hometeamId', 'awayteamId'], schedule_rows(games))
+            log_message(f"Season {season}-{(season + 1) % 100:02d}: {len(games)} games, "
+                        f"{len(player_stats)} player rows. Totals: {totals}. "
+                        f"Elapsed: {time.time() - start_time:.0f}s")
+
+        for batch in deferred:
+            batch_start = time.time()
+            cursor.execute(batch)
+            cursor.commit()
+            log_message(f"Ran post-load batch ({batch.splitlines()[0][:60]}) in {time.time() - batch_start:.1f}s")
+
+        log_message(f"Synthetic database ready in {time.time() - start_time:.0f}s: {totals}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,126 +1,1122 @@
 import warnings
 warnings.filterwarnings('ignore', category=UserWarning)
+import json
+import os
+import queue
+import shutil
 import sys
+import threading
 import time
-from datetime import datetime
-from utils.db_utils import get_db_connection
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from utils.db_utils import get_db_connection, missing_objects
+from utils.output_writer import open_output
+from utils.chunking import AdaptiveChunkSizer
+from utils.metrics import Metrics, get_logger
+from utils.profiling import profiled
 
 
+logger = get_logger('/var/log/nba_backup.log')
+metrics = Metrics('nba_dump', '/var/log/nba_backup.metrics.jsonl')
+
 def log_message(message):
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    print(f"{timestamp} - {message}")
-    with open('/var/log/nba_backup.log', 'a') as f:
-        f.write(f"{timestamp} - {message}\n")
-        f.flush()
+    logger.info(message)
+
+
+# SQL Server rejects a table value constructor with more than 1000 rows
+MAX_INSERT_ROWS = 1000
+
+
+class SqlDumpWriter:
+    """
+    Keeps one output handle on the dump file (compressed and split into volumes
+    per OUTPUT_COMPRESSION / OUTPUT_VOLUME_MB) and batches rows into multi-row
+    INSERT statements, with a GO separator every go_every statements.
+    """
+
+    def __init__(self, filename, rows_per_insert=MAX_INSERT_ROWS, go_every=50):
+        self.filename = filename
+        self.rows_per_insert = max(1, min(rows_per_insert, MAX_INSERT_ROWS))
+        self.go_every = max(1, go_every)
+        self.file = open_output(filename)
+        self.statements_since_go = 0
+        self.chars_written = 0
+
+    def write(self, content):
+        self.file.write(content)
+        self.chars_written += len(content)
+
+    def render_inserts(self, insert_prefix, value_rows):
+        """Render formatted '(...)' value rows as INSERTs of up to rows_per_insert rows each"""
+        parts = []
+        for start in range(0, len(value_rows), self.rows_per_insert):
+            batch = value_rows[start:start + self.rows_per_insert]
+            parts.append(insert_prefix + ',\n'.join(batch) + ';\n')
+            self.statements_since_go += 1
+            if self.statements_since_go >= self.go_every:
+                parts.append('GO\n')
+                self.statements_since_go = 0
+        return ''.join(parts)
+
+    def render_end_batch(self):
+        """Close the current batch so following statements start a new one"""
+        if self.statements_since_go:
+            self.statements_since_go = 0
+            return 'GO\n'
+        return ''
+
+    def write_inserts(self, insert_prefix, value_rows):
+        self.write(self.render_inserts(insert_prefix, value_rows))
+
+    def end_batch(self):
+        self.write(self.render_end_batch())
+
+    def close(self):
+        self.file.close()
+        log_message(f"Output {self.file.summary()}")
+
+    @property
+    def bytes_out(self):
+        return self.file.bytes_out
+
+
+class StageTimer:
+    """Accumulates busy seconds per pipeline stage; each stage is only updated by its own thread"""
+
+    def __init__(self, stages):
+        self.busy = {stage: 0.0 for stage in stages}
+        self.last_table = dict(self.busy)  # busy seconds of the latest dump_table_data call
+
+    def add(self, stage, seconds):
+        self.busy[stage] += seconds
+
+    def summary(self, busy=None):
+        """Busy time per stage and the bottleneck, over everything so far or for the given busy dict"""
+        busy = self.busy if busy is None else busy
+        bottleneck = max(busy, key=busy.get)
+        stages = ', '.join(f"{stage} {seconds:.1f}s" for stage, seconds in busy.items())
+        return f"busy time: {stages}; bottleneck: {bottleneck}"
+
+
+def fetch_stage(cursor, query, sizer, chunk_queue, timer, stop):
+    """
+    Stream a table's rows onto chunk_queue in chunks sized by sizer, ending with
+    None (or an exception, then None). Stops early once stop is set.
+    """
+    try:
+        fetch_start = time.perf_counter()
+        cursor.execute(query)
+        while not stop.is_set():
+            rows = cursor.fetchmany(sizer.size)
+            fetch_time = time.perf_counter() - fetch_start
+            timer.add('fetch', fetch_time)
+            if not rows:
+                break
+            chunk_queue.put(rows)
+            sizer.observe(len(rows), fetch_time)
+            fetch_start = time.perf_counter()
+    except Exception as e:
+        chunk_queue.put(e)
+    finally:
+        cursor.close()
+        chunk_queue.put(None)
 
 
-def write_to_file(filename, content):
-    with open(filename, 'a', encoding='utf-8') as f:
-        f.write(content + '\n')
+def write_stage(writer, text_queue, timer, errors):
+    """Write rendered SQL text from text_queue until None; after an error keep draining so producers never block"""
+    while True:
+        text = text_queue.get()
+        if text is None:
+            break
+        if errors:
+            continue
+        try:
+            write_start = time.perf_counter()
+            writer.write(text)
+            timer.add('write', time.perf_counter() - write_start)
+        except Exception as e:
+            errors.append(e)
+
 
 def format_value(value):
+    """Generic literal encoder, used for column types without a specialized encoder"""
     if value is None:
         return 'NULL'
-    elif isinstance(value, (int, float)):
-        return str(value)
     elif isinstance(value, bool):
         return '1' if value else '0'
+    elif isinstance(value, (int, float)):
+        return str(value)
     else:
         return "'" + str(value).replace("'", "''") + "'"
 
-def main():
+
+def encode_bit(value):
+    return '1' if value else '0'
+
+def encode_decimal(value):
+    # Fixed-point text so Decimal('1E+1') doesn't come out in exponent form
+    return format(value, 'f')
+
+def encode_float(value):
+    return repr(float(value))
+
+def encode_date(value):
+    return "'" + value.isoformat() + "'"
+
+def encode_datetime(value):
+    # datetime only stores ~3ms precision, so milliseconds round-trip exactly. The
+    # 'T' form is ISO 8601, which datetime and smalldatetime read the same way under
+    # any DATEFORMAT or language; with a space they are read as ydm under DMY logins
+    return "'" + value.isoformat(sep='T', timespec='milliseconds') + "'"
+
+def encode_datetime2(value):
+    # datetimeoffset values carry their offset (+hh:mm), see decode_datetimeoffset
+    return "'" + value.isoformat(sep='T', timespec='microseconds') + "'"
+
+def encode_time(value):
+    return "'" + value.isoformat() + "'"
+
+def encode_nvarchar(value):
+    return "N'" + value.replace("'", "''") + "'"
+
+def encode_varchar(value):
+    return "'" + value.replace("'", "''") + "'"
+
+def encode_guid(value):
+    return "'" + str(value) + "'"
+
+def encode_binary(value):
+    return '0x' + bytes(value).hex()
+
+
+# sys.types name -> encoder for a non-NULL value of that type
+COLUMN_ENCODERS = {
+    'int': str,
+    'bigint': str,
+    'smallint': str,
+    'tinyint': str,
+    'bit': encode_bit,
+    'decimal': encode_decimal,
+    'numeric': encode_decimal,
+    'money': encode_decimal,
+    'smallmoney': encode_decimal,
+    'float': encode_float,
+    'real': encode_float,
+    'date': encode_date,
+    'datetime': encode_datetime,
+    'smalldatetime': encode_datetime,
+    'datetime2': encode_datetime2,
+    'datetimeoffset': encode_datetime2,
+    'time': encode_time,
+    'nvarchar': encode_nvarchar,
+    'nchar': encode_nvarchar,
+    'ntext': encode_nvarchar,
+    'varchar': encode_varchar,
+    'char': encode_varchar,
+    'text': encode_varchar,
+    'uniqueidentifier': encode_guid,
+    'binary': encode_binary,
+    'varbinary': encode_binary,
+}
+
+
+def build_row_formatter(data_types):
+    """
+    Compile a row formatter for a table from its column types (in column order).
+    The encoder for each column is chosen once here, so formatting a row does no
+    per-cell type dispatch beyond the NULL check.
+    """
+    encoders = tuple(COLUMN_ENCODERS.get(data_type, format_value) for data_type in data_types)
+
+    def format_row(row):
+        return '(' + ', '.join(['NULL' if value is None else encode(value)
+                                for encode, value in zip(encoders, row)]) + ')'
+
+    return format_row
+
+
+def get_column_metadata(cursor):
+    """Return sys.columns metadata for every user table, ordered by table and column_id"""
+    cursor.execute("""
+    SELECT
+        OBJECT_SCHEMA_NAME(o.object_id) as schema_name,
+        o.name as table_name,
+        c.name as column_name,
+        t.name as data_type,
+        c.max_length,
+        c.precision,
+        c.scale,
+        c.is_nullable,
+        c.is_identity
+    FROM sys.objects o
+    JOIN sys.columns c ON o.object_id = c.object_id
+    JOIN sys.types t ON c.user_type_id = t.user_type_id
+    WHERE o.type = 'U'
+    ORDER BY o.name, c.column_id
+    """)
+    return cursor.fetchall()
+
+
+def column_type_sql(column):
+    """Render a sys.columns row's type as it appears in a column definition, e.g. nvarchar(50)"""
+    type_sql = f"[{column.data_type}]"
+    if column.data_type in ('varchar', 'nvarchar', 'char', 'nchar'):
+        type_sql += f"({column.max_length if column.max_length != -1 else 'MAX'})"
+    elif column.data_type in ('decimal', 'numeric'):
+        type_sql += f"({column.precision},{column.scale})"
+    return type_sql
+
+def get_table_definitions(cursor):
+    """
+    Read sys.columns once and return (create_table_sql, tables) where tables maps
+    (schema, table) to its column names, sys.types names, declared types (as in
+a column definition) and identity flag.
+    """
+    create_table_sql = []
+    tables = {}
+    columns = []
+
+    for row in get_column_metadata(cursor):
+        key = (row.schema_name, row.table_name)
+        if key not in tables:
+            if columns:
+                create_table_sql.append(','.join(columns) + '\n);\nGO\n\n')
+            columns = [f"CREATE TABLE [{row.schema_name}].[{row.table_name}] ("]
+            tables[key] = {'columns': [], 'types': [], 'type_sql': [], 'identity': False}
+
+        column_def = f"\n    [{row.column_name}] {column_type_sql(row)}"
+
+        column_def += ' NULL' if row.is_nullable else ' NOT NULL'
+
+        if row.is_identity:
+            column_def += ' IDENTITY(1,1)'
+            tables[key]['identity'] = True
+
+        columns.append(column_def)
+        tables[key]['columns'].append(row.column_name)
+        tables[key]['types'].append(row.data_type)
+        tables[key]['type_sql'].append(column_type_sql(row))
+
+    if columns:
+        create_table_sql.append(','.join(columns) + '\n);\nGO\n\n')
+
+    return ''.join(create_table_sql), tables
+
+
+def get_index_and_constraint_sql(cursor):
+    """
+    Script primary keys, unique constraints, indexes and foreign keys from the catalog,
+    clustered indexes first so nonclustered ones are built once on the final layout.
+    """
+    cursor.execute("""
+    SELECT
+        OBJECT_SCHEMA_NAME(i.object_id) as schema_name,
+        OBJECT_NAME(i.object_id) as table_name,
+        i.name as index_name,
+        i.type_desc,
+        i.is_primary_key,
+        i.is_unique_constraint,
+        i.is_unique,
+        c.name as column_name,
+        ic.is_descending_key,
+        ic.is_included_column
+    FROM sys.indexes i
+    JOIN sys.index_columns ic ON i.object_id = ic.object_id AND i.index_id = ic.index_id
+    JOIN sys.columns c ON ic.object_id = c.object_id AND ic.column_id = c.column_id
+    JOIN sys.objects o ON i.object_id = o.object_id
+    WHERE o.type = 'U' AND i.type_desc IN ('CLUSTERED', 'NONCLUSTERED')
+    ORDER BY CASE WHEN i.type_desc = 'CLUSTERED' THEN 0 ELSE 1 END,
+             OBJECT_NAME(i.object_id), i.index_id, ic.is_included_column, ic.key_ordinal, ic.index_column_id
+    """)
+    indexes = {}
+    for row in cursor.fetchall():
+        index = indexes.setdefault((row.schema_name, row.table_name, row.index_name), {
+            'row': row, 'keys': [], 'includes': []})
+        if row.is_included_column:
+            index['includes'].append(f"[{row.column_name}]")
+        else:
+            index['keys'].append(f"[{row.column_name}] {'DESC' if row.is_descending_key else 'ASC'}")
+
+    statements = []
+    for (schema_name, table_name, index_name), index in indexes.items():
+        row = index['row']
+        table = f"[{schema_name}].[{table_name}]"
+        keys = ', '.join(index['keys'])
+        if row.is_primary_key or row.is_unique_constraint:
+            kind = 'PRIMARY KEY' if row.is_primary_key else 'UNIQUE'
+            statements.append(f"ALTER TABLE {table} ADD CONSTRAINT [{index_name}] {kind} {row.type_desc} ({keys});")
+        else:
+            unique = 'UNIQUE ' if row.is_unique else ''
+            statement = f"CREATE {unique}{row.type_desc} INDEX [{index_name}] ON {table} ({keys})"
+            if index['includes']:
+                statement += f" INCLUDE ({', '.join(index['includes'])})"
+            statements.append(statement + ';')
+
+    cursor.execute("""
+    SELECT
+        fk.name as fk_name,
+        OBJECT_SCHEMA_NAME(fk.parent_object_id) as schema_name,
+        OBJECT_NAME(fk.parent_object_id) as table_name,
+        pc.name as column_name,
+        OBJECT_SCHEMA_NAME(fk.referenced_object_id) as ref_schema_name,
+        OBJECT_NAME(fk.referenced_object_id) as ref_table_name,
+        rc.name as ref_column_name
+    FROM sys.foreign_keys fk
+    JOIN sys.foreign_key_columns fkc ON fk.object_id = fkc.constraint_object_id
+    JOIN sys.columns pc ON fkc.parent_object_id = pc.object_id AND fkc.parent_column_id = pc.column_id
+    JOIN sys.columns rc ON fkc.referenced_object_id = rc.object_id AND fkc.referenced_column_id = rc.column_id
+    ORDER BY fk.name, fkc.constraint_column_id
+    """)
+    foreign_keys = {}
+    for row in cursor.fetchall():
+        fk = foreign_keys.setdefault(row.fk_name, {'row': row, 'columns': [], 'ref_columns': []})
+        fk['columns'].append(f"[{row.column_name}]")
+        fk['ref_columns'].append(f"[{row.ref_column_name}]")
+    for fk_name, fk in foreign_keys.items():
+        row = fk['row']
+        statements.append(
+            f"ALTER TABLE [{row.schema_name}].[{row.table_name}] ADD CONSTRAINT [{fk_name}] "
+            f"FOREIGN KEY ({', '.join(fk['columns'])}) "
+            f"REFERENCES [{row.ref_schema_name}].[{row.ref_table_name}] ({', '.join(fk['ref_columns'])});")
+
+    return ''.join(statement + '\nGO\n' for statement in statements)
+
+
+@profiled(log_message)
+def dump_table_data(conn, query, out, render_chunk, chunk_size, queue_depth, timer, label):
+    """
+    Stream one query's rows to out through overlapping stages: a fetch thread,
+    formatting on this thread via render_chunk(rows) -> text, and a writer thread.
+    The bounded queues hold at most queue_depth chunks each, and the fetch size
+    starts at chunk_size and adapts to the memory budget. Returns the row count.
+    """
+    busy_before = dict(timer.busy)
+    write_errors = []
+    text_queue = queue.Queue(maxsize=queue_depth)
+    writer_thread = threading.Thread(target=write_stage, args=(out, text_queue, timer, write_errors))
+    writer_thread.start()
+
+    # The fetch thread owns its cursor until it finishes; this thread only cancels it
+    chunk_queue = queue.Queue(maxsize=queue_depth)
+    sizer = AdaptiveChunkSizer(chunk_size, label, log_message)
+    cursor = conn.cursor()
+    stop = threading.Event()
+    fetch_thread = threading.Thread(target=fetch_stage,
+                                    args=(cursor, query, sizer, chunk_queue, timer, stop))
+    fetch_thread.start()
+
+    start_time = time.time()
+    rows_processed = 0
+    finished = False
     try:
-        log_message("Starting SQL dump creation")
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        while True:
+            rows = chunk_queue.get()
+            if rows is None:
+                break
+            if isinstance(rows, Exception):
+                raise rows
+            if write_errors:
+                raise write_errors[0]
+
+            format_start = time.perf_counter()
+            text = render_chunk(rows)
+            timer.add('format', time.perf_counter() - format_start)
+            text_queue.put(text)
 
+            rows_processed += len(rows)
+            elapsed_time = time.time() - start_time
+            log_message(f"Processed {rows_processed} rows for {label}. "
+                        f"Speed: {rows_processed / elapsed_time:.1f} rows/sec")
+        finished = True
+    finally:
+        if not finished:
+            # A format or write error: stop fetching rather than read the rest of the table
+            stop.set()
+            try:
+                cursor.cancel()
+            except Exception:
+                pass  # the statement may already be done
+        # Unblock and reap the fetch thread, which puts at most one more chunk once stopped
+        while fetch_thread.is_alive():
+            try:
+                chunk_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        fetch_thread.join()
+        text_queue.put(None)
+        writer_thread.join()
+
+    if write_errors:
+        raise write_errors[0]
+    timer.last_table = {stage: seconds - busy_before[stage] for stage, seconds in timer.busy.items()}
+    for stage, seconds in timer.last_table.items():
+        metrics.record(stage, seconds, {'table': label}, {'rows': rows_processed})
+    return rows_processed
+
+
+# Tables holding partial box-score rows while a game is in LiveGames
+LIVE_GAME_TABLES = {'Games', 'PersistedGameTeams', 'TeamStatistics', 'PlayerStatistics'}
+
+
+def exclude_live_games(table_name, where=''):
+    """
+    Extend a table's WHERE clause to leave out rows of games the Lambda's live
+    mode has written partial box scores for; they are dumped once their final
+    load clears LiveGames
+    """
+    if table_name not in LIVE_GAME_TABLES:
+        return where
+    condition = "gameId NOT IN (SELECT gameId FROM [dbo].[LiveGames])"
+    if not where:
+        return f"WHERE {condition}"
+    return f"WHERE ({where.strip()[len('WHERE'):].strip()}) AND {condition}"
+
+
+def create_dump(conn, filename='NBA_Database.sql'):
+    """Write the schema and data of every user table to filename, returning the file size in bytes"""
+    cursor = conn.cursor()
+    start_time = time.time()
+    watermark = get_watermark(cursor)
+    chunk_size = int(os.getenv('EXPORT_CHUNK_SIZE', 50000))
+    queue_depth = int(os.getenv('DUMP_QUEUE_DEPTH', 2))
+    timer = StageTimer(['fetch', 'format', 'write'])
+    writer = SqlDumpWriter(
+        filename,
+        rows_per_insert=int(os.getenv('INSERT_BATCH_ROWS', MAX_INSERT_ROWS)),
+        go_every=int(os.getenv('GO_EVERY_STATEMENTS', 50)))
+
+    try:
         # Start the SQL file
-        with open('NBA_Database.sql', 'w', encoding='utf-8') as f:
-            f.write('USE master;\nGO\n\n')
-            f.write('IF DB_ID(\'NBA_Database\') IS NOT NULL\n\tDROP DATABASE NBA_Database;\nGO\n\n')
-            f.write('CREATE DATABASE NBA_Database;\nGO\n\n')
-            f.write('USE NBA_Database;\nGO\n\n')
+        writer.write('USE master;\nGO\n\n')
+        writer.write('IF DB_ID(\'NBA_Database\') IS NOT NULL\n\tDROP DATABASE NBA_Database;\nGO\n\n')
+        writer.write('CREATE DATABASE NBA_Database;\nGO\n\n')
+        writer.write('USE NBA_Database;\nGO\n\n')
 
         # Get and create tables
-        cursor.execute("""
-        SELECT
-            OBJECT_SCHEMA_NAME(o.object_id) as schema_name,
-            o.name as table_name,
-            c.name as column_name,
-            t.name as data_type,
-            c.max_length,
-            c.precision,
-            c.scale,
-            c.is_nullable,
-            c.is_identity
-        FROM sys.objects o
-        JOIN sys.columns c ON o.object_id = c.object_id
-        JOIN sys.types t ON c.user_type_id = t.user_type_id
-        WHERE o.type = 'U'
-        ORDER BY o.name, c.column_id
-        """)
-
-        current_table = None
-        columns = []
-
-        for row in cursor.fetchall():
-            if current_table != row.table_name:
-                if columns:
-                    write_to_file('NBA_Database.sql', ','.join(columns) + '\n);\nGO\n\n')
-                current_table = row.table_name
-                columns = [f"CREATE TABLE [{row.schema_name}].[{row.table_name}] ("]
-
-            column_def = f"\n    [{row.column_name}] [{row.data_type}]"
-
-            if row.data_type in ('varchar', 'nvarchar', 'char', 'nchar'):
-                column_def += f"({row.max_length if row.max_length != -1 else 'MAX'})"
-            elif row.data_type in ('decimal', 'numeric'):
-                column_def += f"({row.precision},{row.scale})"
-
-            column_def += ' NULL' if row.is_nullable else ' NOT NULL'
-
-            if row.is_identity:
-                column_def += ' IDENTITY(1,1)'
-
-            columns.append(column_def)
-
-        if columns:
-            write_to_file('NBA_Database.sql', ','.join(columns) + '\n);\nGO\n\n')
+        create_table_sql, tables = get_table_definitions(cursor)
+        writer.write(create_table_sql)
 
         # Export data
-        cursor.execute("SELECT TABLE_SCHEMA, TABLE_NAME FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_TYPE = 'BASE TABLE'")
-        tables = cursor.fetchall()
+        for (schema_name, table_name), table in tables.items():
+            log_message(f"Exporting data for {table_name}")
+            if table['identity']:
+                writer.write(f'SET IDENTITY_INSERT [{schema_name}].[{table_name}] ON;\nGO\n')
 
-        for table in tables:
-            log_message(f"Exporting data for {table.TABLE_NAME}")
-            write_to_file('NBA_Database.sql', f'SET IDENTITY_INSERT [{table.TABLE_SCHEMA}].[{table.TABLE_NAME}] ON;\nGO\n')
+            # A column list is required for explicit identity values and multi-row VALUES
+            column_list = ', '.join(f"[{name}]" for name in table['columns'])
+            insert_prefix = f"INSERT INTO [{schema_name}].[{table_name}] ({column_list}) VALUES\n"
+            format_row = build_row_formatter(table['types'])
 
-            offset = 0
-            chunk_size = int(os.getenv('EXPORT_CHUNK_SIZE', 50000))
+            rows_processed = dump_table_data(
+                conn, f"SELECT * FROM [{schema_name}].[{table_name}] {exclude_live_games(table_name)}", writer,
+                lambda rows: writer.render_inserts(insert_prefix, [format_row(row) for row in rows]),
+                chunk_size, queue_depth, timer, table_name)
 
-            while True:
-                cursor.execute(f"""
-                SELECT *
-                FROM [{table.TABLE_SCHEMA}].[{table.TABLE_NAME}]
-                ORDER BY (SELECT NULL)
-                OFFSET {offset} ROWS
-                FETCH NEXT {chunk_size} ROWS ONLY
-                """)
+            writer.end_batch()
+            if table['identity']:
+                writer.write(f'\nSET IDENTITY_INSERT [{schema_name}].[{table_name}] OFF;\nGO\n\n')
+            elapsed_time = time.time() - start_time
+            log_message(f"Finished {table_name}: {rows_processed} rows. "
+                        f"Written {writer.chars_written / 1024 / 1024:.1f} MB at "
+                        f"{writer.chars_written / 1024 / 1024 / elapsed_time:.2f} MB/s. "
+                        f"{timer.summary(timer.last_table)}")
 
-                rows = cursor.fetchall()
-                if not rows:
-                    break
+        # Indexes and constraints after the data, so rows load into heaps
+        writer.write('\n' + get_index_and_constraint_sql(cursor))
 
-                for row in rows:
-                    values = [format_value(val) for val in row]
-                    write_to_file('NBA_Database.sql',
-                                f"INSERT INTO [{table.TABLE_SCHEMA}].[{table.TABLE_NAME}] VALUES ({', '.join(values)});\n")
+    finally:
+        writer.close()
+
+    log_message(f"Dump pipeline {timer.summary()}")
+    save_watermark(watermark, 'sql')
+    dump_bytes = writer.bytes_out
+    elapsed_time = time.time() - start_time
+    log_message(f"Dump written: {dump_bytes / 1024 / 1024:.1f} MB in {elapsed_time:.1f}s "
+                f"({dump_bytes / 1024 / 1024 / elapsed_time:.2f} MB/s)")
+    return dump_bytes
+
+
+# Character-mode terminators for bulk data files; values containing them are rejected
+BULK_FIELD_TERMINATOR = '|~|'
+BULK_ROW_TERMINATOR = '\r\n'
+
+
+def bulk_text(value):
+    """Plain text for a bulk data field (no quoting; NULL is written as an empty field)"""
+    text = str(value)
+    if BULK_FIELD_TERMINATOR in text or '\n' in text or '\r' in text:
+        raise ValueError(f"Value contains a bulk terminator and cannot be written in char mode: {text!r}")
+    return text
+
+
+def bulk_datetime(value):
+    return value.isoformat(sep='T', timespec='milliseconds')
+
+
+def bulk_datetime2(value):
+    return value.isoformat(sep='T', timespec='microseconds')
+
+
+# sys.types name -> encoder for a non-NULL value in a bulk data file
+BULK_ENCODERS = {
+    'int': str,
+    'bigint': str,
+    'smallint': str,
+    'tinyint': str,
+    'bit': encode_bit,
+    'decimal': encode_decimal,
+    'numeric': encode_decimal,
+    'money': encode_decimal,
+    'smallmoney': encode_decimal,
+    'float': encode_float,
+    'real': encode_float,
+    'date': lambda value: value.isoformat(),
+    'datetime': bulk_datetime,
+    'smalldatetime': bulk_datetime,
+    'datetime2': bulk_datetime2,
+    'datetimeoffset': bulk_datetime2,
+    'time': lambda value: value.isoformat(),
+}
+
+
+def build_bulk_row_formatter(data_types):
+    """Compile a row -> data file line formatter for a table, like build_row_formatter"""
+    encoders = tuple(BULK_ENCODERS.get(data_type, bulk_text) for data_type in data_types)
+
+    def format_row(row):
+        return BULK_FIELD_TERMINATOR.join(['' if value is None else encode(value)
+                                           for encode, value in zip(encoders, row)]) + BULK_ROW_TERMINATOR
+
+    return format_row
+
+
+def render_format_file(column_names):
+    """Non-XML bcp format file describing a char-mode data file with the bulk terminators"""
+    lines = ['14.0', str(len(column_names))]
+    for position, column_name in enumerate(column_names, start=1):
+        terminator = BULK_ROW_TERMINATOR if position == len(column_names) else BULK_FIELD_TERMINATOR
+        terminator = terminator.replace('\r', '\\r').replace('\n', '\\n')
+        lines.append(f'{position}\tSQLCHAR\t0\t0\t"{terminator}"\t{position}\t{column_name}\t""')
+    return '\r\n'.join(lines) + '\r\n'
+
+
+def create_bulk_dump(conn, output_dir='NBA_Database_bulk'):
+    """
+    Write a bulk-load export: one UTF-8 char-mode data file and format file per
+    table, plus restore.sql, which creates heaps, BULK INSERTs them with TABLOCK
+    under the BULK_LOGGED recovery model, and only then builds indexes and
+    constraints and puts the recovery model back. Empty strings restore as NULL
+    in char mode. When OUTPUT_COMPRESSION or OUTPUT_VOLUME_MB change the data
+    file names, prepare_data.sh rebuilds each plain .dat file BULK INSERT reads.
+    Restore with: [sh prepare_data.sh &&] sqlcmd -i restore.sql -v DataDir="<absolute path to output_dir>"
+    Returns the total size of the data files in bytes.
+    """
+    cursor = conn.cursor()
+    start_time = time.time()
+    chunk_size = int(os.getenv('EXPORT_CHUNK_SIZE', 50000))
+    queue_depth = int(os.getenv('DUMP_QUEUE_DEPTH', 2))
+    timer = StageTimer(['fetch', 'format', 'write'])
+    os.makedirs(output_dir, exist_ok=True)
+    watermark = get_watermark(cursor)
+
+    create_table_sql, tables = get_table_definitions(cursor)
+    restore = [
+        'USE master;\nGO\n\n',
+        '-- Recovery model to put back after the load: the replaced database\'s, else the server default.\n',
+        '-- sqlcmd runs every batch on one session, so the temp table lasts until the end\n',
+        'SELECT COALESCE(\n'
+        '\t(SELECT recovery_model_desc FROM sys.databases WHERE name = \'NBA_Database\'),\n'
+        '\t(SELECT recovery_model_desc FROM sys.databases WHERE name = \'model\')) AS recoveryModel\n'
+        'INTO #OriginalRecovery;\nGO\n\n',
+        'IF DB_ID(\'NBA_Database\') IS NOT NULL\n\tDROP DATABASE NBA_Database;\nGO\n\n',
+        'CREATE DATABASE NBA_Database;\nGO\n\n',
+        '-- Minimal logging for the TABLOCK loads into heaps\n',
+        'ALTER DATABASE NBA_Database SET RECOVERY BULK_LOGGED;\nGO\n\n',
+        'USE NBA_Database;\nGO\n\n',
+        create_table_sql,
+    ]
+    # Shell commands turning compressed or split outputs back into plain .dat files
+    decompress = {'none': 'cat', 'gzip': 'gzip -dc', 'zstd': 'zstd -dc'}
+    prepare = []
+
+    data_bytes = 0
+    for (schema_name, table_name), table in tables.items():
+        log_message(f"Exporting bulk data for {table_name}")
+        data_file = f"{schema_name}.{table_name}.dat"
+        format_file = f"{schema_name}.{table_name}.fmt"
+
+        with open(os.path.join(output_dir, format_file), 'w', encoding='ascii', newline='') as f:
+            f.write(render_format_file(table['columns']))
+
+        format_row = build_bulk_row_formatter(table['types'])
+        out = open_output(os.path.join(output_dir, data_file))
+        try:
+            rows_processed = dump_table_data(
+                conn, f"SELECT * FROM [{schema_name}].[{table_name}] {exclude_live_games(table_name)}", out,
+                lambda rows: ''.join([format_row(row) for row in rows]),
+                chunk_size, queue_depth, timer, table_name)
+        finally:
+            out.close()
+        log_message(f"Output {out.summary()}")
+        data_bytes += out.bytes_out
+        volume_files = [volume['file'] for volume in out.volumes]
+        if volume_files != [data_file]:
+            prepare.append(f"{decompress[out.compression]} "
+                           + ' '.join(f"'{name}'" for name in volume_files) + f" > '{data_file}'\n")
+
+        keep_identity = 'KEEPIDENTITY, ' if table['identity'] else ''
+        restore.append(
+            f"BULK INSERT [{schema_name}].[{table_name}]\n"
+            f"FROM '$(DataDir)/{data_file}'\n"
+            f"WITH (FORMATFILE = '$(DataDir)/{format_file}', CODEPAGE = '65001', "
+            f"{keep_identity}KEEPNULLS, TABLOCK);\nGO\n\n")
+        log_message(f"Finished {table_name}: {rows_processed} rows. {timer.summary(timer.last_table)}")
+
+    restore.append('-- Indexes and constraints once the data is in\n')
+    restore.append(get_index_and_constraint_sql(cursor))
+    restore.append('\nUSE master;\nGO\n\n'
+                   'DECLARE @recoveryModel nvarchar(60) = (SELECT recoveryModel FROM #OriginalRecovery);\n'
+                   'EXEC(\'ALTER DATABASE NBA_Database SET RECOVERY \' + @recoveryModel);\n'
+                   'DROP TABLE #OriginalRecovery;\nGO\n')
+
+    prepare_path = os.path.join(output_dir, 'prepare_data.sh')
+    if prepare:
+        restore.insert(0, '-- The data files were compressed or split into volumes: run prepare_data.sh\n'
+                          '-- in DataDir first to rebuild the .dat files this script reads\n')
+        with open(prepare_path, 'w', encoding='utf-8', newline='\n') as f:
+            f.write('#!/bin/sh\n# Rebuild each .dat file restore.sql reads from its compressed or split output\n'
+                    'set -e\ncd "$(dirname "$0")"\n' + ''.join(prepare))
+    elif os.path.exists(prepare_path):
+        os.remove(prepare_path)  # left by an earlier compressed dump into the same directory
+    with open(os.path.join(output_dir, 'restore.sql'), 'w', encoding='utf-8') as f:
+        f.write(''.join(restore))
+
+    save_watermark(watermark, 'bulk')
+    elapsed_time = time.time() - start_time
+    log_message(f"Bulk dump written: {data_bytes / 1024 / 1024:.1f} MB in {elapsed_time:.1f}s "
+                f"({data_bytes / 1024 / 1024 / elapsed_time:.2f} MB/s). {timer.summary()}")
+    return data_bytes
+
+def get_table_dependencies(cursor):
+    """Map each (schema, table) to the set of other tables its foreign keys reference"""
+    cursor.execute("""
+    SELECT DISTINCT
+        OBJECT_SCHEMA_NAME(parent_object_id) as schema_name,
+        OBJECT_NAME(parent_object_id) as table_name,
+        OBJECT_SCHEMA_NAME(referenced_object_id) as ref_schema_name,
+        OBJECT_NAME(referenced_object_id) as ref_table_name
+    FROM sys.foreign_keys
+    WHERE parent_object_id <> referenced_object_id
+    """)
+    dependencies = {}
+    for row in cursor.fetchall():
+        dependencies.setdefault((row.schema_name, row.table_name), set()).add(
+            (row.ref_schema_name, row.ref_table_name))
+    return dependencies
+
+
+def get_restore_stages(tables, dependencies):
+    """
+    Group tables into restore stages: a table's stage is one past the deepest table
+    it references, so every stage only depends on earlier ones and the tables
+    (and shards) within a stage can be loaded concurrently.
+    """
+    levels = {}
+
+    def level(table, visiting=()):
+        if table not in levels:
+            refs = [ref for ref in dependencies.get(table, ()) if ref in tables and ref not in visiting]
+            levels[table] = 1 + max((level(ref, visiting + (table,)) for ref in refs), default=-1)
+        return levels[table]
+
+    stages = {}
+    for table in tables:
+        stages.setdefault(level(table), []).append(table)
+    return [sorted(stages[stage]) for stage in sorted(stages)]
+
+
+def plan_shards(cursor, schema_name, table_name, data_types, column_names, shard_rows):
+    """
+    Split a table into key-range shard predicates on the leading clustered index
+    column, using NTILE boundaries so shards hold about shard_rows rows each even
+    when the key is unevenly distributed. Returns a list of WHERE clauses ('' for
+    an unsharded table).
+    """
+    cursor.execute(f"SELECT COUNT_BIG(*) FROM [{schema_name}].[{table_name}]")
+    total_rows = cursor.fetchone()[0]
+    shard_count = -(-total_rows // shard_rows) if shard_rows > 0 else 1
+    if shard_count <= 1:
+        return ['']
+
+    cursor.execute("""
+    SELECT c.name
+    FROM sys.indexes i
+    JOIN sys.index_columns ic ON i.object_id = ic.object_id AND i.index_id = ic.index_id
+    JOIN sys.columns c ON ic.object_id = c.object_id AND ic.column_id = c.column_id
+    WHERE i.object_id = OBJECT_ID(?) AND i.index_id = 1 AND ic.key_ordinal = 1
+    """, f"[{schema_name}].[{table_name}]")
+    key_row = cursor.fetchone()
+    if key_row is None:
+        return ['']  # heap: no ordered key to range on
+    key = key_row[0]
+    encode = COLUMN_ENCODERS.get(data_types[column_names.index(key)], format_value)
+
+    cursor.execute(f"""
+    SELECT MIN([{key}])
+    FROM (
+        SELECT [{key}], NTILE({shard_count}) OVER (ORDER BY [{key}]) as tile
+        FROM [{schema_name}].[{table_name}]
+        WHERE [{key}] IS NOT NULL
+    ) AS tiles
+    GROUP BY tile
+    ORDER BY tile
+    """)
+    # A value can span tiles, so drop repeated boundaries
+    boundaries = []
+    for row in cursor.fetchall()[1:]:
+        literal = encode(row[0])
+        if literal not in boundaries:
+            boundaries.append(literal)
+    if not boundaries:
+        return ['']
+
+    predicates = [f"WHERE [{key}] < {boundaries[0]} OR [{key}] IS NULL"]
+    for lower, upper in zip(boundaries, boundaries[1:]):
+        predicates.append(f"WHERE [{key}] >= {lower} AND [{key}] < {upper}")
+    predicates.append(f"WHERE [{key}] >= {boundaries[-1]}")
+    return predicates
+
+
+def dump_shard(shard, chunk_size, queue_depth, conn=None):
+    """
+    Write one shard as a standalone INSERT script, over its own connection unless
+    conn is given; returns (rows, seconds)
+    """
+    start_time = time.time()
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    timer = StageTimer(['fetch', 'format', 'write'])
+    writer = SqlDumpWriter(shard['path'],
+                           rows_per_insert=int(os.getenv('INSERT_BATCH_ROWS', MAX_INSERT_ROWS)),
+                           go_every=int(os.getenv('GO_EVERY_STATEMENTS', 50)))
+    table = f"[{shard['schema']}].[{shard['table']}]"
+    try:
+        writer.write('USE NBA_Database;\nGO\n\n')
+        if shard['identity']:
+            writer.write(f'SET IDENTITY_INSERT {table} ON;\nGO\n')
+        column_list = ', '.join(f"[{name}]" for name in shard['columns'])
+        insert_prefix = f"INSERT INTO {table} ({column_list}) VALUES\n"
+        format_row = build_row_formatter(shard['types'])
+        rows_processed = dump_table_data(
+            conn, f"SELECT * FROM {table} {exclude_live_games(shard['table'], shard['predicate'])}", writer,
+            lambda rows: writer.render_inserts(insert_prefix, [format_row(row) for row in rows]),
+            chunk_size, queue_depth, timer, os.path.basename(shard['path']))
+        writer.end_batch()
+        if shard['identity']:
+            writer.write(f'\nSET IDENTITY_INSERT {table} OFF;\nGO\n')
+    finally:
+        writer.close()
+        if own_conn:
+            conn.close()
+    shard['volumes'] = [volume['file'] for volume in writer.file.volumes]
+    log_message(f"Finished shard {os.path.basename(shard['path'])}: {rows_processed} rows, {timer.summary(timer.last_table)}")
+    return rows_processed, time.time() - start_time
+
+
+def create_sharded_dump(conn, output_dir='NBA_Database_shards'):
+    """
+    Write the database as independently restorable INSERT scripts: a schema file,
+    one file per table or per key-range shard of large tables (dumped in parallel
+    over DUMP_WORKERS connections), a constraints file, and manifest.json listing
+    the shards in FK-dependency stages. Restore the schema, then each stage's
+    files in any order or concurrently, then the constraints.
+
+    The files are written to a fresh <output_dir>.partial directory that
+    replaces output_dir once complete, so no shard of an earlier run survives.
+    Parallel shards are read on separate connections at different times, so
+    with writes going on they need not match each other (a PlayerStatistics
+    shard may hold games a Games shard lacks). DUMP_SHARD_CONSISTENCY=snapshot
+    reads every shard in one SNAPSHOT transaction instead, one at a time.
+    Returns the total size of the written files in bytes.
+    """
+    cursor = conn.cursor()
+    start_time = time.time()
+    chunk_size = int(os.getenv('EXPORT_CHUNK_SIZE', 50000))
+    queue_depth = int(os.getenv('DUMP_QUEUE_DEPTH', 2))
+    shard_rows = int(os.getenv('SHARD_ROWS', 250000))
+    workers = int(os.getenv('DUMP_WORKERS', 2))
+    consistency = os.getenv('DUMP_SHARD_CONSISTENCY', 'independent')
+    if consistency not in ('independent', 'snapshot'):
+        raise ValueError("DUMP_SHARD_CONSISTENCY must be independent or snapshot")
+    final_dir = output_dir
+    output_dir = final_dir + '.partial'
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir)
+    watermark = get_watermark(cursor)
+
+    create_table_sql, tables = get_table_definitions(cursor)
+    with open(os.path.join(output_dir, 'schema.sql'), 'w', encoding='utf-8') as f:
+        f.write('USE master;\nGO\n\n')
+        f.write('IF DB_ID(\'NBA_Database\') IS NOT NULL\n\tDROP DATABASE NBA_Database;\nGO\n\n')
+        f.write('CREATE DATABASE NBA_Database;\nGO\n\n')
+        f.write('USE NBA_Database;\nGO\n\n')
+        f.write(create_table_sql)
+    with open(os.path.join(output_dir, 'constraints.sql'), 'w', encoding='utf-8') as f:
+        f.write('USE NBA_Database;\nGO\n\n')
+        f.write(get_index_and_constraint_sql(cursor))
+
+    shards = {}
+    for (schema_name, table_name), table in tables.items():
+        predicates = plan_shards(cursor, schema_name, table_name, table['types'], table['columns'], shard_rows)
+        shards[(schema_name, table_name)] = [{
+            'schema': schema_name,
+            'table': table_name,
+            'columns': table['columns'],
+            'types': table['types'],
+            'identity': table['identity'],
+            'predicate': predicate,
+            'path': os.path.join(output_dir, f"{schema_name}.{table_name}.{number:03d}.sql"),
+        } for number, predicate in enumerate(predicates)]
+        log_message(f"Planned {len(predicates)} shard(s) for {table_name}")
+
+    all_shards = [shard for table_shards in shards.values() for shard in table_shards]
+    if consistency == 'snapshot':
+        cursor.execute("SELECT snapshot_isolation_state FROM sys.databases WHERE database_id = DB_ID()")
+        if cursor.fetchone()[0] != 1:
+            raise Exception("DUMP_SHARD_CONSISTENCY=snapshot needs "
+                            "ALTER DATABASE CURRENT SET ALLOW_SNAPSHOT_ISOLATION ON")
+        snapshot_conn = get_db_connection()
+        try:
+            snapshot_conn.execute("SET TRANSACTION ISOLATION LEVEL SNAPSHOT")
+            results = [dump_shard(shard, chunk_size, queue_depth, snapshot_conn) for shard in all_shards]
+            snapshot_conn.commit()
+        finally:
+            snapshot_conn.close()
+        log_message(f"Read {len(all_shards)} shards in one snapshot")
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(lambda shard: dump_shard(shard, chunk_size, queue_depth), all_shards))
+        if workers > 1 and len(all_shards) > 1:
+            log_message("Shards were read at different times and may not match each other if the database "
+                        "was written meanwhile; set DUMP_SHARD_CONSISTENCY=snapshot for a consistent dump")
+
+    rows_by_path = {shard['path']: rows for shard, (rows, _) in zip(all_shards, results)}
+    stages = get_restore_stages(list(tables), get_table_dependencies(cursor))
+    manifest = {
+        'created': datetime.now().isoformat(),
+        'schema': 'schema.sql',
+        'stages': [[{
+            'table': f"{schema_name}.{table_name}",
+            'files': [{'file': os.path.basename(shard['path']),
+                       'volumes': shard['volumes'],
+                       'predicate': shard['predicate'],
+                       'rows': rows_by_path[shard['path']]}
+                      for shard in shards[(schema_name, table_name)]],
+        } for schema_name, table_name in stage] for stage in stages],
+        'constraints': 'constraints.sql',
+    }
+    with open(os.path.join(output_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    dump_bytes = sum(os.path.getsize(os.path.join(output_dir, name)) for name in os.listdir(output_dir)
+                     if os.path.isfile(os.path.join(output_dir, name)))
+    shutil.rmtree(final_dir, ignore_errors=True)
+    os.rename(output_dir, final_dir)
+    save_watermark(watermark, 'sharded')
+    elapsed_time = time.time() - start_time
+    log_message(f"Sharded dump written: {len(all_shards)} shards in {len(stages)} restore stages, "
+                f"{dump_bytes / 1024 / 1024:.1f} MB in {elapsed_time:.1f}s "
+                f"({dump_bytes / 1024 / 1024 / elapsed_time:.2f} MB/s)")
+    return dump_bytes
+
+# Rows a differential dump includes from the per-game tables, relative to the
+# {since} gameDate watermark. Every other table is small reference data and is
+# merged whole, so edits to players, teams, coaches or histories are patched too
+DIFF_TABLE_FILTERS = {
+    'Games': "WHERE gameDate > '{since}'",
+    'PersistedGameTeams': "WHERE gameDate > '{since}'",
+    'TeamStatistics': "WHERE gameId IN (SELECT gameId FROM Games WHERE gameDate > '{since}')",
+    'PlayerStatistics': "WHERE gameId IN (SELECT gameId FROM Games WHERE gameDate > '{since}')",
+}
+
+# The Lambda's own bookkeeping, which means nothing to a copy of the database
+DIFF_SKIPPED_TABLES = {'FailedGames', 'LiveGames'}
+
+DUMP_STATE_FILE = 'dump_watermark.json'
+
+
+def watermark_path():
+    """dump_watermark.json in DUMP_OUTPUT_DIR, next to the dumps it describes"""
+    return os.path.join(os.getenv('DUMP_OUTPUT_DIR', '.'), DUMP_STATE_FILE)
+
+
+def get_watermark(cursor):
+    """Latest gameDate dumped, the point a later differential dump starts from"""
+    cursor.execute(f"SELECT MAX(gameDate) FROM Games {exclude_live_games('Games')}")
+    return cursor.fetchone()[0]
 
-                offset += chunk_size
-                log_message(f"Processed {offset} rows for {table.TABLE_NAME}")
 
-            write_to_file('NBA_Database.sql', f'\nSET IDENTITY_INSERT [{table.TABLE_SCHEMA}].[{table.TABLE_NAME}] OFF;\nGO\n\n')
+def save_watermark(watermark, dump_type, state_file=None):
+    with open(state_file or watermark_path(), 'w', encoding='utf-8') as f:
+        json.dump({'gameDate': watermark.isoformat(sep=' '), 'dump': dump_type,
+                   'created': datetime.now().isoformat()}, f, indent=2)
 
+
+def load_watermark(state_file=None):
+    """Return the gameDate watermark recorded by the previous dump, or None"""
+    state_file = state_file or watermark_path()
+    if not os.path.exists(state_file):
+        return None
+    with open(state_file, encoding='utf-8') as f:
+        return datetime.fromisoformat(json.load(f)['gameDate'])
+
+
+def get_primary_keys(cursor):
+    """Map each (schema, table) to its primary key column names"""
+    cursor.execute("""
+    SELECT
+        OBJECT_SCHEMA_NAME(i.object_id) as schema_name,
+        OBJECT_NAME(i.object_id) as table_name,
+        c.name as column_name
+    FROM sys.indexes i
+    JOIN sys.index_columns ic ON i.object_id = ic.object_id AND i.index_id = ic.index_id
+    JOIN sys.columns c ON ic.object_id = c.object_id AND ic.column_id = c.column_id
+    WHERE i.is_primary_key = 1
+    ORDER BY i.object_id, ic.key_ordinal
+    """)
+    primary_keys = {}
+    for row in cursor.fetchall():
+        primary_keys.setdefault((row.schema_name, row.table_name), []).append(row.column_name)
+    return primary_keys
+
+
+def render_merge(schema_name, table_name, columns, type_sql, keys, value_rows, update_columns):
+    """
+    One MERGE upserting value_rows (formatted '(...)' rows) on the key columns.
+    SQL Server types a VALUES column from its values, so a column NULL in every
+    row would come out int and clash with e.g. a date target. A leading row of
+    CAST(NULL AS <declared type>) fixes each column's type; it is filtered out
+    again on the first key, which is never NULL.
+    """
+    column_list = ', '.join(f"[{name}]" for name in columns)
+    on_clause = ' AND '.join(f"target.[{key}] = source.[{key}]" for key in keys)
+    typed_row = '(' + ', '.join(f"CAST(NULL AS {type_name})" for type_name in type_sql) + ')'
+    merge = [
+        f"MERGE INTO [{schema_name}].[{table_name}] AS target\n",
+        "USING (SELECT * FROM (VALUES\n" + ',\n'.join([typed_row] + value_rows)
+        + f"\n) AS typed ({column_list}) WHERE [{keys[0]}] IS NOT NULL) AS source\n",
+        f"ON {on_clause}\n",
+    ]
+    if update_columns:
+        set_list = ', '.join(f"[{name}] = source.[{name}]" for name in update_columns)
+        merge.append(f"WHEN MATCHED THEN UPDATE SET {set_list}\n")
+    merge.append(f"WHEN NOT MATCHED THEN INSERT ({column_list}) "
+                 f"VALUES ({', '.join(f'source.[{name}]' for name in columns)});\n")
+    return ''.join(merge)
+
+
+def create_differential_dump(conn, filename='NBA_Database_patch.sql', since=None, state_file=None):
+    """
+    Write an idempotent patch of MERGE statements for games after the previous
+    dump's watermark, minus DIFF_LOOKBACK_DAYS to cover the Lambda re-merging
+    recent games, along with their team/player statistics, plus every row of the
+    reference tables. Corrections to games older than that window and deleted
+    rows are not carried; a full dump picks them up. Pass since (or DIFF_SINCE)
+    to regenerate a patch from a fixed point. Returns the patch size in bytes,
+    or None when there is no watermark yet and a full dump is needed first.
+    """
+    cursor = conn.cursor()
+    start_time = time.time()
+    state_file = state_file or watermark_path()
+    if since is None:
+        since = load_watermark(state_file)
+        if since is None:
+            log_message(f"No watermark in {state_file}; run a full dump before a differential one")
+            return None
+        since -= timedelta(days=int(os.getenv('DIFF_LOOKBACK_DAYS', 3)))
+    since_str = since.strftime('%Y-%m-%dT%H:%M:%S')
+    new_watermark = get_watermark(cursor)
+
+    _, tables = get_table_definitions(cursor)
+    primary_keys = get_primary_keys(cursor)
+    stages = get_restore_stages(list(tables), get_table_dependencies(cursor))
+    chunk_size = min(int(os.getenv('INSERT_BATCH_ROWS', MAX_INSERT_ROWS)), MAX_INSERT_ROWS)
+
+    writer = SqlDumpWriter(filename, go_every=1)
+    try:
+        writer.write(f"-- Differential patch for games after {since_str}, generated {datetime.now().isoformat()}\n")
+        writer.write('-- Safe to apply more than once\n')
+        writer.write('USE NBA_Database;\nGO\n\n')
+
+        for stage in stages:
+            for schema_name, table_name in stage:
+                if table_name in DIFF_SKIPPED_TABLES:
+                    continue
+                table = tables[(schema_name, table_name)]
+                keys = primary_keys.get((schema_name, table_name))
+                if not keys:
+                    log_message(f"Skipping {table_name}: no primary key to merge on")
+                    continue
+
+                identity_columns = set()
+                if table['identity']:
+                    cursor.execute(
+                        "SELECT name FROM sys.columns WHERE object_id = OBJECT_ID(?) AND is_identity = 1",
+                        f"[{schema_name}].[{table_name}]")
+                    identity_columns = {row.name for row in cursor.fetchall()}
+                    writer.write(f'SET IDENTITY_INSERT [{schema_name}].[{table_name}] ON;\nGO\n')
+                update_columns = [name for name in table['columns']
+                                  if name not in keys and name not in identity_columns]
+
+                format_row = build_row_formatter(table['types'])
+                cursor.execute(f"SELECT * FROM [{schema_name}].[{table_name}] "
+                               + exclude_live_games(table_name, DIFF_TABLE_FILTERS.get(table_name, '').format(since=since_str)))
+                rows_processed = 0
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    writer.write(render_merge(schema_name, table_name, table['columns'], table['type_sql'], keys,
+                                              [format_row(row) for row in rows], update_columns))
+                    writer.write('GO\n')
+                    rows_processed += len(rows)
+
+                if table['identity']:
+                    writer.write(f'SET IDENTITY_INSERT [{schema_name}].[{table_name}] OFF;\nGO\n')
+                writer.write('\n')
+                log_message(f"Patch rows for {table_name}: {rows_processed}")
+    finally:
+        writer.close()
+
+    save_watermark(new_watermark, 'differential', state_file)
+    patch_bytes = writer.bytes_out
+    log_message(f"Differential patch written: {patch_bytes / 1024 / 1024:.2f} MB in "
+                f"{time.time() - start_time:.1f}s (games after {since_str})")
+    return patch_bytes
+
+def main():
+    try:
+        log_message("Starting SQL dump creation")
+        with metrics.stage('setup', table='all'):
+            conn = get_db_connection()
+            # Live-mode partial rows are left out, which needs LiveGames
+            if missing_objects(conn.cursor(), ['LiveGames']):
+                raise Exception("Database is missing LiveGames; run sql/upgrade_database.sql")
+        dump_format = os.getenv('DUMP_FORMAT', 'sql')
+        output_dir = os.getenv('DUMP_OUTPUT_DIR', '.')
+        os.makedirs(output_dir, exist_ok=True)
+        if dump_format in ('sql', 'both'):
+            create_dump(conn, os.path.join(output_dir, 'NBA_Database.sql'))
+        if dump_format in ('bulk', 'both'):
+            create_bulk_dump(conn, os.path.join(output_dir, 'NBA_Database_bulk'))
+        if dump_format == 'sharded':
+            create_sharded_dump(conn, os.path.join(output_dir, 'NBA_Database_shards'))
+        if dump_format == 'diff':
+            since = os.getenv('DIFF_SINCE')
+            create_differential_dump(conn, os.path.join(output_dir, 'NBA_Database_patch.sql'),
+                                     since=datetime.fromisoformat(since) if since else None)
+        log_message(f"Stage totals: {metrics.summary()}")
         log_message("SQL dump creation completed successfully")
 
     except Exception as e:
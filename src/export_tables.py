@@ -1,35 +1,78 @@
 import warnings
 warnings.filterwarnings('ignore', category=UserWarning)
+import numpy as np
 import pandas as pd
+import os
+import queue
 import sys
 import time
-from datetime import datetime
-import gc
-from utils.db_utils import get_db_connection
+from concurrent.futures import ThreadPoolExecutor
+from utils.db_utils import get_db_connection, missing_objects, schedule_tables
+from utils.chunking import AdaptiveChunkSizer
+from utils.output_writer import open_output
+from utils.export_manifest import PartitionManifest
+from utils.csv_index import day_blocks
+from utils.metrics import Metrics, get_logger
+from utils.profiling import profiled
+
+logger = get_logger('nba_export.log')
+metrics = Metrics('nba_export', 'nba_export.metrics.jsonl')
 
 def log_message(message):
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    print(f"{timestamp} - {message}")
-    with open('nba_export.log', 'a') as f:
-        f.write(f"{timestamp} - {message}\n")
-        f.flush()
-
-def setup_session_gameteams(conn):
-    """Create persistent GameTeams table with minimal resource usage"""
+    logger.info(message)
+
+def close_quietly(out):
+    """Close a partially written output after a failed export"""
+    if out is not None:
+        try:
+            out.close()
+        except:
+            pass
+
+def read_hint():
+    """
+    Table hint for export reads: NOLOCK by default, none under
+    EXPORT_CONSISTENCY=snapshot, where a hint would override the snapshot
+    and read uncommitted rows again.
+    """
+    return '' if os.getenv('EXPORT_CONSISTENCY', 'nolock') == 'snapshot' else 'WITH (NOLOCK)'
+
+def gameteams_table():
+    """
+    GameTeams source for the export queries: the PersistedGameTeams table the
+    Lambda keeps up to date (EXPORT_GAMETEAMS=persisted, the default), or a
+    temp copy of the view (session). Snapshot readers each fill their own
+    #GameTeams from their snapshot; under nolock one global ##GameTeams_<pid>,
+    built once on the main connection, serves every worker.
+    """
+    if os.getenv('EXPORT_GAMETEAMS', 'persisted') != 'session':
+        return 'PersistedGameTeams'
+    if os.getenv('EXPORT_CONSISTENCY', 'nolock') == 'snapshot':
+        return '#GameTeams'
+    return f'##GameTeams_{os.getpid()}'
+
+def setup_session_gameteams(conn, populate=True):
+    """
+    Create the session GameTeams table (see gameteams_table) on conn with
+    minimal resource usage. With populate=False only the empty indexed table
+    is created, so it can be filled later by populate_session_gameteams inside
+    a snapshot transaction.
+    """
+    table = gameteams_table()
     try:
         log_message("Starting GameTeams table setup...")
         
         # Cleanup first
-        cleanup_query = """
-        IF OBJECT_ID('tempdb..##GameTeams') IS NOT NULL
-            DROP TABLE ##GameTeams;
+        cleanup_query = f"""
+        IF OBJECT_ID('tempdb..{table}') IS NOT NULL
+            DROP TABLE {table};
         """
         conn.execute(cleanup_query)
         log_message("Cleaned up any existing GameTeams table")
         
-        # Create and populate in smaller batches
-        setup_query = """
-        CREATE TABLE ##GameTeams (
+        # The pid keeps a global copy apart from other exporters running at the same time
+        setup_query = f"""
+        CREATE TABLE {table} (
             gameId bigint,
             gameDate datetime,
             hometeamId int,
@@ -42,322 +85,943 @@ def setup_session_gameteams(conn):
             awayteamCity varchar(50),
             awayteamName varchar(50)
         );
-
-        INSERT INTO ##GameTeams
-        SELECT * FROM GameTeams WITH (NOLOCK)
-        OPTION (MAXDOP 1);  -- Use single thread to reduce resource usage
-
+        """
+        index_query = f"""
         CREATE CLUSTERED INDEX IX_GameTeams_Date 
-        ON ##GameTeams(gameDate DESC, gameId DESC)
+        ON {table}(gameDate DESC, gameId DESC)
         WITH (MAXDOP = 1, SORT_IN_TEMPDB = OFF);
 
         CREATE NONCLUSTERED INDEX IX_GameTeams_GameId
-        ON ##GameTeams(gameId)
+        ON {table}(gameId)
         WITH (MAXDOP = 1, SORT_IN_TEMPDB = OFF);
         """
         
         conn.execute(setup_query)
-        log_message("Persistent GameTeams table created successfully")
+        if populate:
+            # Load before indexing; an empty table is indexed up front instead
+            populate_session_gameteams(conn)
+        conn.execute(index_query)
+        log_message("Session GameTeams table created successfully")
         return True
         
     except Exception as e:
-        log_message(f"Error creating persistent GameTeams table: {str(e)}")
+        log_message(f"Error creating session GameTeams table: {str(e)}")
         try:
-            conn.execute("DROP TABLE IF EXISTS ##GameTeams;")
+            conn.execute(f"DROP TABLE IF EXISTS {table};")
         except:
             pass
         return False
-    
+
+def populate_session_gameteams(conn):
+    """Fill the session GameTeams table from the UniqueGameTeams view under the connection's current isolation"""
+    conn.execute(f"""
+    INSERT INTO {gameteams_table()}
+    SELECT * FROM UniqueGameTeams {read_hint()}
+    OPTION (MAXDOP 1);  -- Use single thread to reduce resource usage
+    """)
+
+def not_live(column):
+    """
+    Condition leaving out games the Lambda's live mode has written partial box
+    scores for; they are exported once their final load clears LiveGames
+    """
+    return f"{column} NOT IN (SELECT gameId FROM LiveGames {read_hint()})"
+
+# Tables whose writes a snapshot pin must not straddle
+SNAPSHOT_TABLES = ['Games', 'PersistedGameTeams', 'Teams', 'TeamHistories', 'Players',
+                   'TeamStatistics', 'PlayerStatistics', 'LiveGames']
+
+def check_snapshot_isolation(conn):
+    """Fail early with the fix when the database does not allow SNAPSHOT isolation"""
+    query = "SELECT snapshot_isolation_state FROM sys.databases WHERE database_id = DB_ID()"
+    if int(pd.read_sql(query, conn).iloc[0]['snapshot_isolation_state']) != 1:
+        raise Exception("EXPORT_CONSISTENCY=snapshot needs "
+                        "ALTER DATABASE CURRENT SET ALLOW_SNAPSHOT_ISOLATION ON")
+
+def get_write_marker(conn):
+    """
+    Cheap fingerprint of write activity on the exported tables: the last update
+    time of each, plus the number of sessions holding write locks on them. Both
+    come from DMVs, so reading them takes no locks on the data.
+    """
+    object_ids = ', '.join(f"OBJECT_ID('{table}')" for table in SNAPSHOT_TABLES)
+    updates = pd.read_sql(f"""
+    SELECT object_id, MAX(last_user_update) as last_update
+    FROM sys.dm_db_index_usage_stats
+    WHERE database_id = DB_ID() AND object_id IN ({object_ids})
+    GROUP BY object_id
+    ORDER BY object_id
+    """, conn)
+    writers = pd.read_sql(f"""
+    SELECT COUNT(DISTINCT request_session_id) as writers
+    FROM sys.dm_tran_locks
+    WHERE resource_database_id = DB_ID() AND resource_type = 'OBJECT'
+      AND request_mode IN ('IX', 'SIX', 'X')
+      AND resource_associated_entity_id IN ({object_ids})
+      AND request_session_id <> @@SPID
+    """, conn)
+    return (tuple(updates['last_update'].astype(str)), int(writers.iloc[0]['writers']))
+
+def is_permission_error(error):
+    """True for SQL Server's permission denied errors, e.g. a DMV read without VIEW SERVER STATE"""
+    message = str(error)
+    return 'VIEW SERVER STATE' in message or 'permission' in message.lower()
+
+def open_snapshot_readers(conn, count):
+    """
+    Open count reader connections whose SNAPSHOT transactions all see the same
+    committed state. With session GameTeams, each gets its own #GameTeams
+    filled from that state.
+
+    SQL Server cannot share one snapshot between sessions, so the snapshots are
+    started back to back and pinned: if any write committed or was in flight
+    while they started, they are rolled back and started again. Pinning reads
+    DMVs that need VIEW SERVER STATE; without it, or with count=1, a single
+    reader is opened, which is consistent by itself.
+    """
+    attempts = int(os.getenv('EXPORT_SNAPSHOT_PIN_ATTEMPTS', 10))
+    session_gameteams = gameteams_table() == '#GameTeams'
+    if count > 1:
+        try:
+            get_write_marker(conn)
+            conn.commit()
+        except Exception as e:
+            if not is_permission_error(e):
+                raise
+            conn.rollback()
+            log_message("Pinning snapshots across workers needs VIEW SERVER STATE "
+                        "(GRANT VIEW SERVER STATE TO <export login>); exporting on one snapshot reader")
+            count = 1
+
+    readers = []
+    for _ in range(count):
+        reader = get_db_connection()
+        if session_gameteams and not setup_session_gameteams(reader, populate=False):
+            raise Exception("Failed to create session GameTeams table")
+        reader.commit()
+        reader.execute("SET TRANSACTION ISOLATION LEVEL SNAPSHOT")
+        readers.append(reader)
+
+    if count == 1:
+        # The snapshot starts at the first data access, not at BEGIN TRAN
+        readers[0].execute("SELECT TOP 1 gameId FROM Games").fetchall()
+        if session_gameteams:
+            populate_session_gameteams(readers[0])
+        log_message("Started a snapshot for 1 reader")
+        return readers
+
+    for attempt in range(1, attempts + 1):
+        before = get_write_marker(conn)
+        conn.commit()
+        if before[1] == 0:
+            # The snapshot starts at the first data access, not at BEGIN TRAN
+            for reader in readers:
+                reader.execute("SELECT TOP 1 gameId FROM Games").fetchall()
+            after = get_write_marker(conn)
+            conn.commit()
+            if after == before:
+                for reader in readers:
+                    if session_gameteams:
+                        populate_session_gameteams(reader)
+                log_message(f"Pinned a consistent snapshot for {count} reader(s) "
+                            f"on attempt {attempt}")
+                return readers
+            for reader in readers:
+                reader.rollback()
+        log_message(f"Writes in progress while pinning snapshot (attempt {attempt}/{attempts}), retrying")
+        time.sleep(min(attempt, 5))
+
+    for reader in readers:
+        reader.close()
+    raise Exception(f"Could not pin a consistent snapshot in {attempts} attempts")
+
+# Fact table behind each Detailed* view, used to size and checksum date windows
+VIEW_FACT_TABLES = {
+    'DetailedGames': 'Games',
+    'DetailedTeamStatistics': 'TeamStatistics',
+    'DetailedPlayerStatistics': 'PlayerStatistics',
+}
+
+def get_date_histogram(conn, view_name):
+    """
+    Return rows per game day for a view, newest day first, with a checksum of
+    each day's rows that the verification manifest records as its baseline.
+    Counts and CHECKSUM_AGGs are taken per game from the fact table and from
+    GameTeams separately and combined here, so the server never joins them.
+    """
+    hint = read_hint()
+    facts = pd.read_sql(f"""
+    SELECT gameId, COUNT(*) as row_count, CHECKSUM_AGG(BINARY_CHECKSUM(*)) as fact_checksum
+    FROM {VIEW_FACT_TABLES[view_name]} {hint}
+    WHERE {not_live('gameId')}
+    GROUP BY gameId
+    """, conn)
+    games = pd.read_sql(f"""
+    SELECT gameId, CAST(gameDate AS date) as gameDay, BINARY_CHECKSUM(*) as game_checksum
+    FROM {gameteams_table()} {hint}
+    """, conn)
+    per_game = facts.merge(games, on='gameId')
+    # XOR, like CHECKSUM_AGG, so neither row nor game order matters
+    per_game['row_checksum'] = (per_game['fact_checksum'].fillna(0).astype('int64')
+                                ^ per_game['game_checksum'].fillna(0).astype('int64'))
+    histogram = per_game.groupby('gameDay').agg(
+        row_count=('row_count', 'sum'),
+        row_checksum=('row_checksum', lambda checksums: np.bitwise_xor.reduce(checksums.to_numpy())),
+    ).reset_index()
+    histogram['gameDay'] = pd.to_datetime(histogram['gameDay'])
+    return histogram.sort_values('gameDay', ascending=False, ignore_index=True)
+
+def window_day_stats(histogram, lower_date, upper_date):
+    """Server {day: [row_count, row_checksum]} for the days in [lower_date, upper_date)"""
+    days = histogram[(histogram['gameDay'] >= lower_date) & (histogram['gameDay'] < upper_date)]
+    return {day.strftime('%Y-%m-%d'): [int(count), int(checksum)]
+            for day, count, checksum in zip(days['gameDay'], days['row_count'], days['row_checksum'])}
+
+def get_table_order(conn, table_name):
+    """
+    ORDER BY columns that page a table export stably: its primary key, or
+    every sortable column when it has none
+    """
+    columns = pd.read_sql(f"""
+    SELECT c.name
+    FROM sys.indexes i
+    JOIN sys.index_columns ic ON i.object_id = ic.object_id AND i.index_id = ic.index_id
+    JOIN sys.columns c ON ic.object_id = c.object_id AND ic.column_id = c.column_id
+    WHERE i.object_id = OBJECT_ID('dbo.{table_name}') AND i.is_primary_key = 1
+    ORDER BY ic.key_ordinal
+    """, conn)['name'].tolist()
+    if not columns:
+        columns = pd.read_sql(f"""
+        SELECT name FROM sys.columns
+        WHERE object_id = OBJECT_ID('dbo.{table_name}')
+          AND TYPE_NAME(system_type_id) NOT IN ('text', 'ntext', 'image', 'xml')
+        ORDER BY column_id
+        """, conn)['name'].tolist()
+    return ', '.join(f"[{column}]" for column in columns)
+
+def get_table_stats(conn, table_name):
+    """Server row count and CHECKSUM_AGG for a whole table"""
+    stats = pd.read_sql(f"""
+    SELECT COUNT(*) as row_count, CHECKSUM_AGG(BINARY_CHECKSUM(*)) as row_checksum
+    FROM {table_name}
+    """, conn).iloc[0]
+    checksum = stats['row_checksum']
+    return int(stats['row_count']), int(checksum) if pd.notna(checksum) else 0
+
+def write_window(manifest, chunk_df, lower_str, upper_str, day_stats):
+    """Append one date window's rows to the CSV as a manifest partition"""
+    if manifest.header is None and len(chunk_df) > 0:
+        manifest.write_header(chunk_df.head(0).to_csv(index=False))
+    manifest.start_partition({'lower': lower_str, 'upper': upper_str}, day_stats)
+    if len(chunk_df) > 0:
+        data = chunk_df.to_csv(header=False, index=False).encode('utf-8')
+        manifest.write_rows(data, len(chunk_df), day_blocks(chunk_df, data))
+    manifest.end_partition()
+
+def iter_date_windows(histogram, sizer):
+    """
+    Group consecutive game days into windows of roughly sizer.size rows, reading
+    the size afresh for each window so the sizer can adapt between windows.
+    Yields (lower_date, upper_date, expected_rows), newest first, where
+    lower_date is inclusive and upper_date is exclusive. A single day is never
+    split, so a window only exceeds the target when one day does on its own.
+    """
+    window_upper = None
+    window_rows = 0
+    for game_day, row_count in zip(histogram['gameDay'], histogram['row_count']):
+        if window_upper is None:
+            window_upper = game_day + pd.Timedelta(days=1)
+        window_rows += int(row_count)
+        if window_rows >= sizer.size:
+            yield game_day, window_upper, window_rows
+            window_upper = None
+            window_rows = 0
+    if window_upper is not None:
+        yield histogram['gameDay'].iloc[-1], window_upper, window_rows
+
+# Row order of each Detailed* view's CSV, unique per row so both engines write the same file
+VIEW_ORDER = {
+    'DetailedGames': "GT.gameDate DESC, GT.gameId DESC",
+    'DetailedTeamStatistics': "GT.gameDate DESC, GT.gameId DESC, TS.teamId ASC",
+    'DetailedPlayerStatistics': "GT.gameDate DESC, GT.gameId DESC, PS.personId ASC",
+}
+
+def build_view_query(view_name, lower_str, upper_str, hint, gameteams_source):
+    """Server-side query for one date window [lower_str, upper_str) of a Detailed* view"""
+    if view_name == 'DetailedGames':
+        query = f"""
+        SELECT 
+            GT.gameId,
+            GT.gameDate,
+            GT.hometeamCity,
+            GT.hometeamName,
+            GT.hometeamId,
+            GT.awayteamCity,
+            GT.awayteamName,
+            GT.awayteamId,
+            GT.homeScore,
+            GT.awayScore,
+            GT.winner,
+            G.arenaId,
+            G.attendance,
+            G.gameType,
+            G.tournamentRound
+        FROM {gameteams_source} GT {hint}
+        INNER JOIN Games G {hint} ON GT.gameId = G.gameId
+        WHERE GT.gameDate >= '{lower_str}' AND GT.gameDate < '{upper_str}'
+        AND {not_live('GT.gameId')}
+        ORDER BY {VIEW_ORDER[view_name]}
+        """
+        
+    elif view_name == 'DetailedTeamStatistics':
+        query = f"""
+        SELECT 
+            TS.gameId,
+            GT.gameDate,
+            CASE 
+                WHEN TS.home = 1 THEN GT.hometeamCity
+                ELSE GT.awayteamCity
+            END as teamCity,
+            CASE 
+                WHEN TS.home = 1 THEN GT.hometeamName
+                ELSE GT.awayteamName
+            END as teamName,
+            TS.teamId,
+            CASE 
+                WHEN TS.home = 1 THEN GT.awayteamCity
+                ELSE GT.hometeamCity
+            END as opponentTeamCity,
+            CASE 
+                WHEN TS.home = 1 THEN GT.awayteamName
+                ELSE GT.hometeamName
+            END as opponentTeamName,
+            CASE 
+                WHEN TS.home = 1 THEN GT.awayteamId
+                ELSE GT.hometeamId
+            END as opponentTeamId,
+            TS.home,
+            TS.win,
+            CASE 
+                WHEN TS.home = 1 THEN GT.homeScore
+                ELSE GT.awayScore
+            END as teamScore,
+            CASE 
+                WHEN TS.home = 1 THEN GT.awayScore
+                ELSE GT.homeScore
+            END as opponentScore,
+            TS.assists,
+            TS.blocks,
+            TS.steals,
+            TS.fieldGoalsAttempted,
+            TS.fieldGoalsMade,
+            TS.fieldGoalsPercentage,
+            TS.threePointersAttempted,
+            TS.threePointersMade,
+            TS.threePointersPercentage,
+            TS.freeThrowsAttempted,
+            TS.freeThrowsMade,
+            TS.freeThrowsPercentage,
+            TS.reboundsDefensive,
+            TS.reboundsOffensive,
+            TS.reboundsTotal,
+            TS.foulsPersonal,
+            TS.turnovers,
+            TS.plusMinusPoints,
+            TS.numMinutes,
+            TS.q1Points,
+            TS.q2Points,
+            TS.q3Points,
+            TS.q4Points,
+            TS.benchPoints,
+            TS.biggestLead,
+            TS.biggestScoringRun,
+            TS.leadChanges,
+            TS.pointsFastBreak,
+            TS.pointsFromTurnovers,
+            TS.pointsInThePaint,
+            TS.pointsSecondChance,
+            TS.timesTied,
+            TS.timeoutsRemaining,
+            TS.seasonWins,
+            TS.seasonLosses,
+            TS.coachId
+        FROM {gameteams_source} GT {hint}
+        INNER JOIN TeamStatistics TS {hint} ON GT.gameId = TS.gameId
+        WHERE GT.gameDate >= '{lower_str}' AND GT.gameDate < '{upper_str}'
+        AND {not_live('GT.gameId')}
+        ORDER BY {VIEW_ORDER[view_name]}
+        """
+
+    elif view_name == 'DetailedPlayerStatistics':
+        query = f"""
+        SELECT 
+            P.firstName,
+            P.lastName,
+            PS.personId,
+            PS.gameId,
+            GT.gameDate,
+            CASE 
+                WHEN PS.teamId = GT.hometeamId THEN GT.hometeamCity
+                ELSE GT.awayteamCity
+            END as playerteamCity,
+            CASE 
+                WHEN PS.teamId = GT.hometeamId THEN GT.hometeamName
+                ELSE GT.awayteamName
+            END as playerteamName,
+            CASE 
+                WHEN PS.teamId = GT.hometeamId THEN GT.awayteamCity
+                ELSE GT.hometeamCity
+            END as opponentteamCity,
+            CASE 
+                WHEN PS.teamId = GT.hometeamId THEN GT.awayteamName
+                ELSE GT.hometeamName
+            END as opponentteamName,
+            CASE 
+                WHEN PS.teamId = GT.winner THEN 1
+                ELSE 0
+            END as win,
+            CASE 
+                WHEN PS.teamId = GT.hometeamId THEN 1
+                ELSE 0
+            END as home,
+            PS.numMinutes,
+            PS.points,
+            PS.assists,
+            PS.blocks,
+            PS.steals,
+            PS.fieldGoalsAttempted,
+            PS.fieldGoalsMade,
+            PS.fieldGoalsPercentage,
+            PS.threePointersAttempted,
+            PS.threePointersMade,
+            PS.threePointersPercentage,
+            PS.freeThrowsAttempted,
+            PS.freeThrowsMade,
+            PS.freeThrowsPercentage,
+            PS.reboundsDefensive,
+            PS.reboundsOffensive,
+            PS.reboundsTotal,
+            PS.foulsPersonal,
+            PS.turnovers,
+            PS.plusMinusPoints
+        FROM {gameteams_source} GT {hint}
+        INNER JOIN PlayerStatistics PS {hint} ON GT.gameId = PS.gameId
+        INNER JOIN Players P {hint} ON PS.personId = P.personId
+        WHERE GT.gameDate >= '{lower_str}' AND GT.gameDate < '{upper_str}'
+        AND {not_live('GT.gameId')}
+        ORDER BY {VIEW_ORDER[view_name]}
+        """
+    return query
+
+@profiled(log_message)
 def export_view(conn, view_name, chunk_size=50000):
-    """Export view data using yearly batches"""
+    """Export view data in date windows sized to roughly chunk_size rows each"""
     log_message(f"{'='*50}")
     log_message(f"Starting export of {view_name}")
     start_time = time.time()
     rows_processed = 0
+    out = None
+
+    hint = read_hint()
+    gameteams_source = gameteams_table()
 
     try:
-        # Get date range for batching
-        range_query = "SELECT MIN(gameDate) as min_date, MAX(gameDate) as max_date FROM ##GameTeams"
-        date_range = pd.read_sql(range_query, conn)
-        current_date = date_range['max_date'].iloc[0]
-        min_date = date_range['min_date'].iloc[0]
-        
-        first_batch = True
-        while current_date >= min_date:
-            next_date = current_date - pd.DateOffset(years=14)
-            
-            if view_name == 'DetailedGames':
-                query = f"""
-                SELECT 
-                    GT.gameId,
-                    GT.gameDate,
-                    GT.hometeamCity,
-                    GT.hometeamName,
-                    GT.hometeamId,
-                    GT.awayteamCity,
-                    GT.awayteamName,
-                    GT.awayteamId,
-                    GT.homeScore,
-                    GT.awayScore,
-                    GT.winner,
-                    G.arenaId,
-                    G.attendance,
-                    G.gameType,
-                    G.tournamentRound
-                FROM ##GameTeams GT
-                INNER JOIN Games G WITH (NOLOCK) ON GT.gameId = G.gameId
-                WHERE GT.gameDate <= '{current_date}' AND GT.gameDate > '{next_date}'
-                ORDER BY GT.gameDate DESC, GT.gameId DESC
-                """
-                
-            elif view_name == 'DetailedTeamStatistics':
-                query = f"""
-                SELECT 
-                    TS.gameId,
-                    GT.gameDate,
-                    CASE 
-                        WHEN TS.home = 1 THEN GT.hometeamCity
-                        ELSE GT.awayteamCity
-                    END as teamCity,
-                    CASE 
-                        WHEN TS.home = 1 THEN GT.hometeamName
-                        ELSE GT.awayteamName
-                    END as teamName,
-                    TS.teamId,
-                    CASE 
-                        WHEN TS.home = 1 THEN GT.awayteamCity
-                        ELSE GT.hometeamCity
-                    END as opponentTeamCity,
-                    CASE 
-                        WHEN TS.home = 1 THEN GT.awayteamName
-                        ELSE GT.hometeamName
-                    END as opponentTeamName,
-                    CASE 
-                        WHEN TS.home = 1 THEN GT.awayteamId
-                        ELSE GT.hometeamId
-                    END as opponentTeamId,
-                    TS.home,
-                    TS.win,
-                    CASE 
-                        WHEN TS.home = 1 THEN GT.homeScore
-                        ELSE GT.awayScore
-                    END as teamScore,
-                    CASE 
-                        WHEN TS.home = 1 THEN GT.awayScore
-                        ELSE GT.homeScore
-                    END as opponentScore,
-                    TS.assists,
-                    TS.blocks,
-                    TS.steals,
-                    TS.fieldGoalsAttempted,
-                    TS.fieldGoalsMade,
-                    TS.fieldGoalsPercentage,
-                    TS.threePointersAttempted,
-                    TS.threePointersMade,
-                    TS.threePointersPercentage,
-                    TS.freeThrowsAttempted,
-                    TS.freeThrowsMade,
-                    TS.freeThrowsPercentage,
-                    TS.reboundsDefensive,
-                    TS.reboundsOffensive,
-                    TS.reboundsTotal,
-                    TS.foulsPersonal,
-                    TS.turnovers,
-                    TS.plusMinusPoints,
-                    TS.numMinutes,
-                    TS.q1Points,
-                    TS.q2Points,
-                    TS.q3Points,
-                    TS.q4Points,
-                    TS.benchPoints,
-                    TS.biggestLead,
-                    TS.biggestScoringRun,
-                    TS.leadChanges,
-                    TS.pointsFastBreak,
-                    TS.pointsFromTurnovers,
-                    TS.pointsInThePaint,
-                    TS.pointsSecondChance,
-                    TS.timesTied,
-                    TS.timeoutsRemaining,
-                    TS.seasonWins,
-                    TS.seasonLosses,
-                    TS.coachId
-                FROM ##GameTeams GT
-                INNER JOIN TeamStatistics TS WITH (NOLOCK) ON GT.gameId = TS.gameId
-                WHERE GT.gameDate <= '{current_date}' AND GT.gameDate > '{next_date}'
-                ORDER BY GT.gameDate DESC, GT.gameId DESC
-                """
-
-            elif view_name == 'DetailedPlayerStatistics':
-                query = f"""
-                SELECT 
-                    P.firstName,
-                    P.lastName,
-                    PS.personId,
-                    PS.gameId,
-                    GT.gameDate,
-                    CASE 
-                        WHEN PS.teamId = GT.hometeamId THEN GT.hometeamCity
-                        ELSE GT.awayteamCity
-                    END as playerteamCity,
-                    CASE 
-                        WHEN PS.teamId = GT.hometeamId THEN GT.hometeamName
-                        ELSE GT.awayteamName
-                    END as playerteamName,
-                    CASE 
-                        WHEN PS.teamId = GT.hometeamId THEN GT.awayteamCity
-                        ELSE GT.hometeamCity
-                    END as opponentteamCity,
-                    CASE 
-                        WHEN PS.teamId = GT.hometeamId THEN GT.awayteamName
-                        ELSE GT.hometeamName
-                    END as opponentteamName,
-                    CASE 
-                        WHEN PS.teamId = GT.winner THEN 1
-                        ELSE 0
-                    END as win,
-                    CASE 
-                        WHEN PS.teamId = GT.hometeamId THEN 1
-                        ELSE 0
-                    END as home,
-                    PS.numMinutes,
-                    PS.points,
-                    PS.assists,
-                    PS.blocks,
-                    PS.steals,
-                    PS.fieldGoalsAttempted,
-                    PS.fieldGoalsMade,
-                    PS.fieldGoalsPercentage,
-                    PS.threePointersAttempted,
-                    PS.threePointersMade,
-                    PS.threePointersPercentage,
-                    PS.freeThrowsAttempted,
-                    PS.freeThrowsMade,
-                    PS.freeThrowsPercentage,
-                    PS.reboundsDefensive,
-                    PS.reboundsOffensive,
-                    PS.reboundsTotal,
-                    PS.foulsPersonal,
-                    PS.turnovers,
-                    PS.plusMinusPoints
-                FROM ##GameTeams GT
-                INNER JOIN PlayerStatistics PS WITH (NOLOCK) ON GT.gameId = PS.gameId
-                INNER JOIN Players P WITH (NOLOCK) ON PS.personId = P.personId
-                WHERE GT.gameDate <= '{current_date}' AND GT.gameDate > '{next_date}'
-                ORDER BY GT.gameDate DESC, GT.gameId DESC
-                """
-
-            chunk_df = pd.read_sql(query, conn)
+        with metrics.stage('setup', table=view_name):
+            # Size date windows from the per-day row histogram so each batch targets the sizer's row count
+            histogram = get_date_histogram(conn, view_name)
+            sizer = AdaptiveChunkSizer(chunk_size, view_name, log_message)
+            out = open_output(f"{view_name.replace('Detailed', '')}.csv")
+            manifest = PartitionManifest(out, view_name, 'view')
+        log_message(f"Exporting {int(histogram['row_count'].sum())} rows in date windows "
+                    f"starting at {sizer.size} rows each")
+        for lower_date, upper_date, expected_rows in iter_date_windows(histogram, sizer):
+            window_start = time.time()
+            lower_str = lower_date.strftime('%Y-%m-%d')
+            upper_str = upper_date.strftime('%Y-%m-%d')
             
+            query = build_view_query(view_name, lower_str, upper_str, hint, gameteams_source)
+
+            with metrics.stage('query', table=view_name) as query_stage:
+                chunk_df = pd.read_sql(query, conn)
+                query_stage.count(rows=len(chunk_df))
+            query_time = query_stage.seconds
+
+            bytes_before = out.bytes_in
+            with metrics.stage('write', table=view_name) as write_stage:
+                write_window(manifest, chunk_df, lower_str, upper_str,
+                             window_day_stats(histogram, lower_date, upper_date))
+                write_stage.count(rows=len(chunk_df), bytes=out.bytes_in - bytes_before)
+            write_time = write_stage.seconds
+
             if len(chunk_df) > 0:
-                if first_batch:
-                    chunk_df.to_csv(f"{view_name.replace('Detailed', '')}.csv", index=False)
-                    first_batch = False
-                else:
-                    chunk_df.to_csv(f"{view_name.replace('Detailed', '')}.csv", 
-                                  mode='a', header=False, index=False)
-            
                 rows_processed += len(chunk_df)
                 elapsed_time = time.time() - start_time
                 log_message(
-                    f"Processed {current_date.strftime('%Y-%m-%d')} to {next_date.strftime('%Y-%m-%d')}, "
+                    f"Window {upper_str} to {lower_str}: {len(chunk_df)} rows "
+                    f"(target {sizer.size}, expected {expected_rows}). "
+                    f"Query: {query_time:.2f}s, write: {write_time:.2f}s. "
                     f"{rows_processed} total rows. "
                     f"Speed: {rows_processed/elapsed_time:.1f} rows/sec. "
                     f"Time elapsed: {elapsed_time:.1f}s")
+                sizer.observe(len(chunk_df), time.time() - window_start)
             
-            current_date = next_date
             del chunk_df
-            gc.collect()
 
+        out.close()
+        log_message(f"Output {out.summary()}, manifest {manifest.save()}")
         return True
 
     except Exception as e:
         log_message(f"Error in export: {str(e)}")
+        close_quietly(out)
+        return False
+    
+# Raw fact columns the local engine pulls for each view, in clustered key order
+LOCAL_FACT_QUERIES = {
+    'DetailedGames': (
+        "SELECT G.gameId, G.arenaId, G.attendance, G.gameType, G.tournamentRound "
+        "FROM Games G {hint}",
+        "G.gameId", "G.gameId DESC"),
+    'DetailedTeamStatistics': (
+        "SELECT TS.* FROM TeamStatistics TS {hint}",
+        "TS.gameId", "TS.gameId DESC, TS.teamId ASC"),
+    'DetailedPlayerStatistics': (
+        "SELECT PS.* FROM PlayerStatistics PS {hint}",
+        "PS.gameId", "PS.gameId DESC, PS.personId ASC"),
+}
+
+# Optional nonclustered columnstore index on each stat table (see sql/columnstore_indexes.sql)
+COLUMNSTORE_INDEXES = {
+    'DetailedTeamStatistics': ('TeamStatistics', 'NCCI_TeamStatistics'),
+    'DetailedPlayerStatistics': ('PlayerStatistics', 'NCCI_PlayerStatistics'),
+}
+
+GAMETEAMS_INT_COLUMNS = ['hometeamId', 'awayteamId', 'homeScore', 'awayScore', 'winner']
+GAMETEAMS_NAME_COLUMNS = ['hometeamCity', 'hometeamName', 'awayteamCity', 'awayteamName']
+
+TEAM_STAT_COLUMNS = [
+    'assists', 'blocks', 'steals', 'fieldGoalsAttempted', 'fieldGoalsMade', 'fieldGoalsPercentage',
+    'threePointersAttempted', 'threePointersMade', 'threePointersPercentage',
+    'freeThrowsAttempted', 'freeThrowsMade', 'freeThrowsPercentage',
+    'reboundsDefensive', 'reboundsOffensive', 'reboundsTotal', 'foulsPersonal', 'turnovers',
+    'plusMinusPoints', 'numMinutes', 'q1Points', 'q2Points', 'q3Points', 'q4Points',
+    'benchPoints', 'biggestLead', 'biggestScoringRun', 'leadChanges', 'pointsFastBreak',
+    'pointsFromTurnovers', 'pointsInThePaint', 'pointsSecondChance', 'timesTied',
+    'timeoutsRemaining', 'seasonWins', 'seasonLosses', 'coachId'
+]
+
+PLAYER_STAT_COLUMNS = [
+    'numMinutes', 'points', 'assists', 'blocks', 'steals', 'fieldGoalsAttempted', 'fieldGoalsMade',
+    'fieldGoalsPercentage', 'threePointersAttempted', 'threePointersMade', 'threePointersPercentage',
+    'freeThrowsAttempted', 'freeThrowsMade', 'freeThrowsPercentage', 'reboundsDefensive',
+    'reboundsOffensive', 'reboundsTotal', 'foulsPersonal', 'turnovers', 'plusMinusPoints'
+]
+
+def get_session_cpu_ms(conn):
+    """Return the server CPU time (ms) consumed so far by this connection's session"""
+    query = "SELECT cpu_time FROM sys.dm_exec_sessions WHERE session_id = @@SPID"
+    return int(pd.read_sql(query, conn).iloc[0]['cpu_time'])
+
+def use_columnstore(conn, view_name):
+    """
+    Name of the columnstore index to scan for view_name's fact table, or None.
+    EXPORT_COLUMNSTORE=auto (the default) uses the index when it exists; off never does.
+    """
+    if os.getenv('EXPORT_COLUMNSTORE', 'auto') == 'off' or view_name not in COLUMNSTORE_INDEXES:
+        return None
+    table, index = COLUMNSTORE_INDEXES[view_name]
+    found = pd.read_sql(f"""
+    SELECT name FROM sys.indexes
+    WHERE object_id = OBJECT_ID('{table}') AND name = '{index}' AND type = 6
+    """, conn)
+    return index if len(found) else None
+
+def parse_order(order_by):
+    """Split 'TS.gameId DESC, TS.teamId ASC' into sort_values columns and ascending flags"""
+    columns, ascending = [], []
+    for term in order_by.split(','):
+        column, direction = term.split()
+        columns.append(column.split('.')[-1])
+        ascending.append(direction.upper() == 'ASC')
+    return columns, ascending
+
+def load_gameteams_index(conn):
+    """Pull GameTeams once into a compact frame keyed by gameId"""
+    gameteams = pd.read_sql(f"""
+    SELECT gameId, gameDate, hometeamId, awayteamId, homeScore, awayScore, winner,
+           hometeamCity, hometeamName, awayteamCity, awayteamName
+    FROM {gameteams_table()} {read_hint()}
+    """, conn)
+    # Nullable ints so each window can be narrowed back to what read_sql would infer for it
+    for col in GAMETEAMS_INT_COLUMNS:
+        gameteams[col] = gameteams[col].astype('Int64')
+    for col in GAMETEAMS_NAME_COLUMNS:
+        gameteams[col] = gameteams[col].astype('category')
+    log_message(f"Loaded GameTeams index: {len(gameteams)} games, "
+                f"{gameteams.memory_usage(deep=True).sum() / 1024 / 1024:.1f} MB")
+    return gameteams.set_index('gameId', drop=False).sort_index()
+
+def load_players_index(conn):
+    """Pull player names once into a frame keyed by personId"""
+    players = pd.read_sql(f"SELECT personId, firstName, lastName FROM Players {read_hint()}", conn)
+    return players.set_index('personId')
+
+def narrow_nullable_ints(df):
+    """Turn Int64 columns into int64, or float64 when they hold nulls, matching read_sql"""
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.Int64Dtype):
+            df[col] = df[col].astype('float64') if df[col].isna().any() else df[col].astype('int64')
+    return df
+
+def denormalize_window(view_name, fact_df, gt, players):
+    """Resolve home/away/opponent columns locally, reproducing the Detailed* view output"""
+    gt = gt.reindex(fact_df['gameId'].to_numpy()).reset_index(drop=True)
+    for col in GAMETEAMS_NAME_COLUMNS:
+        gt[col] = gt[col].astype(object)
+    fact_df = fact_df.reset_index(drop=True)
+
+    if view_name == 'DetailedGames':
+        out = gt[['gameId', 'gameDate', 'hometeamCity', 'hometeamName', 'hometeamId',
+                  'awayteamCity', 'awayteamName', 'awayteamId',
+                  'homeScore', 'awayScore', 'winner']].copy()
+        for col in ['arenaId', 'attendance', 'gameType', 'tournamentRound']:
+            out[col] = fact_df[col]
+
+    elif view_name == 'DetailedTeamStatistics':
+        is_home = (fact_df['home'] == 1).to_numpy()
+        out = pd.DataFrame({
+            'gameId': fact_df['gameId'],
+            'gameDate': gt['gameDate'],
+            'teamCity': gt['hometeamCity'].where(is_home, gt['awayteamCity']),
+            'teamName': gt['hometeamName'].where(is_home, gt['awayteamName']),
+            'teamId': fact_df['teamId'],
+            'opponentTeamCity': gt['awayteamCity'].where(is_home, gt['hometeamCity']),
+            'opponentTeamName': gt['awayteamName'].where(is_home, gt['hometeamName']),
+            'opponentTeamId': gt['awayteamId'].where(is_home, gt['hometeamId']),
+            'home': fact_df['home'],
+            'win': fact_df['win'],
+            'teamScore': gt['homeScore'].where(is_home, gt['awayScore']),
+            'opponentScore': gt['awayScore'].where(is_home, gt['homeScore']),
+        })
+        for col in TEAM_STAT_COLUMNS:
+            out[col] = fact_df[col]
+
+    elif view_name == 'DetailedPlayerStatistics':
+        names = players.reindex(fact_df['personId'].to_numpy()).reset_index(drop=True)
+        is_home = (fact_df['teamId'] == gt['hometeamId']).fillna(False).to_numpy(dtype=bool)
+        is_winner = (fact_df['teamId'] == gt['winner']).fillna(False).to_numpy(dtype=bool)
+        out = pd.DataFrame({
+            'firstName': names['firstName'],
+            'lastName': names['lastName'],
+            'personId': fact_df['personId'],
+            'gameId': fact_df['gameId'],
+            'gameDate': gt['gameDate'],
+            'playerteamCity': gt['hometeamCity'].where(is_home, gt['awayteamCity']),
+            'playerteamName': gt['hometeamName'].where(is_home, gt['awayteamName']),
+            'opponentteamCity': gt['awayteamCity'].where(is_home, gt['hometeamCity']),
+            'opponentteamName': gt['awayteamName'].where(is_home, gt['hometeamName']),
+            'win': is_winner.astype('int64'),
+            'home': is_home.astype('int64'),
+        })
+        for col in PLAYER_STAT_COLUMNS:
+            out[col] = fact_df[col]
+
+    # Same ordering as the server query
+    sort_columns, sort_ascending = parse_order(VIEW_ORDER[view_name])
+    out = out.sort_values(sort_columns, ascending=sort_ascending, kind='mergesort')
+    return narrow_nullable_ints(out)
+
+@profiled(log_message)
+def export_view_local(conn, view_name, gameteams, players, chunk_size=50000):
+    """
+    Export a Detailed* view by streaming its raw fact table and joining locally.
+
+    The server only answers clustered-key range reads; team names, opponents,
+    scores and win/home flags are resolved here from the cached GameTeams and
+    Players indexes. The CSV written is the same as export_view's.
+
+    When the fact table has its columnstore index, windows are read from it in
+    batch mode instead and put in clustered key order here.
+    """
+    log_message(f"{'='*50}")
+    log_message(f"Starting local export of {view_name}")
+    start_time = time.time()
+    rows_processed = 0
+    out = None
+
+    hint = read_hint()
+    gameteams_source = gameteams_table()
+
+    try:
+        with metrics.stage('setup', table=view_name):
+            histogram = get_date_histogram(conn, view_name)
+            sizer = AdaptiveChunkSizer(chunk_size, view_name, log_message)
+            log_message(f"Exporting {int(histogram['row_count'].sum())} rows in date windows "
+                        f"starting at {sizer.size} rows each")
+
+            fact_query, key_column, clustered_order = LOCAL_FACT_QUERIES[view_name]
+            columnstore = use_columnstore(conn, view_name)
+            if columnstore:
+                # Table hints must share one WITH (...) clause
+                fact_hint = f"WITH ({'NOLOCK, ' if hint else ''}INDEX({columnstore}))"
+                order_clause = ''
+                sort_columns, sort_ascending = parse_order(clustered_order)
+                log_message(f"Reading {view_name} facts from columnstore index {columnstore}")
+            else:
+                fact_hint = hint
+                order_clause = f"ORDER BY {clustered_order}"
+            out = open_output(f"{view_name.replace('Detailed', '')}.csv")
+            manifest = PartitionManifest(out, view_name, 'view')
+        for lower_date, upper_date, expected_rows in iter_date_windows(histogram, sizer):
+            window_start = time.time()
+            lower_str = lower_date.strftime('%Y-%m-%d')
+            upper_str = upper_date.strftime('%Y-%m-%d')
+            in_window = (gameteams['gameDate'] >= lower_date) & (gameteams['gameDate'] < upper_date)
+            gt_window = gameteams[in_window]
+
+            # A cheap bound alongside the IN list. gameIds only rise with date within
+            # one game type (002... regular season, 004... playoffs), so a window
+            # mixing types spans most of the key range; how many rowgroups it lets
+            # the columnstore skip hasn't been measured
+            query = f"""
+            {fact_query.format(hint=fact_hint)}
+            WHERE {key_column} BETWEEN {int(gt_window['gameId'].min())} AND {int(gt_window['gameId'].max())}
+            AND {key_column} IN (
+                SELECT gameId FROM {gameteams_source} {hint}
+                WHERE gameDate >= '{lower_str}' AND gameDate < '{upper_str}'
+                AND {not_live('gameId')}
+            )
+            {order_clause}
+            """
+            with metrics.stage('query', table=view_name) as query_stage:
+                fact_df = pd.read_sql(query, conn)
+                if columnstore:
+                    fact_df = fact_df.sort_values(sort_columns, ascending=sort_ascending,
+                                                  kind='mergesort', ignore_index=True)
+                query_stage.count(rows=len(fact_df))
+            query_time = query_stage.seconds
+
+            day_stats = window_day_stats(histogram, lower_date, upper_date)
+            if len(fact_df) == 0:
+                write_window(manifest, fact_df, lower_str, upper_str, day_stats)
+            else:
+                with metrics.stage('resolve', table=view_name) as resolve_stage:
+                    chunk_df = denormalize_window(view_name, fact_df, gt_window, players)
+                    resolve_stage.count(rows=len(chunk_df))
+                resolve_time = resolve_stage.seconds
+
+                bytes_before = out.bytes_in
+                with metrics.stage('write', table=view_name) as write_stage:
+                    write_window(manifest, chunk_df, lower_str, upper_str, day_stats)
+                    write_stage.count(rows=len(chunk_df), bytes=out.bytes_in - bytes_before)
+                write_time = write_stage.seconds
+
+                rows_processed += len(chunk_df)
+                elapsed_time = time.time() - start_time
+                log_message(
+                    f"Window {upper_str} to {lower_str}: {len(chunk_df)} rows "
+                    f"(target {sizer.size}, expected {expected_rows}). "
+                    f"Query: {query_time:.2f}s, resolve: {resolve_time:.2f}s, write: {write_time:.2f}s. "
+                    f"{rows_processed} total rows. "
+                    f"Speed: {rows_processed/elapsed_time:.1f} rows/sec. "
+                    f"Time elapsed: {elapsed_time:.1f}s")
+                sizer.observe(len(chunk_df), time.time() - window_start)
+                del chunk_df
+
+            del fact_df
+
+        out.close()
+        log_message(f"Output {out.summary()}, manifest {manifest.save()}")
+        return True
+
+    except Exception as e:
+        log_message(f"Error in local export: {str(e)}")
+        close_quietly(out)
         return False
     
+@profiled(log_message)
 def export_regular_table(conn, table_name, chunk_size=10000):
     """Export regular tables without complex joins"""
     log_message(f"{'='*50}")
     log_message(f"Starting export of {table_name}")
     start_time = time.time()
+    out = None
     
     try:
-        count_query = f"SELECT COUNT(*) as count FROM {table_name}"
-        total_rows = pd.read_sql(count_query, conn).iloc[0]['count']
+        with metrics.stage('setup', table=table_name):
+            total_rows, checksum = get_table_stats(conn, table_name)
         log_message(f"Total rows to process: {total_rows}")
 
         if total_rows == 0:
             log_message(f"No rows to process for {table_name}")
             return True
 
-        # Simple batch processing for regular tables
-        for offset in range(0, total_rows, chunk_size):
+        # Paged in key order, so OFFSET neither skips nor repeats rows
+        order_by = get_table_order(conn, table_name)
+        out = open_output(f"{table_name}.csv")
+        # Tables have no date to partition on, so the whole table is one partition
+        manifest = PartitionManifest(out, table_name, 'table')
+        sizer = AdaptiveChunkSizer(chunk_size, table_name, log_message)
+        offset = 0
+        while offset < total_rows:
+            chunk_start = time.time()
             query = f"""
             SELECT *
             FROM {table_name}
-            ORDER BY (SELECT NULL)
+            ORDER BY {order_by}
             OFFSET {offset} ROWS
-            FETCH NEXT {chunk_size} ROWS ONLY
+            FETCH NEXT {sizer.size} ROWS ONLY
             """
             
-            chunk_df = pd.read_sql(query, conn)
+            with metrics.stage('query', table=table_name) as query_stage:
+                chunk_df = pd.read_sql(query, conn)
+                query_stage.count(rows=len(chunk_df))
             
             if len(chunk_df) == 0:
                 break
                 
-            if offset == 0:
-                chunk_df.to_csv(f"{table_name}.csv", index=False)
-            else:
-                chunk_df.to_csv(f"{table_name}.csv", mode='a', header=False, index=False)
+            bytes_before = out.bytes_in
+            with metrics.stage('write', table=table_name) as write_stage:
+                if offset == 0:
+                    manifest.write_header(chunk_df.head(0).to_csv(index=False))
+                    manifest.start_partition({}, {'table': [total_rows, checksum]})
+                manifest.write_rows(chunk_df.to_csv(header=False, index=False), len(chunk_df))
+                write_stage.count(rows=len(chunk_df), bytes=out.bytes_in - bytes_before)
             
-            rows_processed = offset + len(chunk_df)
+            offset += len(chunk_df)
             elapsed_time = time.time() - start_time
-            log_message(f"Processed {rows_processed}/{total_rows} rows for {table_name}. "
+            log_message(f"Processed {offset}/{total_rows} rows for {table_name}. "
                        f"Elapsed time: {elapsed_time:.2f} seconds")
+            sizer.observe(len(chunk_df), time.time() - chunk_start)
             
             del chunk_df
-            gc.collect()
 
+        if manifest.current is not None:
+            manifest.end_partition()
+        out.close()
+        log_message(f"Output {out.summary()}, manifest {manifest.save()}")
         return True
 
     except Exception as e:
         log_message(f"Error processing table {table_name}: {str(e)}")
+        close_quietly(out)
         return False
 
+def export_task(conn, task, engine, gameteams, players):
+    """Run one ('view' or 'table', name) export on conn and log its time and RDS CPU cost"""
+    kind, name = task
+    task_start = time.time()
+    cpu_start = get_session_cpu_ms(conn)
+    if kind == 'table':
+        exported = export_regular_table(conn, name)
+    else:
+        # Smaller chunk size for DetailedPlayerStatistics
+        if name == 'DetailedPlayerStatistics':
+            chunk_size = int(os.getenv('PLAYER_STATS_CHUNK_SIZE', 25000))
+        else:
+            chunk_size = int(os.getenv('EXPORT_CHUNK_SIZE', 50000))
+        if engine == 'local':
+            exported = export_view_local(conn, name, gameteams, players, chunk_size)
+        else:
+            exported = export_view(conn, name, chunk_size)
+        cpu_ms = get_session_cpu_ms(conn) - cpu_start
+        log_message(f"{name} ({engine} engine): total time {time.time() - task_start:.1f}s, "
+                    f"RDS CPU time {cpu_ms / 1000:.1f}s")
+        metrics.record('view', time.time() - task_start, {'table': name, 'engine': engine},
+                       {'rds_cpu_ms': cpu_ms})
+    if not exported:
+        log_message(f"Failed to export {kind}: {name}")
+    return exported
+
+def run_export_tasks(readers, tasks, engine, gameteams=None, players=None):
+    """Run tasks on one worker per reader connection, each task borrowing a free reader"""
+    free_readers = queue.Queue()
+    for reader in readers:
+        free_readers.put(reader)
+
+    def run(task):
+        reader = free_readers.get()
+        try:
+            return export_task(reader, task, engine, gameteams, players)
+        finally:
+            free_readers.put(reader)
+
+    with ThreadPoolExecutor(max_workers=len(readers)) as executor:
+        return list(executor.map(run, tasks))
+
 def main():
+    run_start = time.time()
+    readers = []
     try:
-        conn = get_db_connection()
+        with metrics.stage('setup', table='all') as setup_stage:
+            conn = get_db_connection()
+            # Views and tables added after the original schema
+            required = ['UniqueGameTeams', 'LiveGames'] + (['PersistedGameTeams'] if gameteams_table() == 'PersistedGameTeams' else [])
+            missing = missing_objects(conn.cursor(), required)
+            if missing:
+                raise Exception(f"Database is missing {', '.join(missing)}; run sql/upgrade_database.sql")
 
-        # Create persistent GameTeams table for the session
-        if not setup_session_gameteams(conn):
-            raise Exception("Failed to create persistent GameTeams table")
+            # 'nolock' reads dirty pages; 'snapshot' gives every reader one consistent committed state
+            consistency = os.getenv('EXPORT_CONSISTENCY', 'nolock')
+            workers = max(1, int(os.getenv('EXPORT_WORKERS', 1)))
+            if consistency == 'snapshot':
+                check_snapshot_isolation(conn)
+                readers = open_snapshot_readers(conn, workers)
+            else:
+                if gameteams_table() != 'PersistedGameTeams':
+                    # One global copy on the main connection, which outlives every reader
+                    if not setup_session_gameteams(conn):
+                        raise Exception("Failed to create session GameTeams table")
+                    conn.commit()
+                readers = [conn] + [get_db_connection() for _ in range(workers - 1)]
+            log_message(f"Exporting with {consistency} reads on {len(readers)} worker(s)")
+
+            # 'server' joins on RDS; 'local' streams fact tables and joins on this instance
+            engine = os.getenv('EXPORT_ENGINE', 'server')
+            gameteams = players = None
+            if engine == 'local':
+                gameteams = load_gameteams_index(readers[0])
+                players = load_players_index(readers[0])
+            setup_stage.count(workers=len(readers))
 
-        # Export views with smaller chunk size for DetailedPlayerStatistics
+        # Views, then the other tables; with several workers the largest view starts first
         views = ['DetailedGames', 'DetailedPlayerStatistics', 'DetailedTeamStatistics']
-        for view in views:
-            chunk_size = 25000 if view == 'DetailedPlayerStatistics' else 50000
-            if not export_view(conn, view, chunk_size):
-                log_message(f"Failed to export view: {view}")
-                
-        # Export other tables
-        other_tables = ['Players', 'CommonPlayerInfo', 'TeamHistories', 'LeagueSchedule24_25','Arenas', 'Coaches']
-        for table in other_tables:
-            if not export_regular_table(conn, table):
-                log_message(f"Failed to export table: {table}")
+        other_tables = (['Players', 'CommonPlayerInfo', 'TeamHistories'] + schedule_tables(conn.cursor())
+                        + ['Arenas', 'Coaches'])
+        tasks = [('view', view) for view in views] + [('table', table) for table in other_tables]
+        if workers > 1:
+            tasks.sort(key=lambda task: task[1] != 'DetailedPlayerStatistics')
+        log_message(f"Export start latency: {time.time() - run_start:.1f}s "
+                    f"(GameTeams from {gameteams_table()})")
+        results = run_export_tasks(readers, tasks, engine, gameteams, players)
+        log_message(f"Stage totals: {metrics.summary()}")
+        failed = [name for (kind, name), exported in zip(tasks, results) if not exported]
+        if failed:
+            # Re-run just these, or run verify_export.py to repair partial outputs
+            log_message(f"{len(failed)} export(s) failed: {', '.join(failed)}")
+            sys.exit(1)
 
     except Exception as e:
         log_message(f"Fatal error: {str(e)}")
-        if conn:
+        for reader in readers:
             try:
-                conn.execute("DROP TABLE IF EXISTS ##GameTeams;")
+                reader.rollback()
             except:
                 pass
         sys.exit(1)
         
     finally:
+        for reader in readers:
+            try:
+                reader.commit()  # ends a snapshot transaction
+                if reader is not conn:
+                    reader.close()
+            except:
+                pass
         if 'conn' in locals():
             try:
-                conn.execute("DROP TABLE IF EXISTS ##GameTeams;")
+                if gameteams_table() != 'PersistedGameTeams':
+                    conn.execute(f"DROP TABLE IF EXISTS {gameteams_table()};")
                 conn.close()
             except:
                 pass
@@ -1,4 +1,6 @@
+import hashlib
 import json
+import pickle
 import pyodbc
 import os
 import logging
@@ -10,7 +12,11 @@ import pandas as pd
 from datetime import datetime
 from time import sleep
 import boto3
-from utils.db_utils import get_db_connection
+from utils.db_utils import get_db_connection, missing_objects, schedule_tables
+from utils.metrics import Metrics
+from utils.profiling import profiled
+from utils.reference_cache import ReferenceCache
+from utils.retry import RetryScheduler, is_permanent, retry_after_seconds
 
 
 
@@ -18,91 +24,289 @@ from utils.db_utils import get_db_connection
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Per-stage records on stdout; METRICS_FORMAT=emf turns them into CloudWatch metrics
+metrics = Metrics('nba_lambda')
+
+# CommonPlayerInfo and Teams kept between warm invocations, reloaded when they change
+reference_cache = ReferenceCache()
+
+
+# Objects added after the original schema, which sql/upgrade_database.sql
+# creates on an existing database
+REQUIRED_OBJECTS = ['UniqueGameTeams', 'PersistedGameTeams', 'FailedGames', 'LiveGames']
+
+# Tip-offs each `when` covers, as (days back from today, Eastern, where the
+# window starts, days after today where it ends). 'yesterday', 'today' and
+# 'tomorrow' keep their original meaning: the season up to and including that
+# day. 'last_three_days' also covers today, so a second run late the same
+# night picks up games finished since the first.
+SEASON_DAYS = 366
+SCHEDULE_WINDOWS = {
+    'yesterday': (SEASON_DAYS, 0),
+    'today': (SEASON_DAYS, 1),
+    'tomorrow': (SEASON_DAYS, 2),
+    'last_three_days': (3, 1),
+    'recent': (1, 1),
+    'season': (SEASON_DAYS, 1),
+}
+
+
+def check_schema(cursor):
+    """Fail before loading anything when the database hasn't been upgraded"""
+    missing = missing_objects(cursor, REQUIRED_OBJECTS)
+    if missing:
+        raise Exception(f"Database is missing {', '.join(missing)}; run sql/upgrade_database.sql")
 
-def find_new_games(cursor, when='last_three_days'):
-    logger.info(f"Finding new games for period: {when}")
-    # Your existing find_new_games code here
-    if when == 'yesterday':      
-        seasonQuery = """
-        SELECT gameId
-        FROM [dbo].[LeagueSchedule24_25]
-        WHERE CAST(gameDateTimeEst AS DATE) < CAST(GETDATE() AS DATE)
-        """
-    elif when == 'today':
-        seasonQuery = """
-        SELECT gameId
-        FROM [dbo].[LeagueSchedule24_25]
-        WHERE CAST(gameDateTimeEst AS DATE) <= CAST(GETDATE() AS DATE)
-        """
-    elif when == 'tomorrow':
-        seasonQuery = """
-        SELECT gameId
-        FROM [dbo].[LeagueSchedule24_25]
-        WHERE CAST(gameDateTimeEst AS DATE) <= CAST(DATEADD(DAY, 1, GETDATE()) AS DATE)
-        """ 
-    elif when == 'last_three_days':
-        seasonQuery = """
-        SELECT gameId
-        FROM [dbo].[LeagueSchedule24_25]
-        WHERE CAST(gameDateTimeEst AS DATE) BETWEEN 
-            CAST(DATEADD(DAY, -3, GETDATE()) AS DATE) AND 
-            CAST(DATEADD(DAY, -1, GETDATE()) AS DATE)
-        """
 
-    unfound_games = [row[0] for row in cursor.execute(seasonQuery)]
+def schedule_index_query(tables):
+    """
+    One row per scheduled game across every LeagueSchedule table: its gameId,
+    tip-off (Eastern) and status, which is 'complete' once the game and its
+    player statistics are in the database (and not just live-mode partials,
+    see LiveGames), otherwise 'scheduled' before tip-off, 'in_progress' until
+    SCHEDULE_EXPECTED_MINUTES after it and 'due' from then on.
+    Parameters: expected minutes, days back, days ahead (exclusive end).
+    """
+    schedule = "\n        UNION ALL".join(f"""
+        SELECT TRY_CAST(gameId AS int) AS gameId,
+               TRY_CONVERT(datetime2(0), LEFT(gameDateTimeEst, 19), 126) AS tipoff
+        FROM [dbo].[{table}]""" for table in tables)
+    return f"""
+    WITH Schedule AS ({schedule}
+    ),
+    Clock AS (
+        SELECT CAST(SYSDATETIMEOFFSET() AT TIME ZONE 'Eastern Standard Time' AS datetime2(0)) AS nowEt
+    )
+    SELECT S.gameId, S.tipoff,
+        CASE
+            WHEN EXISTS (SELECT 1 FROM [dbo].[Games] G WHERE G.gameId = S.gameId)
+             AND EXISTS (SELECT 1 FROM [dbo].[PlayerStatistics] P WHERE P.gameId = S.gameId)
+             AND NOT EXISTS (SELECT 1 FROM [dbo].[LiveGames] L WHERE L.gameId = S.gameId) THEN 'complete'
+            WHEN S.tipoff > C.nowEt THEN 'scheduled'
+            WHEN DATEADD(MINUTE, ?, S.tipoff) > C.nowEt THEN 'in_progress'
+            ELSE 'due'
+        END AS status
+    FROM Schedule S
+    CROSS JOIN Clock C
+    WHERE S.gameId IS NOT NULL
+      AND S.tipoff >= DATEADD(DAY, -?, CAST(CAST(C.nowEt AS date) AS datetime2(0)))
+      AND S.tipoff < DATEADD(DAY, ?, CAST(CAST(C.nowEt AS date) AS datetime2(0)))
+    """
+
+
+def schedule_index(cursor, when):
+    """(gameId, tip-off, status) rows for tip-offs in `when`'s window (see SCHEDULE_WINDOWS)"""
+    if when not in SCHEDULE_WINDOWS:
+        raise ValueError(f"Unknown period {when!r}; choose from {', '.join(SCHEDULE_WINDOWS)}")
+    tables = schedule_tables(cursor)
+    if not tables:
+        logger.warning("No LeagueSchedule tables found")
+        return []
 
-    return set(unfound_games)
+    days_back, days_ahead = SCHEDULE_WINDOWS[when]
+    cursor.execute(schedule_index_query(tables), int(os.getenv('SCHEDULE_EXPECTED_MINUTES', 165)),
+                   days_back, days_ahead)
+    index = cursor.fetchall()
+    statuses = {}
+    for _, _, status in index:
+        statuses[status] = statuses.get(status, 0) + 1
+    logger.info(f"Schedule ({', '.join(tables)}): {statuses}")
+    return index
+
+
+def find_new_games(cursor, when='last_three_days'):
+    """
+    gameIds from every season's schedule whose expected final time has passed
+    and which aren't complete in the database, for tip-offs in `when`'s
+    window. Games already in the FailedGames queue are left to it.
+    Safe to run several times a night: unfinished games are never fetched.
+    """
+    logger.info(f"Finding new games for period: {when}")
+    index = schedule_index(cursor, when)
+    queued = set(load_failed_games(cursor, include_abandoned=True))
+    unfound_games = {game_id for game_id, _, status in index if status == 'due' and game_id not in queued}
+    logger.info(f"{len(unfound_games)} games due to fetch")
+    return unfound_games
 
 
-def get_new_games(unfound_games):
+def get_new_games(unfound_games, time_left=None, failures=None):
+    """
+    Fetch each game's page from NBA.com on its own retry schedule (see
+    utils.retry.RetryScheduler), trying games in the order given. Transient
+    failures back off with jitter and honor Retry-After, permanent ones such
+    as a 404 for a game not played yet are dropped at once, and retrying stops
+    when time_left (the Lambda context's get_remaining_time_in_millis) gets
+    within SCRAPE_TIME_RESERVE_SECONDS of running out. If failures is given,
+    it is filled with {gameId: reason} for every game not retrieved.
+    """
     logger.info(f"Retrieving {len(unfound_games)} games from NBA.com")
-    found_games = set()
-    attempts = 0
+    # Overridable so benchmarks and tests can point the scraper at a local stand-in
+    base_url = os.getenv('NBA_BASE_URL', 'https://www.nba.com').rstrip('/')
+    scheduler = RetryScheduler(
+        unfound_games,
+        max_attempts=int(os.getenv('SCRAPE_MAX_ATTEMPTS', 3)),
+        base_delay=float(os.getenv('SCRAPE_BACKOFF_SECONDS', 5)),
+        max_delay=float(os.getenv('SCRAPE_MAX_BACKOFF_SECONDS', 60)),
+        min_interval=float(os.getenv('SCRAPE_DELAY_SECONDS', 2)),  # Rate limiting
+        time_left=time_left,
+        reserve=float(os.getenv('SCRAPE_TIME_RESERVE_SECONDS', 120)))
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/106.0.0.0 Safari/537.36',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
+        'Accept-Language': 'en-US,en;q=0.5',
+        'Accept-Encoding': 'gzip, deflate, br',
+        'Connection': 'keep-alive',
+        'Referer': 'https://www.nba.com',
+        'Upgrade-Insecure-Requests': '1',
+        'Cache-Control': 'max-age=0'
+    }
     games_list = []
-    while len(unfound_games) > 0 and attempts < 3:
-        for game_id in list(unfound_games):
-            logger.info(f'Trying game {game_id}...')
-            url = f'https://www.nba.com/game/00{str(game_id)}'
-            try:
+    while True:
+        game_id = scheduler.next()
+        if game_id is None:
+            break
+        logger.info(f'Trying game {game_id} (attempt {scheduler.attempts[game_id]})...')
+        url = f'{base_url}/game/00{str(game_id)}'
+        try:
+            with metrics.stage('fetch') as stage:
+                response = requests.get(url, headers=headers, timeout=scheduler.request_timeout(10))
+                stage.count(requests=1, bytes=len(response.content))
+        except requests.RequestException as e:
+            logger.warning(f'Request failed for game {game_id}: {str(e)}')
+            scheduler.failed(game_id, type(e).__name__)
+            continue
 
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/106.0.0.0 Safari/537.36',
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
-                    'Accept-Language': 'en-US,en;q=0.5',
-                    'Accept-Encoding': 'gzip, deflate, br',
-                    'Connection': 'keep-alive',
-                    'Referer': 'https://www.nba.com',
-                    'Upgrade-Insecure-Requests': '1',
-                    'Cache-Control': 'max-age=0' 
-                }
-               
-                
-                response = requests.get(url, headers=headers, timeout=10)
-                if response.status_code == 200:
-                    soup = BeautifulSoup(response.content, 'html.parser')
-                    script_tag = soup.find('script', type='application/json')
-                    if script_tag:
-                        json_data = json.loads(script_tag.string)
-                        game = json_data.get('props', {}).get('pageProps', {}).get('game')
-                        if game:
-                            found_games.add(game_id)
-                            games_list.append(game)
-                            logger.info(f'Successfully retrieved game {game_id}')
-                        else:
-                            logger.warning(f'Game {game_id} not found in JSON')
-                    else:
-                        logger.warning(f'Script tag not found for game {game_id}')
-                else:
-                    logger.error(f'Status code error {response.status_code} for game {game_id}')
-            except Exception as e:
-                logger.error(f'Error processing game {game_id}: {str(e)}')
-            
-            time.sleep(2)  # Rate limiting
-        unfound_games = unfound_games - found_games
-        time.sleep(10)
-        attempts += 1
+        if response.status_code != 200:
+            permanent = is_permanent(response.status_code)
+            retry_after = retry_after_seconds(response.headers.get('Retry-After'))
+            logger.warning(f'Status code {response.status_code} for game {game_id}'
+                           f'{" (not retrying)" if permanent else ""}'
+                           f'{f", Retry-After {retry_after:.0f}s" if retry_after is not None else ""}')
+            scheduler.failed(game_id, f'HTTP {response.status_code}', permanent=permanent,
+                             retry_after=retry_after)
+            continue
+
+        try:
+            with metrics.stage('extract') as stage:
+                soup = BeautifulSoup(response.content, 'html.parser')
+                script_tag = soup.find('script', type='application/json')
+                game = None
+                if script_tag:
+                    json_data = json.loads(script_tag.string)
+                    game = json_data.get('props', {}).get('pageProps', {}).get('game')
+                stage.count(games=1 if game else 0)
+        except Exception as e:
+            # Usually a page cut short; the next attempt may get all of it
+            logger.warning(f'Error processing game {game_id}: {str(e)}')
+            scheduler.failed(game_id, 'unreadable page')
+            continue
+
+        if game:
+            games_list.append(game)
+            scheduler.succeeded(game_id)
+            logger.info(f'Successfully retrieved game {game_id}')
+        else:
+            logger.warning(f'{"Game not found in JSON" if script_tag else "Script tag not found"} '
+                           f'for game {game_id}')
+            scheduler.failed(game_id, 'no game data')
+
+    summary = scheduler.summary()
+    logger.info(f'Retrieved {len(games_list)} of {len(unfound_games)} games: {summary}')
+    for reasons, label in [(scheduler.permanent, 'permanent failure'), (scheduler.exhausted, 'out of attempts')]:
+        for game_id, reason in reasons.items():
+            logger.error(f'Game {game_id} not retrieved, {label}: {reason}')
+    if scheduler.out_of_time:
+        logger.error(f'Ran out of time with {len(scheduler.out_of_time)} games left: '
+                     f'{sorted(scheduler.out_of_time)}')
+    if failures is not None:
+        failures.update(scheduler.permanent)
+        failures.update(scheduler.exhausted)
+        failures.update({game_id: 'out of time' for game_id in scheduler.out_of_time})
     return games_list
 
+
+def load_failed_games(cursor, include_abandoned=False):
+    """gameIds waiting in the FailedGames retry queue, oldest failure first"""
+    cursor.execute(f"""
+    SELECT gameId
+    FROM [dbo].[FailedGames]
+    {'' if include_abandoned else 'WHERE abandonedAt IS NULL'}
+    ORDER BY firstFailedAt ASC, gameId ASC
+    """)
+    return [row[0] for row in cursor.fetchall()]
+
+
+def record_failed_games(cursor, failures, stage):
+    """
+    Upsert {gameId: reason} into FailedGames as failures at stage ('fetch' or
+    'load'), counting one more attempt for each. A game reaching
+    FAILED_GAME_MAX_ATTEMPTS is marked abandoned and logged, not dropped.
+    The caller commits.
+    """
+    if not failures:
+        return
+    max_attempts = int(os.getenv('FAILED_GAME_MAX_ATTEMPTS', 10))
+
+    cursor.execute("""
+    CREATE TABLE #TempFailedGames (
+        gameId INT PRIMARY KEY,
+        stage NVARCHAR(10),
+        reason NVARCHAR(400)
+    )""")
+    try:
+        cursor.executemany("INSERT INTO #TempFailedGames (gameId, stage, reason) VALUES (?, ?, ?)",
+                           [(int(game_id), stage, str(reason)[:400]) for game_id, reason in failures.items()])
+        cursor.execute("""
+        MERGE INTO [dbo].[FailedGames] AS target
+        USING #TempFailedGames AS source
+        ON target.gameId = source.gameId
+        WHEN MATCHED THEN
+            UPDATE SET
+                stage = source.stage,
+                reason = source.reason,
+                attempts = target.attempts + 1,
+                lastFailedAt = SYSUTCDATETIME(),
+                abandonedAt = CASE WHEN target.attempts + 1 >= ? THEN SYSUTCDATETIME() END
+        WHEN NOT MATCHED THEN
+            INSERT (gameId, stage, reason, attempts, firstFailedAt, lastFailedAt, abandonedAt)
+            VALUES (source.gameId, source.stage, source.reason, 1, SYSUTCDATETIME(), SYSUTCDATETIME(),
+                    CASE WHEN 1 >= ? THEN SYSUTCDATETIME() END)
+        OUTPUT inserted.gameId, inserted.attempts, inserted.reason, inserted.abandonedAt;
+        """, max_attempts, max_attempts)
+        for game_id, attempts, reason, abandoned_at in cursor.fetchall():
+            if abandoned_at is not None:
+                logger.error(f'Abandoning game {game_id} after {attempts} failed runs ({stage}: {reason}); '
+                             f'clear FailedGames.abandonedAt to retry it')
+            else:
+                logger.warning(f'Queued game {game_id} for retry, attempt {attempts} failed ({stage}: {reason})')
+    finally:
+        cursor.execute("DROP TABLE #TempFailedGames")
+
+
+def clear_game_markers(cursor, game_ids):
+    """Remove fully loaded games from the FailedGames retry queue and LiveGames. The caller commits."""
+    game_ids = sorted({int(game_id) for game_id in game_ids})
+    for start in range(0, len(game_ids), 1000):
+        batch = game_ids[start:start + 1000]
+        for table in ['FailedGames', 'LiveGames']:
+            cursor.execute(f"DELETE FROM [dbo].[{table}] WHERE gameId IN ({','.join('?' * len(batch))})",
+                           *batch)
+
+def load_player_info(conn):
+    """CommonPlayerInfo keyed by person_id, for collect_all_players' lookups"""
+    player_df = pd.read_sql("select * from CommonPlayerInfo", conn)
+    return player_df.drop_duplicates('person_id').set_index('person_id', drop=False)
+
+
+def load_team_ids(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT teamId FROM Teams")
+        return {row[0] for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+
 def collect_all_players(games_list,conn):
     
     def sanitize(value):
@@ -141,7 +345,7 @@ def collect_all_players(games_list,conn):
     db_ids = []
     non_db_ids=[]
     
-    player_df = pd.read_sql("select * from CommonPlayerInfo", conn)
+    player_df = reference_cache.get(conn, 'CommonPlayerInfo', lambda: load_player_info(conn))
     
     for game in games_list:
         # Process both home and away teams
@@ -150,10 +354,9 @@ def collect_all_players(games_list,conn):
             personId = player['personId']
             if personId not in id_set:
                 try:
-                    matches = player_df.loc[player_df['person_id'] == personId, :]
-                    if len(matches) == 0:
+                    if personId not in player_df.index:
                         raise KeyError("ID not found in DataFrame")
-                    person = player_df.loc[player_df['person_id'] == personId, :].squeeze()
+                    person = player_df.loc[personId]
                     # Extract and sanitize fields
                     firstName = remove_accents(person['first_name'])
                     lastName = remove_accents(person['last_name'])
@@ -245,50 +448,53 @@ def insert_players(cursor, all_players):
         ?, ?, ?, ?, ?
     )
     """
-    cursor.executemany(insert_temp_sql, all_players)
+    with metrics.stage('load', table='Players') as stage:
+        cursor.executemany(insert_temp_sql, all_players)
+        stage.count(rows=len(all_players))
     
     # Merge from temp table to main table
-    cursor.execute("""
-    MERGE INTO Players AS target
-    USING #TempPlayers AS source
-    ON target.personId = source.personId
-    WHEN MATCHED THEN
-        UPDATE SET
-            firstName = source.firstName,
-            lastName = source.lastName,
-            birthDate = source.birthDate,
-            school = source.school,
-            country = source.country,
-            height = source.height,
-            bodyWeight = source.bodyWeight,
-            guard = source.guard,
-            forward = source.forward,
-            center = source.center,
-            draftYear = source.draftYear,
-            draftRound = source.draftRound,
-            draftNumber = source.draftNumber,
-            dleague = source.dleague
-    WHEN NOT MATCHED THEN
-        INSERT VALUES (
-            source.personId,
-            source.firstName,
-            source.lastName,
-            source.birthDate,
-            source.school,
-            source.country,
-            source.height,
-            source.bodyWeight,
-            source.guard,
-            source.forward,
-            source.center,
-            source.draftYear,
-            source.draftRound,
-            source.draftNumber,
-            source.dleague
-        );
+    with metrics.stage('merge', table='Players'):
+        cursor.execute("""
+        MERGE INTO Players AS target
+        USING #TempPlayers AS source
+        ON target.personId = source.personId
+        WHEN MATCHED THEN
+            UPDATE SET
+                firstName = source.firstName,
+                lastName = source.lastName,
+                birthDate = source.birthDate,
+                school = source.school,
+                country = source.country,
+                height = source.height,
+                bodyWeight = source.bodyWeight,
+                guard = source.guard,
+                forward = source.forward,
+                center = source.center,
+                draftYear = source.draftYear,
+                draftRound = source.draftRound,
+                draftNumber = source.draftNumber,
+                dleague = source.dleague
+        WHEN NOT MATCHED THEN
+            INSERT VALUES (
+                source.personId,
+                source.firstName,
+                source.lastName,
+                source.birthDate,
+                source.school,
+                source.country,
+                source.height,
+                source.bodyWeight,
+                source.guard,
+                source.forward,
+                source.center,
+                source.draftYear,
+                source.draftRound,
+                source.draftNumber,
+                source.dleague
+            );
     
-    DROP TABLE #TempPlayers;
-    """)
+        DROP TABLE #TempPlayers;
+        """)
 
 
 
@@ -384,7 +590,9 @@ def insert_games(cursor, games_data):
     """
     
     try:
-        cursor.executemany(insert_temp_sql, games_data)
+        with metrics.stage('load', table='Games') as stage:
+            cursor.executemany(insert_temp_sql, games_data)
+            stage.count(rows=len(games_data))
     except Exception as e:
         print(f"\nError inserting into temp table: {str(e)}")
         cursor.execute("DROP TABLE #TempGames")
@@ -392,49 +600,119 @@ def insert_games(cursor, games_data):
     
     # Merge from temp table to main table
     try:
-        cursor.execute("""
-        MERGE INTO Games AS target
-        USING #TempGames AS source
-        ON target.gameId = source.gameId
-        WHEN MATCHED THEN
-            UPDATE SET
-                gameDate = source.gameDate,
-                gameDuration = source.gameDuration,
-                hometeamId = source.hometeamId,
-                awayteamId = source.awayteamId,
-                homeScore = source.homeScore,
-                awayScore = source.awayScore,
-                winner = source.winner,
-                attendance = source.attendance
-        WHEN NOT MATCHED THEN
-            INSERT (
-                gameId,
-                gameDate,
-                gameDuration,
-                hometeamId,
-                awayteamId,
-                homeScore,
-                awayScore,
-                winner,
-                attendance
-            ) VALUES (
-                source.gameId,
-                source.gameDate,
-                source.gameDuration,
-                source.hometeamId,
-                source.awayteamId,
-                source.homeScore,
-                source.awayScore,
-                source.winner,
-                source.attendance
-            );
-        """)
+        with metrics.stage('merge', table='Games'):
+            cursor.execute("""
+            MERGE INTO Games AS target
+            USING #TempGames AS source
+            ON target.gameId = source.gameId
+            WHEN MATCHED THEN
+                UPDATE SET
+                    gameDate = source.gameDate,
+                    gameDuration = source.gameDuration,
+                    hometeamId = source.hometeamId,
+                    awayteamId = source.awayteamId,
+                    homeScore = source.homeScore,
+                    awayScore = source.awayScore,
+                    winner = source.winner,
+                    attendance = source.attendance
+            WHEN NOT MATCHED THEN
+                INSERT (
+                    gameId,
+                    gameDate,
+                    gameDuration,
+                    hometeamId,
+                    awayteamId,
+                    homeScore,
+                    awayScore,
+                    winner,
+                    attendance
+                ) VALUES (
+                    source.gameId,
+                    source.gameDate,
+                    source.gameDuration,
+                    source.hometeamId,
+                    source.awayteamId,
+                    source.homeScore,
+                    source.awayScore,
+                    source.winner,
+                    source.attendance
+                );
+            """)
     except Exception as e:
         print(f"\nError during merge operation: {str(e)}")
         raise
     finally:
         cursor.execute("DROP TABLE #TempGames")
 
+def insert_game_teams(cursor, games_data):
+    """
+    Upsert PersistedGameTeams for the loaded games from the UniqueGameTeams
+    view, so exports read team names without re-evaluating GameTeams'
+    year-range joins. Must run after insert_games in the same transaction.
+    """
+    if not games_data:
+        return
+
+    cursor.execute("CREATE TABLE #TempGameIds (gameId INT PRIMARY KEY)")
+    try:
+        with metrics.stage('load', table='PersistedGameTeams') as stage:
+            cursor.executemany("INSERT INTO #TempGameIds (gameId) VALUES (?)",
+                               [(int(game[0]),) for game in games_data])
+            stage.count(rows=len(games_data))
+        with metrics.stage('merge', table='PersistedGameTeams'):
+            cursor.execute("""
+            MERGE INTO PersistedGameTeams AS target
+            USING (
+                SELECT GT.*
+                FROM UniqueGameTeams GT
+                INNER JOIN #TempGameIds T ON GT.gameId = T.gameId
+            ) AS source
+            ON target.gameId = source.gameId
+            WHEN MATCHED THEN
+                UPDATE SET
+                    gameDate = source.gameDate,
+                    hometeamId = source.hometeamId,
+                    awayteamId = source.awayteamId,
+                    homeScore = source.homeScore,
+                    awayScore = source.awayScore,
+                    winner = source.winner,
+                    hometeamCity = source.hometeamCity,
+                    hometeamName = source.hometeamName,
+                    awayteamCity = source.awayteamCity,
+                    awayteamName = source.awayteamName
+            WHEN NOT MATCHED THEN
+                INSERT (
+                    gameId,
+                    gameDate,
+                    hometeamId,
+                    awayteamId,
+                    homeScore,
+                    awayScore,
+                    winner,
+                    hometeamCity,
+                    hometeamName,
+                    awayteamCity,
+                    awayteamName
+                ) VALUES (
+                    source.gameId,
+                    source.gameDate,
+                    source.hometeamId,
+                    source.awayteamId,
+                    source.homeScore,
+                    source.awayScore,
+                    source.winner,
+                    source.hometeamCity,
+                    source.hometeamName,
+                    source.awayteamCity,
+                    source.awayteamName
+                );
+            """)
+    except Exception as e:
+        print(f"\nError during PersistedGameTeams merge: {str(e)}")
+        raise
+    finally:
+        cursor.execute("DROP TABLE #TempGameIds")
+
 def insert_player_stats(cursor, players_stats):
     if not players_stats:
         return
@@ -479,68 +757,123 @@ def insert_player_stats(cursor, players_stats):
     )
     """
     
-    for i in range(0, len(players_stats), batch_size):
-        batch = players_stats[i:i + batch_size]
-        cursor.executemany(insert_temp_sql, batch)
-        print(f"Processed batch {i} to {min(i + batch_size, len(players_stats))}")
+    with metrics.stage('load', table='PlayerStatistics') as stage:
+        for i in range(0, len(players_stats), batch_size):
+            batch = players_stats[i:i + batch_size]
+            cursor.executemany(insert_temp_sql, batch)
+            print(f"Processed batch {i} to {min(i + batch_size, len(players_stats))}")
+        stage.count(rows=len(players_stats))
     
     # Merge from temp table to main table
-    cursor.execute("""
-    MERGE INTO PlayerStatistics AS target
-    USING #TempPlayerStats AS source
-    ON target.personId = source.personId AND target.gameId = source.gameId
-    WHEN MATCHED THEN
-        UPDATE SET
-            teamId = source.teamId,
-            assists = source.assists,
-            blocks = source.blocks,
-            fieldGoalsAttempted = source.fieldGoalsAttempted,
-            fieldGoalsMade = source.fieldGoalsMade,
-            fieldGoalsPercentage = source.fieldGoalsPercentage,
-            foulsPersonal = source.foulsPersonal,
-            freeThrowsAttempted = source.freeThrowsAttempted,
-            freeThrowsMade = source.freeThrowsMade,
-            freeThrowsPercentage = source.freeThrowsPercentage,
-            numMinutes = source.numMinutes,
-            plusMinusPoints = source.plusMinusPoints,
-            points = source.points,
-            reboundsDefensive = source.reboundsDefensive,
-            reboundsOffensive = source.reboundsOffensive,
-            reboundsTotal = source.reboundsTotal,
-            steals = source.steals,
-            threePointersAttempted = source.threePointersAttempted,
-            threePointersMade = source.threePointersMade,
-            threePointersPercentage = source.threePointersPercentage,
-            turnovers = source.turnovers
-    WHEN NOT MATCHED THEN
-        INSERT VALUES (
-            source.personId,
-            source.gameId,
-            source.teamId,
-            source.assists,
-            source.blocks,
-            source.fieldGoalsAttempted,
-            source.fieldGoalsMade,
-            source.fieldGoalsPercentage,
-            source.foulsPersonal,
-            source.freeThrowsAttempted,
-            source.freeThrowsMade,
-            source.freeThrowsPercentage,
-            source.numMinutes,
-            source.plusMinusPoints,
-            source.points,
-            source.reboundsDefensive,
-            source.reboundsOffensive,
-            source.reboundsTotal,
-            source.steals,
-            source.threePointersAttempted,
-            source.threePointersMade,
-            source.threePointersPercentage,
-            source.turnovers
-        );
+    with metrics.stage('merge', table='PlayerStatistics'):
+        cursor.execute("""
+        MERGE INTO PlayerStatistics AS target
+        USING #TempPlayerStats AS source
+        ON target.personId = source.personId AND target.gameId = source.gameId
+        WHEN MATCHED AND EXISTS (
+            -- Only touch rows whose values changed; percentages compare as stored (decimal)
+            SELECT source.teamId, source.assists, source.blocks, source.fieldGoalsAttempted,
+                source.fieldGoalsMade, CAST(source.fieldGoalsPercentage AS decimal),
+                source.foulsPersonal, source.freeThrowsAttempted, source.freeThrowsMade,
+                CAST(source.freeThrowsPercentage AS decimal), source.numMinutes,
+                source.plusMinusPoints, source.points, source.reboundsDefensive,
+                source.reboundsOffensive, source.reboundsTotal, source.steals,
+                source.threePointersAttempted, source.threePointersMade,
+                CAST(source.threePointersPercentage AS decimal), source.turnovers
+            EXCEPT
+            SELECT target.teamId, target.assists, target.blocks, target.fieldGoalsAttempted,
+                target.fieldGoalsMade, target.fieldGoalsPercentage, target.foulsPersonal,
+                target.freeThrowsAttempted, target.freeThrowsMade,
+                target.freeThrowsPercentage, target.numMinutes, target.plusMinusPoints,
+                target.points, target.reboundsDefensive, target.reboundsOffensive,
+                target.reboundsTotal, target.steals, target.threePointersAttempted,
+                target.threePointersMade, target.threePointersPercentage, target.turnovers
+        ) THEN
+            UPDATE SET
+                teamId = source.teamId,
+                assists = source.assists,
+                blocks = source.blocks,
+                fieldGoalsAttempted = source.fieldGoalsAttempted,
+                fieldGoalsMade = source.fieldGoalsMade,
+                fieldGoalsPercentage = source.fieldGoalsPercentage,
+                foulsPersonal = source.foulsPersonal,
+                freeThrowsAttempted = source.freeThrowsAttempted,
+                freeThrowsMade = source.freeThrowsMade,
+                freeThrowsPercentage = source.freeThrowsPercentage,
+                numMinutes = source.numMinutes,
+                plusMinusPoints = source.plusMinusPoints,
+                points = source.points,
+                reboundsDefensive = source.reboundsDefensive,
+                reboundsOffensive = source.reboundsOffensive,
+                reboundsTotal = source.reboundsTotal,
+                steals = source.steals,
+                threePointersAttempted = source.threePointersAttempted,
+                threePointersMade = source.threePointersMade,
+                threePointersPercentage = source.threePointersPercentage,
+                turnovers = source.turnovers
+        WHEN NOT MATCHED THEN
+            INSERT VALUES (
+                source.personId,
+                source.gameId,
+                source.teamId,
+                source.assists,
+                source.blocks,
+                source.fieldGoalsAttempted,
+                source.fieldGoalsMade,
+                source.fieldGoalsPercentage,
+                source.foulsPersonal,
+                source.freeThrowsAttempted,
+                source.freeThrowsMade,
+                source.freeThrowsPercentage,
+                source.numMinutes,
+                source.plusMinusPoints,
+                source.points,
+                source.reboundsDefensive,
+                source.reboundsOffensive,
+                source.reboundsTotal,
+                source.steals,
+                source.threePointersAttempted,
+                source.threePointersMade,
+                source.threePointersPercentage,
+                source.turnovers
+            );
         
-    DROP TABLE #TempPlayerStats;
+        DROP TABLE #TempPlayerStats;
+        """)
+
+def compact_columnstore(cursor):
+    """
+    Keep the optional stat-table columnstore indexes healthy after the nightly
+    MERGE. Trickle loads land in the open delta store, which scans as rowstore,
+    and updates leave deleted rows behind; REORGANIZE compresses the delta store
+    and purges deleted rows once either passes its threshold
+    (COLUMNSTORE_MAX_DELTA_ROWS, COLUMNSTORE_MAX_DELETED_RATIO).
+    Tables without a columnstore index are skipped.
+    """
+    max_delta_rows = int(os.getenv('COLUMNSTORE_MAX_DELTA_ROWS', 100000))
+    max_deleted_ratio = float(os.getenv('COLUMNSTORE_MAX_DELETED_RATIO', 0.1))
+
+    cursor.execute("""
+    SELECT OBJECT_NAME(i.object_id), i.name,
+           SUM(CASE WHEN rg.state_desc IN ('OPEN', 'CLOSED') THEN rg.total_rows ELSE 0 END),
+           SUM(rg.deleted_rows),
+           SUM(rg.total_rows)
+    FROM sys.indexes i
+    INNER JOIN sys.dm_db_column_store_row_group_physical_stats rg
+        ON rg.object_id = i.object_id AND rg.index_id = i.index_id
+    WHERE i.type = 6
+      AND i.object_id IN (OBJECT_ID('PlayerStatistics'), OBJECT_ID('TeamStatistics'))
+    GROUP BY i.object_id, i.name
     """)
+    for table, index, delta_rows, deleted_rows, total_rows in cursor.fetchall():
+        deleted_ratio = deleted_rows / total_rows if total_rows else 0
+        if delta_rows > max_delta_rows or deleted_ratio > max_deleted_ratio:
+            logger.info(f'Reorganizing {index}: {delta_rows} delta rows, '
+                        f'{deleted_ratio:.1%} deleted')
+            cursor.execute(f"ALTER INDEX [{index}] ON [{table}] REORGANIZE "
+                           "WITH (COMPRESS_ALL_ROW_GROUPS = ON)")
+        else:
+            logger.info(f'{index} healthy: {delta_rows} delta rows, {deleted_ratio:.1%} deleted')
 
 def insert_teams(cursor, team_ids):
     """
@@ -567,19 +900,22 @@ def insert_teams(cursor, team_ids):
     
     # Insert into temp table
     insert_temp_sql = "INSERT INTO #TempTeams (teamId) VALUES (?)"
-    cursor.executemany(insert_temp_sql, team_tuples)
+    with metrics.stage('load', table='Teams') as stage:
+        cursor.executemany(insert_temp_sql, team_tuples)
+        stage.count(rows=len(team_tuples))
     
     # Merge from temp table to main table
-    cursor.execute("""
-    MERGE INTO Teams AS target
-    USING #TempTeams AS source
-    ON target.teamId = source.teamId
-    WHEN NOT MATCHED THEN
-        INSERT (teamId)
-        VALUES (source.teamId);
+    with metrics.stage('merge', table='Teams'):
+        cursor.execute("""
+        MERGE INTO Teams AS target
+        USING #TempTeams AS source
+        ON target.teamId = source.teamId
+        WHEN NOT MATCHED THEN
+            INSERT (teamId)
+            VALUES (source.teamId);
     
-    DROP TABLE #TempTeams;
-    """)
+        DROP TABLE #TempTeams;
+        """)
     
     print(f"Processed {len(team_ids)} teams")
 
@@ -795,76 +1131,109 @@ def insert_team_stats(cursor, team_stats):
         ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
     )
     """
-    cursor.executemany(insert_temp_sql, team_stats)
+    with metrics.stage('load', table='TeamStatistics') as stage:
+        cursor.executemany(insert_temp_sql, team_stats)
+        stage.count(rows=len(team_stats))
     
     # Merge from temp table to the view
-    cursor.execute("""
-    MERGE INTO TeamStatisticsNoCoach AS target
-    USING #TempTeamStats AS source
-    ON target.teamId = source.teamId AND target.gameId = source.gameId
-    WHEN MATCHED THEN
-        UPDATE SET
-            home = source.home,
-            win = source.win,
-            assists = source.assists,
-            blocks = source.blocks,
-            fieldGoalsAttempted = source.fieldGoalsAttempted,
-            fieldGoalsMade = source.fieldGoalsMade,
-            fieldGoalsPercentage = source.fieldGoalsPercentage,
-            foulsPersonal = source.foulsPersonal,
-            freeThrowsAttempted = source.freeThrowsAttempted,
-            freeThrowsMade = source.freeThrowsMade,
-            freeThrowsPercentage = source.freeThrowsPercentage,
-            numMinutes = source.numMinutes,
-            plusMinusPoints = source.plusMinusPoints,
-            points = source.points,
-            reboundsDefensive = source.reboundsDefensive,
-            reboundsOffensive = source.reboundsOffensive,
-            reboundsTotal = source.reboundsTotal,
-            steals = source.steals,
-            threePointersAttempted = source.threePointersAttempted,
-            threePointersMade = source.threePointersMade,
-            threePointersPercentage = source.threePointersPercentage,
-            turnovers = source.turnovers,
-            q1Points = source.q1Points,
-            q2Points = source.q2Points,
-            q3Points = source.q3Points,
-            q4Points = source.q4Points,
-            benchPoints = source.benchPoints,
-            biggestLead = source.biggestLead,
-            biggestScoringRun = source.biggestScoringRun,
-            leadChanges = source.leadChanges,
-            pointsFastBreak = source.pointsFastBreak,
-            pointsFromTurnovers = source.pointsFromTurnovers,
-            pointsInThePaint = source.pointsInThePaint,
-            pointsSecondChance = source.pointsSecondChance,
-            timesTied = source.timesTied,
-            timeoutsRemaining = source.timeoutsRemaining,
-            seasonWins = source.seasonWins,
-            seasonLosses = source.seasonLosses
-    WHEN NOT MATCHED THEN
-        INSERT VALUES (
-            source.teamId, source.gameId, source.home, source.win,
-            source.assists, source.blocks, source.fieldGoalsAttempted,
-            source.fieldGoalsMade, source.fieldGoalsPercentage,
-            source.foulsPersonal, source.freeThrowsAttempted,
-            source.freeThrowsMade, source.freeThrowsPercentage,
-            source.numMinutes, source.plusMinusPoints, source.points,
-            source.reboundsDefensive, source.reboundsOffensive,
-            source.reboundsTotal, source.steals,
-            source.threePointersAttempted, source.threePointersMade,
-            source.threePointersPercentage, source.turnovers,
-            source.q1Points, source.q2Points, source.q3Points,
-            source.q4Points, source.benchPoints, source.biggestLead,
-            source.biggestScoringRun, source.leadChanges,
-            source.pointsFastBreak, source.pointsFromTurnovers,
-            source.pointsInThePaint, source.pointsSecondChance,
-            source.timesTied, source.timeoutsRemaining,
-            source.seasonWins, source.seasonLosses
-        );
+    with metrics.stage('merge', table='TeamStatistics'):
+        cursor.execute("""
+        MERGE INTO TeamStatisticsNoCoach AS target
+        USING #TempTeamStats AS source
+        ON target.teamId = source.teamId AND target.gameId = source.gameId
+        WHEN MATCHED AND EXISTS (
+            -- Only touch rows whose values changed; percentages compare as stored (decimal)
+            SELECT source.home, source.win, source.assists, source.blocks,
+                source.fieldGoalsAttempted, source.fieldGoalsMade,
+                CAST(source.fieldGoalsPercentage AS decimal), source.foulsPersonal,
+                source.freeThrowsAttempted, source.freeThrowsMade,
+                CAST(source.freeThrowsPercentage AS decimal), source.numMinutes,
+                source.plusMinusPoints, source.points, source.reboundsDefensive,
+                source.reboundsOffensive, source.reboundsTotal, source.steals,
+                source.threePointersAttempted, source.threePointersMade,
+                CAST(source.threePointersPercentage AS decimal), source.turnovers,
+                source.q1Points, source.q2Points, source.q3Points, source.q4Points,
+                source.benchPoints, source.biggestLead, source.biggestScoringRun,
+                source.leadChanges, source.pointsFastBreak, source.pointsFromTurnovers,
+                source.pointsInThePaint, source.pointsSecondChance, source.timesTied,
+                source.timeoutsRemaining, source.seasonWins, source.seasonLosses
+            EXCEPT
+            SELECT target.home, target.win, target.assists, target.blocks,
+                target.fieldGoalsAttempted, target.fieldGoalsMade,
+                target.fieldGoalsPercentage, target.foulsPersonal,
+                target.freeThrowsAttempted, target.freeThrowsMade,
+                target.freeThrowsPercentage, target.numMinutes, target.plusMinusPoints,
+                target.points, target.reboundsDefensive, target.reboundsOffensive,
+                target.reboundsTotal, target.steals, target.threePointersAttempted,
+                target.threePointersMade, target.threePointersPercentage, target.turnovers,
+                target.q1Points, target.q2Points, target.q3Points, target.q4Points,
+                target.benchPoints, target.biggestLead, target.biggestScoringRun,
+                target.leadChanges, target.pointsFastBreak, target.pointsFromTurnovers,
+                target.pointsInThePaint, target.pointsSecondChance, target.timesTied,
+                target.timeoutsRemaining, target.seasonWins, target.seasonLosses
+        ) THEN
+            UPDATE SET
+                home = source.home,
+                win = source.win,
+                assists = source.assists,
+                blocks = source.blocks,
+                fieldGoalsAttempted = source.fieldGoalsAttempted,
+                fieldGoalsMade = source.fieldGoalsMade,
+                fieldGoalsPercentage = source.fieldGoalsPercentage,
+                foulsPersonal = source.foulsPersonal,
+                freeThrowsAttempted = source.freeThrowsAttempted,
+                freeThrowsMade = source.freeThrowsMade,
+                freeThrowsPercentage = source.freeThrowsPercentage,
+                numMinutes = source.numMinutes,
+                plusMinusPoints = source.plusMinusPoints,
+                points = source.points,
+                reboundsDefensive = source.reboundsDefensive,
+                reboundsOffensive = source.reboundsOffensive,
+                reboundsTotal = source.reboundsTotal,
+                steals = source.steals,
+                threePointersAttempted = source.threePointersAttempted,
+                threePointersMade = source.threePointersMade,
+                threePointersPercentage = source.threePointersPercentage,
+                turnovers = source.turnovers,
+                q1Points = source.q1Points,
+                q2Points = source.q2Points,
+                q3Points = source.q3Points,
+                q4Points = source.q4Points,
+                benchPoints = source.benchPoints,
+                biggestLead = source.biggestLead,
+                biggestScoringRun = source.biggestScoringRun,
+                leadChanges = source.leadChanges,
+                pointsFastBreak = source.pointsFastBreak,
+                pointsFromTurnovers = source.pointsFromTurnovers,
+                pointsInThePaint = source.pointsInThePaint,
+                pointsSecondChance = source.pointsSecondChance,
+                timesTied = source.timesTied,
+                timeoutsRemaining = source.timeoutsRemaining,
+                seasonWins = source.seasonWins,
+                seasonLosses = source.seasonLosses
+        WHEN NOT MATCHED THEN
+            INSERT VALUES (
+                source.teamId, source.gameId, source.home, source.win,
+                source.assists, source.blocks, source.fieldGoalsAttempted,
+                source.fieldGoalsMade, source.fieldGoalsPercentage,
+                source.foulsPersonal, source.freeThrowsAttempted,
+                source.freeThrowsMade, source.freeThrowsPercentage,
+                source.numMinutes, source.plusMinusPoints, source.points,
+                source.reboundsDefensive, source.reboundsOffensive,
+                source.reboundsTotal, source.steals,
+                source.threePointersAttempted, source.threePointersMade,
+                source.threePointersPercentage, source.turnovers,
+                source.q1Points, source.q2Points, source.q3Points,
+                source.q4Points, source.benchPoints, source.biggestLead,
+                source.biggestScoringRun, source.leadChanges,
+                source.pointsFastBreak, source.pointsFromTurnovers,
+                source.pointsInThePaint, source.pointsSecondChance,
+                source.timesTied, source.timeoutsRemaining,
+                source.seasonWins, source.seasonLosses
+            );
         
-    DROP TABLE #TempTeamStats;
-    """)
+        DROP TABLE #TempTeamStats;
+        """)
 
 
 
@@ -963,7 +1332,8 @@ def collect_player_stats(games_list):
             
     return players_stats
     
-def update_NBA_db(conn, cursor, when='last_three_days'):
+@profiled(logger.info)
+def update_NBA_db(conn, cursor, when='last_three_days', time_left=None):
     """
     Updates NBA database with new game data and player statistics.
     Returns None on success, unfound_games list if game retrieval fails,
@@ -973,66 +1343,313 @@ def update_NBA_db(conn, cursor, when='last_three_days'):
         conn: Database connection
         cursor: Database cursor
         when: Time period to check for new games
+        time_left: Callable returning the milliseconds left, e.g. the Lambda
+            context's get_remaining_time_in_millis; bounds the scraper's retries
     """
+    check_schema(cursor)
+    metrics.reset()
+    reference_cache.reset_stats()
+    games_list = []
     try:
         logger.info('Searching for new games...')
-        unfound_games = find_new_games(cursor, when=when)
-        
+        with metrics.stage('find') as stage:
+            # Games that failed on earlier runs go first, whatever window they fell in
+            queued_games = load_failed_games(cursor)
+            scheduled_games = find_new_games(cursor, when=when)
+            unfound_games = queued_games + sorted(scheduled_games - set(queued_games))
+            stage.count(games=len(unfound_games), queued=len(queued_games))
+        if queued_games:
+            logger.info(f'Retrying {len(queued_games)} queued games ahead of {len(unfound_games) - len(queued_games)} '
+                        f'scheduled ones')
+
         logger.info('Retrieving games from NBA.com...')
+        fetch_failures = {}
         try:
-            games_list = get_new_games(unfound_games)
+            games_list = get_new_games(unfound_games, time_left=time_left, failures=fetch_failures)
         except Exception as e:
             logger.error(f'Failed to retrieve games from NBA.com: {str(e)}')
-            return unfound_games
+            record_failed_games(cursor, {game_id: f'scraper error: {str(e)}' for game_id in unfound_games},
+                                'fetch')
+            conn.commit()
+            return set(unfound_games)
+        # Saved before loading, so a crash in the load can't lose them
+        record_failed_games(cursor, fetch_failures, 'fetch')
+        conn.commit()
 
         try:
             # Update Players
             logger.info('Updating Players table...')
-            all_players, _, _ = collect_all_players(games_list, conn)
+            with metrics.stage('normalize', table='Players') as stage:
+                all_players, _, _ = collect_all_players(games_list, conn)
+                stage.count(rows=len(all_players))
             insert_players(cursor, all_players)
-            conn.commit()
+            with metrics.stage('commit', table='Players'):
+                conn.commit()
 
             # Update Teams
             logger.info('Updating Teams table...')
-            teams = collect_teams(games_list)
+            with metrics.stage('normalize', table='Teams') as stage:
+                known_teams = reference_cache.get(conn, 'Teams', lambda: load_team_ids(conn))
+                teams = [team_id for team_id in collect_teams(games_list) if team_id not in known_teams]
+                stage.count(rows=len(teams))
             insert_teams(cursor, teams)
-            conn.commit()
+            with metrics.stage('commit', table='Teams'):
+                conn.commit()
+            if teams:
+                reference_cache.invalidate('Teams')
 
             # Update Games
             logger.info('Updating Games table...')
-            games = collect_games(games_list)
+            with metrics.stage('normalize', table='Games') as stage:
+                games = collect_games(games_list)
+                stage.count(rows=len(games))
             insert_games(cursor, games)
-            conn.commit()
+            insert_game_teams(cursor, games)
+            with metrics.stage('commit', table='Games'):
+                conn.commit()
 
             # Update Team Statistics
             logger.info('Updating TeamStatistics table...')
-            team_stats = collect_team_stats(games_list)
+            with metrics.stage('normalize', table='TeamStatistics') as stage:
+                team_stats = collect_team_stats(games_list)
+                stage.count(rows=len(team_stats))
             insert_team_stats(cursor, team_stats)
-            conn.commit()
+            with metrics.stage('commit', table='TeamStatistics'):
+                conn.commit()
 
             # Update Player Statistics
             logger.info('Updating PlayerStatistics table...')
-            player_stats = collect_player_stats(games_list)
+            with metrics.stage('normalize', table='PlayerStatistics') as stage:
+                player_stats = collect_player_stats(games_list)
+                stage.count(rows=len(player_stats))
             insert_player_stats(cursor, player_stats)
-            conn.commit()
+            clear_game_markers(cursor, [game['gameId'] for game in games_list])
+            with metrics.stage('commit', table='PlayerStatistics'):
+                conn.commit()
+
+            # Maintenance only; a failure here must not undo the committed load
+            try:
+                compact_columnstore(cursor)
+                conn.commit()
+            except Exception as e:
+                logger.warning(f'Columnstore maintenance skipped: {str(e)}')
+                conn.rollback()
 
             logger.info('Database updates completed successfully')
+            logger.info(f'Stage totals: {metrics.summary()}')
+            logger.info(f'Reference cache: {reference_cache.summary()}')
             return None
 
         except Exception as e:
             logger.error(f'Database update failed: {str(e)}')
             conn.rollback()
+            try:
+                record_failed_games(cursor, {game['gameId']: f'load error: {str(e)}' for game in games_list},
+                                    'load')
+                conn.commit()
+            except Exception as queue_error:
+                logger.error(f'Could not queue failed games for retry: {str(queue_error)}')
+                conn.rollback()
             return games_list
 
     except Exception as e:
         logger.error(f'An unexpected error occurred: {str(e)}')
         return games_list    
+    finally:
+        # A warm Lambda container keeps the handler's buffer between invocations
+        metrics.flush()
+
+
+# Live mode: per in-progress game, the hash of its last payload and the rows
+# last written for it by key. Module-level so a warm container keeps it between
+# invocations; also saved to LIVE_STATE_FILE for cold starts.
+live_state = {'games': {}, 'people': set(), 'teams': set()}
+
+LIVE_ROW_SOURCES = [
+    # (state key, collect function, key columns, insert functions)
+    ('games', collect_games, 1, [insert_games, insert_game_teams]),
+    ('team_stats', collect_team_stats, 2, [insert_team_stats]),
+    ('player_stats', collect_player_stats, 2, [insert_player_stats]),
+]
+
+
+def load_live_state():
+    global live_state
+    path = os.getenv('LIVE_STATE_FILE', '/tmp/nba_live_state.pickle')
+    if live_state['games'] or not os.path.exists(path):
+        return
+    try:
+        with open(path, 'rb') as f:
+            live_state = pickle.load(f)
+        logger.info(f"Loaded live state for {len(live_state['games'])} games from {path}")
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable live state {path}: {str(e)}")
+
+
+def save_live_state():
+    path = os.getenv('LIVE_STATE_FILE', '/tmp/nba_live_state.pickle')
+    try:
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(live_state, f)
+        os.replace(path + '.tmp', path)
+    except OSError as e:
+        logger.warning(f"Could not save live state to {path}: {str(e)}")
+
+
+def mark_live_games(cursor, game_ids):
+    """Upsert LiveGames so the schedule index keeps these games due for their final load"""
+    cursor.execute("CREATE TABLE #TempLiveGames (gameId INT PRIMARY KEY)")
+    try:
+        cursor.executemany("INSERT INTO #TempLiveGames (gameId) VALUES (?)", [(int(game_id),) for game_id in game_ids])
+        cursor.execute("""
+        MERGE INTO [dbo].[LiveGames] AS target
+        USING #TempLiveGames AS source
+        ON target.gameId = source.gameId
+        WHEN MATCHED THEN
+            UPDATE SET lastPolledAt = SYSUTCDATETIME()
+        WHEN NOT MATCHED THEN
+            INSERT (gameId, lastPolledAt) VALUES (source.gameId, SYSUTCDATETIME());
+        """)
+    finally:
+        cursor.execute("DROP TABLE #TempLiveGames")
+
+
+def live_poll(conn, cursor, game_ids, time_left=None):
+    """
+    Fetch game_ids once and upsert only what changed since the last poll:
+    games whose payload hash is unchanged are skipped, and of the rest only
+    Games, TeamStatistics and PlayerStatistics rows that differ from the rows
+    last written are passed to the usual insert functions. New players and
+    teams are upserted first. State is updated only after the commit.
+    Returns the number of rows written.
+    """
+    games_list = get_new_games(game_ids, time_left=time_left)
+
+    changed = {name: [] for name, _, _, _ in LIVE_ROW_SOURCES}
+    pending = {}
+    with metrics.stage('diff') as stage:
+        for game in games_list:
+            game_id = int(game['gameId'])
+            previous = live_state['games'].get(game_id, {})
+            digest = hashlib.sha1(json.dumps(game, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+            if previous.get('hash') == digest:
+                continue
+            current = {'hash': digest, 'game': game}
+            for name, collect, key_columns, _ in LIVE_ROW_SOURCES:
+                rows = {tuple(row[:key_columns]): tuple(row) for row in collect([game])}
+                changed[name] += [row for key, row in rows.items() if previous.get(name, {}).get(key) != row]
+                current[name] = rows
+            pending[game_id] = current
+        stage.count(games=len(games_list), changed_games=len(pending),
+                    rows=sum(len(rows) for rows in changed.values()))
+
+    if not pending:
+        logger.info(f"Live poll: no changes in {len(games_list)} games")
+        return 0
+
+    changed_games = [current['game'] for current in pending.values()]
+    new_people = {row[0] for row in changed['player_stats']} - live_state['people']
+    new_teams = set(collect_teams(changed_games)) - live_state['teams']
+    try:
+        if new_people:
+            all_players, _, _ = collect_all_players(changed_games, conn)
+            insert_players(cursor, [player for player in all_players if player[0] in new_people])
+        if new_teams:
+            insert_teams(cursor, list(new_teams))
+        for name, _, _, inserts in LIVE_ROW_SOURCES:
+            if changed[name]:
+                for insert in inserts:
+                    insert(cursor, changed[name])
+        mark_live_games(cursor, pending)
+        with metrics.stage('commit', table='live'):
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    for game_id, current in pending.items():
+        del current['game']
+        live_state['games'][game_id] = current
+    live_state['people'] |= new_people
+    live_state['teams'] |= new_teams
+    written = sum(len(rows) for rows in changed.values())
+    logger.info(f"Live poll: {len(pending)} of {len(games_list)} games changed, "
+                f"{', '.join(f'{len(rows)} {name} rows' for name, rows in changed.items())} written")
+    return written
+
+
+def live_update(conn, cursor, time_left=None):
+    """
+    Poll in-progress games every LIVE_POLL_SECONDS (default 60), writing only
+    changed rows, until none are in progress, LIVE_MAX_POLLS polls have run
+    (0 for no limit) or time_left can't fit another poll. Games drop out of the
+    live set once past their expected end; the regular run then loads their
+    final box score and clears their LiveGames marker.
+    """
+    interval = float(os.getenv('LIVE_POLL_SECONDS', 60))
+    max_polls = int(os.getenv('LIVE_MAX_POLLS', 0))
+    check_schema(cursor)
+    metrics.reset()
+    reference_cache.reset_stats()
+    load_live_state()
+    polls = 0
+    try:
+        while True:
+            with metrics.stage('find') as stage:
+                live_games = [game_id for game_id, _, status in schedule_index(cursor, 'recent')
+                              if status == 'in_progress']
+                stage.count(games=len(live_games))
+            # Forget games that have finished; the state only needs to cover the live ones
+            for game_id in set(live_state['games']) - set(live_games):
+                del live_state['games'][game_id]
+            if not live_games:
+                logger.info('No games in progress')
+                break
+
+            with metrics.stage('live_poll') as stage:
+                stage.count(rows=live_poll(conn, cursor, live_games, time_left=time_left))
+            save_live_state()
+            polls += 1
+            if max_polls and polls >= max_polls:
+                break
+            if time_left is not None and time_left() / 1000 < 2 * interval + 30:
+                logger.info('Stopping live updates before the invocation times out')
+                break
+            time.sleep(interval)
+        logger.info(f'Live updates finished after {polls} polls. Stage totals: {metrics.summary()}')
+        logger.info(f'Reference cache: {reference_cache.summary()}')
+    finally:
+        save_live_state()
+        metrics.flush()
+
+
+def live_handler(context):
+    """Lambda entry for event {"mode": "live"}: live updates only, without the EC2 export hand-off"""
+    try:
+        conn = get_db_connection()
+    except Exception as e:
+        logger.error(f"Database connection failed: {str(e)}")
+        return {'statusCode': 500, 'body': json.dumps({'message': 'Database connection failed', 'error': str(e),
+                                                       'timestamp': datetime.now().isoformat()})}
+    try:
+        live_update(conn, conn.cursor(), time_left=getattr(context, 'get_remaining_time_in_millis', None))
+        status_code, response_message = 200, 'Live update completed'
+    except Exception as e:
+        logger.error(f"Live update failed: {str(e)}")
+        status_code, response_message = 500, 'Live update failed'
+    finally:
+        conn.close()
+    return {'statusCode': status_code,
+            'body': json.dumps({'message': response_message, 'timestamp': datetime.now().isoformat()})}
 
 
 def lambda_handler(event, context):
     """
     Lambda handler for updating NBA database with new game data and statistics.
     """
+    if (event or {}).get('mode') == 'live':
+        return live_handler(context)
+
     # Get configuration from environment variables
     INSTANCE_ID = os.getenv('EC2_INSTANCE_ID')
     if not INSTANCE_ID:
@@ -1097,7 +1714,8 @@ def lambda_handler(event, context):
 
         # Execute update process
         try:
-            result = update_NBA_db(conn=conn, cursor = cursor, when='last_three_days')
+            result = update_NBA_db(conn=conn, cursor = cursor, when='last_three_days',
+                                   time_left=getattr(context, 'get_remaining_time_in_millis', None))
             
             if result is None:
                 logger.info("Database update completed successfully")
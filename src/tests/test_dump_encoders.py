@@ -0,0 +1,99 @@
+"""
+Offline checks of create_sql_dump's value encoders and MERGE rendering: no database needed.
+Run from src/:
+    python -m unittest discover -s tests -t .
+"""
+import struct
+import unittest
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from uuid import UUID
+from create_sql_dump import (build_bulk_row_formatter, build_row_formatter, BULK_FIELD_TERMINATOR,
+                             BULK_ROW_TERMINATOR, bulk_text, encode_datetime, encode_datetime2,
+                             render_merge)
+from utils.db_utils import decode_datetimeoffset
+
+
+def unquote(literal):
+    """The text inside a '...' or N'...' literal, with doubled quotes undone"""
+    prefix = 2 if literal.startswith("N'") else 1
+    return literal[prefix:-1].replace("''", "'")
+
+
+class DatetimeLiteralTest(unittest.TestCase):
+    def test_datetime_is_iso_8601_with_milliseconds(self):
+        value = datetime(2024, 3, 4, 5, 6, 7, 890000)
+        self.assertEqual(encode_datetime(value), "'2024-03-04T05:06:07.890'")
+        self.assertEqual(datetime.fromisoformat(unquote(encode_datetime(value))), value)
+
+    def test_day_before_month_is_unambiguous(self):
+        # 2024-12-01 would read as January 12th as 'YYYY-DD-MM hh:mm:ss' under DMY
+        self.assertEqual(encode_datetime(datetime(2024, 12, 1)), "'2024-12-01T00:00:00.000'")
+
+    def test_datetime2_keeps_microseconds(self):
+        value = datetime(2024, 3, 4, 5, 6, 7, 123456)
+        self.assertEqual(encode_datetime2(value), "'2024-03-04T05:06:07.123456'")
+        self.assertEqual(datetime.fromisoformat(unquote(encode_datetime2(value))), value)
+
+    def test_datetimeoffset_round_trip(self):
+        raw = struct.pack('<6hI2h', 2024, 3, 4, 5, 6, 7, 123456000, -5, -30)
+        value = decode_datetimeoffset(raw)
+        self.assertEqual(value, datetime(2024, 3, 4, 5, 6, 7, 123456,
+                                         timezone(-timedelta(hours=5, minutes=30))))
+        self.assertEqual(encode_datetime2(value), "'2024-03-04T05:06:07.123456-05:30'")
+        self.assertEqual(datetime.fromisoformat(unquote(encode_datetime2(value))), value)
+
+
+class RowFormatterTest(unittest.TestCase):
+    TYPES = ['int', 'bit', 'decimal', 'float', 'date', 'datetime', 'smalldatetime', 'time',
+             'nvarchar', 'varchar', 'uniqueidentifier', 'varbinary']
+    ROW = (7, True, Decimal('1E+1'), 0.1, date(2024, 3, 4), datetime(2024, 3, 4, 19, 30),
+           datetime(2024, 3, 4, 19, 30), time(19, 30), "O'Neal", 'plain',
+           UUID('12345678-1234-5678-1234-567812345678'), b'\x00\xff')
+
+    def test_insert_values(self):
+        self.assertEqual(
+            build_row_formatter(self.TYPES)(self.ROW),
+            "(7, 1, 10, 0.1, '2024-03-04', '2024-03-04T19:30:00.000', '2024-03-04T19:30:00.000', "
+            "'19:30:00', N'O''Neal', 'plain', '12345678-1234-5678-1234-567812345678', 0x00ff)")
+
+    def test_nulls(self):
+        self.assertEqual(build_row_formatter(['int', 'nvarchar'])((None, None)), '(NULL, NULL)')
+
+    def test_unicode_survives_escaping(self):
+        literal = build_row_formatter(['nvarchar'])(("Dončić's",))[1:-1]
+        self.assertEqual(unquote(literal), "Dončić's")
+
+    def test_bulk_line(self):
+        line = build_bulk_row_formatter(['int', 'datetime', 'nvarchar', 'int'])(
+            (1, datetime(2024, 12, 1, 8), "O'Neal", None))
+        self.assertEqual(line, BULK_FIELD_TERMINATOR.join(['1', '2024-12-01T08:00:00.000', "O'Neal", ''])
+                         + BULK_ROW_TERMINATOR)
+
+    def test_bulk_rejects_terminators(self):
+        with self.assertRaises(ValueError):
+            bulk_text('two\nlines')
+
+
+class MergeTest(unittest.TestCase):
+    COLUMNS = ['coachId', 'teamId', 'startDate', 'endDate']
+    TYPE_SQL = ['[int]', '[int]', '[date]', '[date]']
+
+    def test_all_null_date_column_keeps_its_type(self):
+        # endDate is NULL in every row: untyped, VALUES would make it int
+        format_row = build_row_formatter(['int', 'int', 'date', 'date'])
+        rows = [format_row((1, 10, date(2024, 7, 1), None)), format_row((2, 11, date(2024, 7, 2), None))]
+        merge = render_merge('dbo', 'CoachHistory', self.COLUMNS, self.TYPE_SQL, ['coachId', 'teamId'],
+                             rows, ['startDate', 'endDate'])
+        self.assertIn("(VALUES\n(CAST(NULL AS [int]), CAST(NULL AS [int]), CAST(NULL AS [date]), "
+                      "CAST(NULL AS [date])),\n(1, 10, '2024-07-01', NULL),\n(2, 11, '2024-07-02', NULL)\n)",
+                      merge)
+        # The typing row is dropped before it can match or insert
+        self.assertIn("AS typed ([coachId], [teamId], [startDate], [endDate]) WHERE [coachId] IS NOT NULL) AS source",
+                      merge)
+        self.assertIn("WHEN MATCHED THEN UPDATE SET [startDate] = source.[startDate], [endDate] = source.[endDate]",
+                      merge)
+
+
+if __name__ == '__main__':
+    unittest.main()
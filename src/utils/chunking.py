@@ -0,0 +1,98 @@
+import gc
+import os
+import resource
+
+try:
+    PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    PAGE_SIZE = 4096
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB (peak RSS where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE / 1024 / 1024
+    except (OSError, IndexError, ValueError):
+        # ru_maxrss is kB on Linux, bytes on macOS; either way an upper bound
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 if peak < 1 << 32 else peak / 1024 / 1024
+
+
+def memory_budget_mb():
+    """Memory budget for the exporters, sized by default for a 1 GB t3.micro"""
+    return float(os.getenv('EXPORT_MEMORY_BUDGET_MB', 600))
+
+
+class AdaptiveChunkSizer:
+    """
+    Picks the next chunk size from the RSS and rows/sec seen on the last chunk.
+
+    Over the memory budget the size halves; gc runs only if RSS is still over
+    budget on the next chunk, once the smaller chunk had a chance to free memory.
+    Comfortably under budget it hill-climbs on throughput: grow while rows/sec
+    keeps improving, and step back once growing stops paying off. A shrink or
+    step back stops growth until EXPORT_CHUNK_REGROW_AFTER chunks in a row stay
+    comfortably under budget. Every decision is passed to log.
+    """
+
+    def __init__(self, initial, label, log, min_size=None, max_size=None, budget_mb=None):
+        self.min_size = min_size or int(os.getenv('EXPORT_MIN_CHUNK_SIZE', 1000))
+        self.max_size = max_size or int(os.getenv('EXPORT_MAX_CHUNK_SIZE', 200000))
+        self.size = max(self.min_size, min(int(initial), self.max_size))
+        self.budget_mb = budget_mb or memory_budget_mb()
+        self.label = label
+        self.log = log
+        self.regrow_after = int(os.getenv('EXPORT_CHUNK_REGROW_AFTER', 5))
+        self.best_rate = None
+        self.growing = True
+        self.shrunk = False
+        self.calm_chunks = 0
+
+    def observe(self, rows, seconds):
+        """Record a finished chunk of rows that took seconds end to end; returns the next size"""
+        rss = current_rss_mb()
+        rate = rows / seconds if seconds > 0 else 0.0
+        previous = self.size
+
+        calm = rss <= self.budget_mb * 0.8
+        self.calm_chunks = self.calm_chunks + 1 if calm else 0
+        was_shrunk, self.shrunk = self.shrunk, False
+
+        if rss > self.budget_mb:
+            self.size = max(self.min_size, self.size // 2)
+            self.growing = False
+            self.shrunk = True
+            decision = 'over budget, shrinking'
+            if was_shrunk:
+                # Still over a chunk after shrinking, so it won't free itself
+                gc.collect()
+                decision += ' and collecting'
+        elif not calm:
+            decision = 'near budget, holding'
+        elif not self.growing and self.calm_chunks >= self.regrow_after:
+            # Throughput seen before the shrink or step back is stale by now
+            self.growing = True
+            self.best_rate = None
+            decision = f'{self.calm_chunks} chunks under budget, growing allowed again'
+        elif rows < previous:
+            # A short chunk (end of data, small window) says nothing about throughput
+            decision = 'short chunk, holding'
+        elif self.best_rate is None or rate > self.best_rate * 1.05:
+            self.best_rate = rate
+            if self.growing:
+                self.size = min(self.max_size, int(self.size * 1.5))
+                decision = 'throughput improving, growing'
+            else:
+                decision = 'throughput improving, holding'
+        elif rate < self.best_rate * 0.9 and self.growing:
+            self.size = max(self.min_size, int(self.size / 1.5))
+            self.growing = False
+            self.calm_chunks = 0
+            decision = 'throughput fell after growing, stepping back'
+        else:
+            decision = 'throughput flat, holding'
+
+        self.log(f"{self.label} chunk: {rows} rows in {seconds:.2f}s ({rate:.0f} rows/sec), "
+                 f"RSS {rss:.0f}/{self.budget_mb:.0f} MB; {decision}: {previous} -> {self.size}")
+        return self.size
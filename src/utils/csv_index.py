@@ -0,0 +1,143 @@
+import io
+import json
+import mmap
+import numpy as np
+import pandas as pd
+from utils.output_writer import find_output_manifest, metadata_path
+
+
+def index_path(csv_path):
+    return metadata_path(csv_path, '.index.json')
+
+
+def season_of(game_id):
+    """NBA season label from a gameId, whose 4th-5th digits (zero-padded to 10) are the start year"""
+    year = int(str(int(game_id)).zfill(10)[3:5])
+    year += 1900 if year >= 46 else 2000
+    return f"{year}-{(year + 1) % 100:02d}"
+
+
+def day_blocks(chunk_df, data):
+    """
+    Split one encoded window of CSV rows into per-game-day blocks.
+    Returns [lower_day, upper_day, offset, bytes, rows, min_gameId, max_gameId]
+    lists with offsets relative to data and upper_day exclusive. If the rows
+    don't map one-to-one onto lines (a quoted newline), the window is one block.
+    """
+    days = pd.to_datetime(chunk_df['gameDate']).dt.normalize()
+    game_ids = chunk_df['gameId'].to_numpy()
+    line_ends = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 10) + 1
+    if len(line_ends) != len(chunk_df):
+        return [[days.min().strftime('%Y-%m-%d'),
+                 (days.max() + pd.Timedelta(days=1)).strftime('%Y-%m-%d'),
+                 0, len(data), len(chunk_df), int(game_ids.min()), int(game_ids.max())]]
+
+    day_values = days.to_numpy()
+    starts = np.flatnonzero(np.r_[True, day_values[1:] != day_values[:-1]])
+    ends = np.r_[starts[1:], len(chunk_df)]
+    blocks = []
+    for start, end in zip(starts, ends):
+        day = pd.Timestamp(day_values[start])
+        offset = int(line_ends[start - 1]) if start > 0 else 0
+        blocks.append([day.strftime('%Y-%m-%d'), (day + pd.Timedelta(days=1)).strftime('%Y-%m-%d'),
+                       offset, int(line_ends[end - 1]) - offset, int(end - start),
+                       int(game_ids[start:end].min()), int(game_ids[start:end].max())])
+    return blocks
+
+
+def write_csv_index(csv_path, manifest):
+    """
+    Write the sidecar index for a partitioned CSV from its partition manifest:
+    absolute byte ranges per game day block, newest first, and the blocks
+    holding each season.
+    """
+    blocks = []
+    for partition in manifest['partitions']:
+        for lower, upper, offset, length, rows, min_id, max_id in partition.get('blocks', []):
+            blocks.append([lower, upper, partition['offset'] + offset, length, rows, min_id, max_id])
+    seasons = {}
+    for number, block in enumerate(blocks):
+        for season in {season_of(block[5]), season_of(block[6])}:
+            seasons.setdefault(season, []).append(number)
+    path = index_path(csv_path)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'file': manifest['file'],
+            'header_bytes': manifest['header']['bytes'] if manifest['header'] else 0,
+            'columns': ['lower', 'upper', 'offset', 'bytes', 'rows', 'min_gameId', 'max_gameId'],
+            'blocks': blocks,
+            'seasons': seasons,
+        }, f)
+    return path
+
+
+class IndexedCsv:
+    """
+    Random access into an exported CSV through its sidecar index.
+
+    The CSV is memory-mapped and only the byte ranges of the matching blocks
+    are parsed, so one season or one game costs a fraction of a full load.
+    Needs the uncompressed single-file export (OUTPUT_COMPRESSION=none,
+    OUTPUT_VOLUME_MB=0).
+    """
+
+    def __init__(self, csv_path, **read_csv_args):
+        output_manifest = find_output_manifest(csv_path)
+        if output_manifest is not None:
+            with open(output_manifest, encoding='utf-8') as f:
+                output = json.load(f)
+            if output['compression'] != 'none' or len(output['volumes']) != 1:
+                raise ValueError(f"{csv_path} was exported compressed or in volumes; "
+                                 "indexed reads need OUTPUT_COMPRESSION=none and OUTPUT_VOLUME_MB=0")
+        with open(index_path(csv_path), encoding='utf-8') as f:
+            self.index = json.load(f)
+        self.read_csv_args = read_csv_args
+        self.file = open(csv_path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.header = self.data[:self.index['header_bytes']]
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def seasons(self):
+        return sorted(self.index['seasons'], reverse=True)
+
+    def _read(self, block_numbers):
+        """Parse the given blocks, merging byte-adjacent ones into single slices"""
+        ranges = []
+        for number in sorted(block_numbers):
+            offset, length = self.index['blocks'][number][2:4]
+            if ranges and ranges[-1][1] == offset:
+                ranges[-1][1] = offset + length
+            else:
+                ranges.append([offset, offset + length])
+        body = b''.join(self.data[start:end] for start, end in ranges)
+        return pd.read_csv(io.BytesIO(self.header + body), **self.read_csv_args)
+
+    def season(self, season):
+        """Rows of one season, e.g. '2023-24'"""
+        df = self._read(self.index['seasons'].get(season, []))
+        return df[df['gameId'].map(season_of) == season].reset_index(drop=True)
+
+    def dates(self, start, end):
+        """Rows with start <= gameDate < end, dates as 'YYYY-MM-DD'"""
+        numbers = [number for number, block in enumerate(self.index['blocks'])
+                   if block[0] < end and block[1] > start]
+        df = self._read(numbers)
+        game_dates = pd.to_datetime(df['gameDate'])
+        return df[(game_dates >= start) & (game_dates < end)].reset_index(drop=True)
+
+    def game(self, game_id):
+        """Rows of one game"""
+        numbers = [number for number, block in enumerate(self.index['blocks'])
+                   if block[5] <= game_id <= block[6]]
+        df = self._read(numbers)
+        return df[df['gameId'] == game_id].reset_index(drop=True)
@@ -1,9 +1,21 @@
 import os
+import struct
 import pyodbc
 import logging
+from datetime import datetime, timedelta, timezone
 
 logger = logging.getLogger(__name__)
 
+# ODBC type code pyodbc has no built-in conversion for; it returns the raw struct
+SQL_SS_TIMESTAMPOFFSET = -155
+
+
+def decode_datetimeoffset(raw):
+    """A datetimeoffset value's raw SQL_SS_TIMESTAMPOFFSET_STRUCT as an aware datetime"""
+    year, month, day, hour, minute, second, nanoseconds, offset_hours, offset_minutes = struct.unpack('<6hI2h', raw)
+    return datetime(year, month, day, hour, minute, second, nanoseconds // 1000,
+                    timezone(timedelta(hours=offset_hours, minutes=offset_minutes)))
+
 def get_db_connection(max_retries=3, retry_delay=5):
     """Creates a connection to the NBA database using environment variables."""
     try:
@@ -32,6 +44,7 @@ def get_db_connection(max_retries=3, retry_delay=5):
         for attempt in range(max_retries):
             try:
                 conn = pyodbc.connect(connection_string)
+                conn.add_output_converter(SQL_SS_TIMESTAMPOFFSET, decode_datetimeoffset)
                 logger.info(f"Database connection established successfully on attempt {attempt + 1}")
                 return conn
             except pyodbc.Error as e:
@@ -42,4 +55,25 @@ def get_db_connection(max_retries=3, retry_delay=5):
                 
     except Exception as e:
         logger.error(f"Failed to connect to database: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+
+def schedule_tables(cursor):
+    """Every season's LeagueSchedule table (LeagueSchedule24_25, LeagueSchedule25_26, ...) in name order"""
+    cursor.execute("""
+    SELECT name
+    FROM sys.tables
+    WHERE schema_id = SCHEMA_ID('dbo') AND name LIKE 'LeagueSchedule%'
+    ORDER BY name
+    """)
+    return [row[0] for row in cursor.fetchall()]
+
+
+def missing_objects(cursor, names):
+    """The dbo tables or views in names that don't exist, e.g. before sql/upgrade_database.sql has run"""
+    missing = []
+    for name in names:
+        cursor.execute("SELECT OBJECT_ID(?)", f"dbo.{name}")
+        if cursor.fetchone()[0] is None:
+            missing.append(name)
+    return missing
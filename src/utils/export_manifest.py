@@ -0,0 +1,91 @@
+import hashlib
+import json
+import os
+from utils.csv_index import write_csv_index
+from utils.output_writer import metadata_path
+
+
+def partitions_path(csv_path):
+    return metadata_path(csv_path, '.partitions.json')
+
+
+def load_partitions(csv_path):
+    with open(partitions_path(csv_path), encoding='utf-8') as f:
+        return json.load(f)
+
+
+class PartitionManifest:
+    """
+    Tracks one exported CSV as a header followed by partitions of rows.
+
+    For each partition it records the byte range in the uncompressed stream, the
+    rows written and a SHA-256 of those bytes, computed as the rows stream out,
+    next to the server-side row count and CHECKSUM_AGG taken at export time.
+    verify_export.py checks these against the server and re-exports only the
+    partitions that differ. View partitions also carry per-game-day byte blocks,
+    from which save() writes the csv_index sidecar for random access.
+    """
+
+    def __init__(self, out, source, kind):
+        self.out = out
+        self.source = source
+        self.kind = kind
+        self.header = None
+        self.partitions = []
+        self.current = None
+
+    def write_header(self, text):
+        data = text.encode('utf-8')
+        self.out.write(data)
+        self.header = {'bytes': len(data), 'sha256': hashlib.sha256(data).hexdigest()}
+
+    def start_partition(self, bounds, server):
+        """Begin a partition; bounds identify it for re-export, server holds {key: [count, checksum]}"""
+        self.current = dict(bounds, rows=0, offset=self.out.bytes_in, bytes=0, server=server)
+        self.hash = hashlib.sha256()
+
+    def write_rows(self, text, rows, blocks=None):
+        """Append rows; blocks are csv_index.day_blocks entries with offsets relative to text"""
+        data = text.encode('utf-8') if isinstance(text, str) else text
+        if blocks:
+            self.current.setdefault('blocks', []).extend(
+                block[:2] + [block[2] + self.current['bytes']] + block[3:] for block in blocks)
+        self.hash.update(data)
+        self.out.write(data)
+        self.current['rows'] += rows
+        self.current['bytes'] += len(data)
+
+    def end_partition(self):
+        self.current['sha256'] = self.hash.hexdigest()
+        self.partitions.append(self.current)
+        self.current = None
+
+    def copy_partition(self, partition, data):
+        """Carry a verified partition over from a previous export unchanged"""
+        self.start_partition({key: value for key, value in partition.items()
+                              if key not in ('rows', 'offset', 'bytes', 'server', 'sha256')},
+                             partition['server'])
+        self.write_rows(data, partition['rows'])
+        self.end_partition()
+
+    @property
+    def rows(self):
+        return sum(partition['rows'] for partition in self.partitions)
+
+    def save(self):
+        """Write the manifest to the metadata directory, plus the sidecar byte index for views, and return its path"""
+        path = partitions_path(self.out.path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        manifest = {
+            'file': os.path.basename(self.out.path),
+            'source': self.source,
+            'kind': self.kind,
+            'rows': self.rows,
+            'header': self.header,
+            'partitions': self.partitions,
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        if self.kind == 'view':
+            write_csv_index(self.out.path, manifest)
+        return path
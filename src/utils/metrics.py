@@ -0,0 +1,209 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+LOG_FORMAT = '%(asctime)s - %(message)s'
+LOG_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Every live BufferedLogHandler, for flush_logs()
+_handlers = weakref.WeakSet()
+
+
+class BufferedLogHandler(logging.Handler):
+    """
+    Collects formatted records in memory and writes them in batches to stdout
+    and/or an append-mode file that stays open, instead of one open/write/close
+    per line. A batch goes out every LOG_BUFFER_LINES records (default 20),
+    when LOG_FLUSH_SECONDS (default 1) have passed since the last one, on any
+    WARNING or ERROR record, at the end of every metrics stage (so after each
+    table or window) and at interpreter exit. A process killed outright loses
+    at most what was logged since then.
+    """
+
+    def __init__(self, path=None, echo=True):
+        super().__init__()
+        self.path = path
+        self.echo = echo
+        self.capacity = int(os.getenv('LOG_BUFFER_LINES', 20))
+        self.interval = float(os.getenv('LOG_FLUSH_SECONDS', 1))
+        self.buffer = []
+        self.file = None
+        self.last_flush = time.monotonic()
+        _handlers.add(self)
+
+    def emit(self, record):
+        try:
+            self.buffer.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+            return
+        if (len(self.buffer) >= self.capacity or record.levelno >= logging.WARNING
+                or time.monotonic() - self.last_flush >= self.interval):
+            self.flush()
+
+    def flush(self):
+        self.acquire()
+        try:
+            if self.buffer:
+                text = '\n'.join(self.buffer) + '\n'
+                self.buffer = []
+                if self.echo:
+                    sys.stdout.write(text)
+                    sys.stdout.flush()
+                if self.path:
+                    if self.file is None:
+                        self.file = open(self.path, 'a', encoding='utf-8')
+                    self.file.write(text)
+                    self.file.flush()
+            self.last_flush = time.monotonic()
+        finally:
+            self.release()
+
+    def close(self):
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        super().close()
+
+
+def flush_logs():
+    """Write out every BufferedLogHandler's pending lines"""
+    for handler in list(_handlers):
+        handler.flush()
+
+
+def get_logger(log_path, name=None):
+    """
+    Logger writing '<timestamp> - <message>' lines to stdout and log_path
+    through one BufferedLogHandler; repeated calls return the same logger.
+    """
+    logger = logging.getLogger(name or f"nba.{os.path.basename(log_path)}")
+    if not logger.handlers:
+        handler = BufferedLogHandler(log_path)
+        handler.setFormatter(logging.Formatter(LOG_FORMAT, LOG_DATE_FORMAT))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+class Stage:
+    """One timed stage; counters added with count() are emitted with its duration"""
+
+    def __init__(self, name, dimensions):
+        self.name = name
+        self.dimensions = dimensions
+        self.counters = {}
+        self.seconds = 0.0
+
+    def count(self, **counters):
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+
+
+class Metrics:
+    """
+    Per-stage timing and throughput records for one script.
+
+    Each record has the stage name, its dimensions (e.g. table), duration_ms and
+    counters such as rows and bytes. METRICS_FORMAT picks json (one JSON object
+    per line, the default), emf (CloudWatch Embedded Metric Format, which
+    CloudWatch Logs turns into metrics when written to a Lambda's stdout) or off.
+    Records go to METRICS_FILE, else to path, else to stdout, batched through
+    a BufferedLogHandler. Every record flushes all buffered logs, so each
+    stage's lines are on disk once it ends.
+    """
+
+    def __init__(self, namespace, path=None):
+        self.namespace = namespace
+        self.format = os.getenv('METRICS_FORMAT', 'json')
+        self.totals = {}
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(f"metrics.{namespace}")
+        if not self.logger.handlers:
+            path = os.getenv('METRICS_FILE', path)
+            handler = BufferedLogHandler(path, echo=path is None)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self.logger.addHandler(handler)
+            self.logger.setLevel(logging.INFO)
+            self.logger.propagate = False
+
+    @contextmanager
+    def stage(self, name, **dimensions):
+        """Time the enclosed block as one record of stage name; a raised exception counts as errors=1"""
+        stage = Stage(name, dimensions)
+        start_time = time.perf_counter()
+        try:
+            yield stage
+        except BaseException:
+            stage.count(errors=1)
+            raise
+        finally:
+            stage.seconds = time.perf_counter() - start_time
+            self.record(name, stage.seconds, dimensions, stage.counters)
+
+    def record(self, name, seconds, dimensions=None, counters=None):
+        """Emit one record for a stage timed elsewhere"""
+        dimensions = {key: str(value) for key, value in (dimensions or {}).items()}
+        counters = counters or {}
+        with self.lock:
+            total = self.totals.setdefault(name, {'calls': 0, 'seconds': 0.0})
+            total['calls'] += 1
+            total['seconds'] += seconds
+            for key, value in counters.items():
+                total[key] = total.get(key, 0) + value
+
+        if self.format == 'off':
+            flush_logs()
+            return
+        values = dict(counters, duration_ms=round(seconds * 1000, 3))
+        if self.format == 'emf':
+            self.logger.info(json.dumps(dict(
+                {'_aws': {
+                    'Timestamp': int(time.time() * 1000),
+                    'CloudWatchMetrics': [{
+                        'Namespace': self.namespace,
+                        'Dimensions': [['stage'] + sorted(dimensions)],
+                        'Metrics': [{'Name': key, 'Unit': metric_unit(key)} for key in values],
+                    }],
+                }, 'stage': name},
+                **dimensions, **values)))
+        else:
+            self.logger.info(json.dumps(dict(
+                {'timestamp': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+                 'namespace': self.namespace, 'stage': name},
+                **dimensions, **values)))
+        flush_logs()
+
+    def summary(self):
+        """One line of total seconds, calls and counters per stage, in first-seen order"""
+        parts = []
+        for name, total in self.totals.items():
+            extra = ''.join(f", {key} {value}" for key, value in total.items()
+                            if key not in ('calls', 'seconds'))
+            parts.append(f"{name} {total['seconds']:.1f}s ({total['calls']} calls{extra})")
+        return '; '.join(parts)
+
+    def reset(self):
+        """Start new totals, e.g. per invocation of a warm Lambda"""
+        with self.lock:
+            self.totals = {}
+
+    def flush(self):
+        for handler in self.logger.handlers:
+            handler.flush()
+
+
+def metric_unit(key):
+    if key.endswith('_ms'):
+        return 'Milliseconds'
+    if 'bytes' in key:
+        return 'Bytes'
+    return 'Count'
@@ -0,0 +1,261 @@
+import gzip
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+COMPRESSION_EXTENSIONS = {'none': '', 'gzip': '.gz', 'zstd': '.zst'}
+# Sidecar files go here, beside the outputs, so the output directory itself
+# holds only what gets published
+METADATA_DIR = 'metadata'
+
+
+def metadata_path(path, suffix):
+    """Path of the suffix sidecar for output path, in the metadata directory next to it"""
+    return os.path.join(os.path.dirname(path), METADATA_DIR, os.path.basename(path) + suffix)
+
+
+def data_directory(sidecar_path):
+    """Directory of the outputs a sidecar in a metadata directory describes"""
+    return os.path.dirname(os.path.dirname(sidecar_path))
+
+
+class OutputWriter:
+    """
+    Text output file that compresses on the fly in a background thread, rolls
+    into size-capped volumes and writes a checksum manifest to the metadata
+    directory on close.
+
+    The caller's write() only encodes and enqueues; compression, hashing and disk
+    writes happen on the worker thread, so the exporter keeps fetching while the
+    previous chunk is being compressed. Each volume is a complete gzip/zstd
+    stream, so volumes can be decompressed separately or concatenated in order.
+    """
+
+    def __init__(self, path, compression='none', volume_bytes=0, level=None, queue_depth=8):
+        if compression == 'zstd' and zstandard is None:
+            compression = 'gzip'  # zstandard is optional; fall back rather than fail the export
+        if compression not in COMPRESSION_EXTENSIONS:
+            raise ValueError(f"Unknown compression: {compression}")
+        self.path = path
+        self.compression = compression
+        self.volume_bytes = volume_bytes
+        self.level = level
+        self.base_name = path + COMPRESSION_EXTENSIONS[compression]
+        self.volumes = []
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.busy_seconds = 0.0
+        self.error = None
+        self.start_time = time.time()
+        self.closed = False
+
+        self.queue = queue.Queue(maxsize=queue_depth)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self._open_volume()
+        self.thread.start()
+
+    def write(self, text):
+        """Queue text (or already-encoded bytes) for the output"""
+        if self.error:
+            raise self.error
+        data = text.encode('utf-8') if isinstance(text, str) else text
+        self.bytes_in += len(data)
+        self.queue.put(data)
+
+    def close(self):
+        """Flush everything, write the manifest and return its path"""
+        if self.closed:
+            return self.manifest_path
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+        if self.error:
+            raise self.error
+        self.manifest_path = metadata_path(self.base_name, '.manifest.json')
+        os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        with open(self.manifest_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'source': os.path.basename(self.path),
+                'compression': self.compression,
+                'uncompressed_bytes': self.bytes_in,
+                'compressed_bytes': self.bytes_out,
+                'volumes': self.volumes,
+            }, f, indent=2)
+        return self.manifest_path
+
+    def summary(self):
+        elapsed = max(time.time() - self.start_time, 1e-9)
+        ratio = self.bytes_in / self.bytes_out if self.bytes_out else 0.0
+        return (f"{os.path.basename(self.base_name)}: {self.bytes_in / 1024 / 1024:.1f} MB -> "
+                f"{self.bytes_out / 1024 / 1024:.1f} MB in {len(self.volumes)} volume(s), "
+                f"ratio {ratio:.2f}x, {self.bytes_in / 1024 / 1024 / elapsed:.2f} MB/s, "
+                f"compression busy {self.busy_seconds:.1f}s")
+
+    def _volume_name(self, number):
+        return self.base_name if not self.volume_bytes else f"{self.base_name}.{number:03d}"
+
+    def _open_volume(self):
+        name = self._volume_name(len(self.volumes) + 1)
+        self.file = open(name, 'wb')
+        self.hash = hashlib.sha256()
+        self.volume_out = 0
+        self.volume_in = 0
+        if self.compression == 'gzip':
+            level = self.level if self.level is not None else 6
+            # wbits 31 gives a gzip container; gzip.open would hide the compressed byte count
+            self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        elif self.compression == 'zstd':
+            level = self.level if self.level is not None else 3
+            self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+        else:
+            self.compressor = None
+        self.volumes.append({'file': os.path.basename(name)})
+
+    def _emit(self, data):
+        if data:
+            self.file.write(data)
+            self.hash.update(data)
+            self.volume_out += len(data)
+            self.bytes_out += len(data)
+
+    def _close_volume(self):
+        if self.compressor is not None:
+            self._emit(self.compressor.flush())
+        self.file.close()
+        self.volumes[-1].update({
+            'bytes': self.volume_out,
+            'uncompressed_bytes': self.volume_in,
+            'sha256': self.hash.hexdigest(),
+        })
+
+    def _run(self):
+        while True:
+            data = self.queue.get()
+            if data is None:
+                break
+            if self.error:
+                continue  # keep draining so write() never blocks after a failure
+            try:
+                busy_start = time.perf_counter()
+                self.volume_in += len(data)
+                self._emit(self.compressor.compress(data) if self.compressor is not None else data)
+                if self.volume_bytes and self.volume_out >= self.volume_bytes:
+                    self._close_volume()
+                    self._open_volume()
+                self.busy_seconds += time.perf_counter() - busy_start
+            except Exception as e:
+                self.error = e
+        try:
+            self._close_volume()
+        except Exception as e:
+            self.error = self.error or e
+
+
+def open_output(path):
+    """
+    Open an OutputWriter configured from OUTPUT_COMPRESSION (none/gzip/zstd),
+    OUTPUT_VOLUME_MB (0 for a single file) and OUTPUT_COMPRESSION_LEVEL.
+    """
+    level = os.getenv('OUTPUT_COMPRESSION_LEVEL')
+    return OutputWriter(
+        path,
+        compression=os.getenv('OUTPUT_COMPRESSION', 'none'),
+        volume_bytes=int(float(os.getenv('OUTPUT_VOLUME_MB', 0)) * 1024 * 1024),
+        level=int(level) if level else None)
+
+
+def read_volumes(manifest_path, verify=True):
+    """Yield the decompressed bytes of each volume listed in a manifest, checking checksums"""
+    with open(manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    directory = data_directory(manifest_path)
+    for volume in manifest['volumes']:
+        with open(os.path.join(directory, volume['file']), 'rb') as f:
+            data = f.read()
+        if verify and hashlib.sha256(data).hexdigest() != volume['sha256']:
+            raise ValueError(f"Checksum mismatch for {volume['file']}")
+        if manifest['compression'] == 'gzip':
+            data = gzip.decompress(data)
+        elif manifest['compression'] == 'zstd':
+            data = zstandard.ZstdDecompressor().decompressobj().decompress(data)
+        yield data
+
+
+def find_output_manifest(path):
+    """Manifest of the output written for path under any compression, or None"""
+    for extension in COMPRESSION_EXTENSIONS.values():
+        manifest_path = metadata_path(path + extension, '.manifest.json')
+        if os.path.exists(manifest_path):
+            return manifest_path
+    return None
+
+
+def stream_volumes(manifest_path, block_size=1 << 20):
+    """
+    Yield the decompressed contents of every volume in a manifest in blocks of
+    about block_size bytes, so large outputs are never held in memory whole.
+    Each volume's checksum is verified once it has been read through.
+    """
+    with open(manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    directory = data_directory(manifest_path)
+    for volume in manifest['volumes']:
+        if manifest['compression'] == 'gzip':
+            decompressor = zlib.decompressobj(31)
+        elif manifest['compression'] == 'zstd':
+            decompressor = zstandard.ZstdDecompressor().decompressobj()
+        else:
+            decompressor = None
+        digest = hashlib.sha256()
+        with open(os.path.join(directory, volume['file']), 'rb') as f:
+            while True:
+                data = f.read(block_size)
+                if not data:
+                    break
+                digest.update(data)
+                data = decompressor.decompress(data) if decompressor is not None else data
+                if data:
+                    yield data
+        if decompressor is not None and hasattr(decompressor, 'flush'):
+            tail = decompressor.flush()
+            if tail:
+                yield tail
+        if digest.hexdigest() != volume['sha256']:
+            raise ValueError(f"Checksum mismatch for {volume['file']}")
+
+
+class SequentialReader:
+    """Read byte ranges at increasing offsets from a stream of blocks"""
+
+    def __init__(self, blocks):
+        self.blocks = iter(blocks)
+        self.buffer = b''
+        self.position = 0  # stream offset of buffer[0]
+
+    def read_at(self, offset, length):
+        if offset < self.position:
+            raise ValueError(f"Offset {offset} is behind the stream position {self.position}")
+        while self.position + len(self.buffer) < offset + length:
+            block = next(self.blocks, None)
+            if block is None:
+                break
+            self.buffer += block
+            if self.position + len(self.buffer) <= offset:
+                # Nothing wanted in what is buffered yet; drop it
+                self.position += len(self.buffer)
+                self.buffer = b''
+        start = offset - self.position
+        data = self.buffer[start:start + length]
+        self.buffer = self.buffer[start + length:]
+        self.position = offset + length
+        return data
@@ -0,0 +1,151 @@
+import cProfile
+import functools
+import io
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+# cProfile and tracemalloc are process-wide, so only one call is profiled at a time
+_active = threading.Lock()
+_runs = {}
+
+
+def profile_modes():
+    """Profilers enabled by PROFILE_MODE: off (default), cprofile, tracemalloc or both"""
+    mode = os.getenv('PROFILE_MODE', 'off').lower()
+    if mode == 'both':
+        return {'cprofile', 'tracemalloc'}
+    return {name.strip() for name in mode.split(',')} & {'cprofile', 'tracemalloc'}
+
+
+def should_sample(name):
+    """
+    Profile at most PROFILE_MAX_RUNS calls of name per process (default 1), each
+    with probability PROFILE_SAMPLE_RATE (default 0.1), so leaving PROFILE_MODE on
+    in production only profiles the occasional run
+    """
+    if _runs.get(name, 0) >= int(os.getenv('PROFILE_MAX_RUNS', 1)):
+        return False
+    if random.random() >= float(os.getenv('PROFILE_SAMPLE_RATE', 0.1)):
+        return False
+    _runs[name] = _runs.get(name, 0) + 1
+    return True
+
+
+class PeakSnapshots:
+    """
+    Takes a tracemalloc snapshot every PROFILE_SNAPSHOT_SECONDS (default 5) while
+    traced memory is above the last snapshot's, so allocation sites are reported
+    near the peak rather than after everything has been freed
+    """
+
+    def __init__(self):
+        self.interval = float(os.getenv('PROFILE_SNAPSHOT_SECONDS', 5))
+        self.snapshot = None
+        self.size = -1
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        current, _ = tracemalloc.get_traced_memory()
+        if current > self.size:
+            self.snapshot = tracemalloc.take_snapshot()
+            self.size = current
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        self.sample()
+        return self.snapshot, self.size
+
+
+def allocation_report(snapshot, size, top):
+    stats = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    ]).statistics('lineno')
+    lines = [f"Top {top} allocation sites at {size / 1024 / 1024:.1f} MB traced:"]
+    for stat in stats[:top]:
+        lines.append(f"  {stat.size / 1024:.1f} KiB in {stat.count} blocks: {stat.traceback}")
+    return '\n'.join(lines)
+
+
+def write_report(name, report, profiler, log):
+    """Log the report, or write it (and the raw .prof) to PROFILE_DIR and log where"""
+    profile_dir = os.getenv('PROFILE_DIR')
+    if not profile_dir:
+        for line in report.splitlines():
+            log(line)
+        return
+    os.makedirs(profile_dir, exist_ok=True)
+    base = os.path.join(profile_dir, f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}")
+    with open(base + '.txt', 'w', encoding='utf-8') as f:
+        f.write(report)
+    if profiler is not None:
+        profiler.dump_stats(base + '.prof')
+    log(f"Profile of {name} written to {base}.txt")
+
+
+def run_profiled(function, args, kwargs, modes, log):
+    name = function.__name__
+    top = int(os.getenv('PROFILE_TOP', 25))
+    profiler = cProfile.Profile() if 'cprofile' in modes else None
+    snapshots = None
+    if 'tracemalloc' in modes and not tracemalloc.is_tracing():
+        tracemalloc.start(int(os.getenv('PROFILE_TRACEMALLOC_FRAMES', 1)))
+        snapshots = PeakSnapshots()
+
+    log(f"Profiling {name} ({', '.join(sorted(modes))})")
+    start_time = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        sections = [f"Profile of {name}: {time.perf_counter() - start_time:.1f}s"]
+        if profiler is not None:
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(top)
+            sections.append(stream.getvalue())
+        if snapshots is not None:
+            snapshot, size = snapshots.stop()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            sections.append(f"Peak traced memory: {peak / 1024 / 1024:.1f} MB")
+            sections.append(allocation_report(snapshot, size, top))
+        write_report(name, '\n'.join(sections), profiler, log)
+
+
+def profiled(log):
+    """
+    Decorator that profiles sampled calls when PROFILE_MODE is set, reporting the
+    top PROFILE_TOP functions by cumulative time and/or allocation sites through
+    log (or to PROFILE_DIR). cProfile sees only the calling thread; tracemalloc
+    sees every thread. Calls made while another call is profiled run unprofiled.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            modes = profile_modes()
+            if not modes or not _active.acquire(blocking=False):
+                return function(*args, **kwargs)
+            if not should_sample(function.__name__):
+                _active.release()
+                return function(*args, **kwargs)
+            try:
+                return run_profiled(function, args, kwargs, modes, log)
+            finally:
+                _active.release()
+        return wrapper
+    return decorator
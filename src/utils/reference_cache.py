@@ -0,0 +1,113 @@
+import os
+import pickle
+import threading
+import time
+
+# Cheap server-side change markers. 'checksum' catches in-place updates for
+# the price of scanning a small table; 'count' reads partition metadata only
+# and notices inserts and deletes.
+VERSION_QUERIES = {
+    'checksum': "SELECT COUNT_BIG(*), CHECKSUM_AGG(BINARY_CHECKSUM(*)) FROM [dbo].[{table}]",
+    'count': """SELECT SUM(row_count), NULL FROM sys.dm_db_partition_stats
+                WHERE object_id = OBJECT_ID('dbo.{table}') AND index_id IN (0, 1)""",
+}
+
+
+class ReferenceCache:
+    """
+    Small, rarely changing tables kept loaded between runs.
+
+    get() stamps what it loads with the table's version (VERSION_QUERIES,
+    picked by REFERENCE_CACHE_VERSION) and serves it again while the version
+    still matches, checking at most every REFERENCE_CACHE_CHECK_SECONDS.
+    Held in memory, so a warm Lambda container keeps it between invocations;
+    with REFERENCE_CACHE_DIR set, entries are also pickled there for the next
+    process. Hits and misses per table are counted for summary().
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.getenv('REFERENCE_CACHE_DIR') or None
+        self.mode = os.getenv('REFERENCE_CACHE_VERSION', 'checksum')
+        if self.mode not in VERSION_QUERIES:
+            raise ValueError(f"REFERENCE_CACHE_VERSION must be one of {', '.join(VERSION_QUERIES)}")
+        self.check_seconds = float(os.getenv('REFERENCE_CACHE_CHECK_SECONDS', 60))
+        self.entries = {}
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def version(self, conn, table):
+        cursor = conn.cursor()
+        try:
+            cursor.execute(VERSION_QUERIES[self.mode].format(table=table))
+            row = cursor.fetchone()
+            return tuple(row) if row is not None else None
+        finally:
+            cursor.close()
+
+    def path(self, table):
+        return os.path.join(self.directory, f"{table}.reference.pickle")
+
+    def read_file(self, table):
+        if not self.directory or not os.path.exists(self.path(table)):
+            return None
+        try:
+            with open(self.path(table), 'rb') as f:
+                entry = pickle.load(f)
+        except Exception:
+            return None  # a torn or stale-format file is just a miss
+        entry['checked'] = None  # another process's check says nothing about now
+        return entry
+
+    def write_file(self, table, entry):
+        if not self.directory:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.path(table) + '.tmp', 'wb') as f:
+                pickle.dump({'version': entry['version'], 'value': entry['value']}, f)
+            os.replace(self.path(table) + '.tmp', self.path(table))
+        except OSError:
+            pass  # the in-memory entry still serves this process
+
+    def get(self, conn, table, load):
+        """table's cached value, or load()'s result when it isn't cached or the table's version changed"""
+        with self.lock:
+            stats = self.stats.setdefault(table, {'hits': 0, 'misses': 0})
+            entry = self.entries.get(table) or self.read_file(table)
+            now = time.monotonic()
+            if entry is not None and entry['checked'] is not None and now - entry['checked'] < self.check_seconds:
+                stats['hits'] += 1
+                return entry['value']
+
+            version = self.version(conn, table)
+            if entry is not None and version is not None and entry['version'] == version:
+                entry['checked'] = now
+                self.entries[table] = entry
+                stats['hits'] += 1
+                return entry['value']
+
+            # Stamped with the version read before loading, so a change made
+            # in between is picked up by the next check rather than hidden
+            entry = {'version': version, 'value': load(), 'checked': now}
+            self.entries[table] = entry
+            self.write_file(table, entry)
+            stats['misses'] += 1
+            return entry['value']
+
+    def invalidate(self, table):
+        """Drop table's entry, e.g. after writing to the table"""
+        with self.lock:
+            self.entries.pop(table, None)
+            if self.directory and os.path.exists(self.path(table)):
+                os.remove(self.path(table))
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {}
+
+    def summary(self):
+        """One line of hits, lookups and hit rate per table"""
+        with self.lock:
+            return ', '.join(f"{table} {stats['hits']}/{stats['hits'] + stats['misses']} hits "
+                             f"({stats['hits'] / (stats['hits'] + stats['misses']):.0%})"
+                             for table, stats in self.stats.items()) or 'no lookups'
@@ -0,0 +1,132 @@
+import heapq
+import itertools
+import random
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# Statuses retrying won't change within a run; NBA.com answers 404 for a game
+# that hasn't been played yet. Everything else (429, 5xx, 403 from the CDN,
+# timeouts, cut connections) is treated as transient.
+PERMANENT_STATUSES = {400, 404, 405, 410, 422, 501}
+
+
+def is_permanent(status_code):
+    return status_code in PERMANENT_STATUSES
+
+
+def retry_after_seconds(value, now=None):
+    """Seconds a Retry-After header asks for (delta-seconds or HTTP-date), or None if absent or unreadable"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - (now or datetime.now(timezone.utc))).total_seconds())
+
+
+class RetryScheduler:
+    """
+    Hands out keys to attempt, each on its own retry schedule.
+
+    A transient failure puts the key back after exponential backoff with full
+    jitter (uniform in [0, min(max_delay, base_delay * 2**(attempt - 1))]), or
+    after Retry-After when that is longer; Retry-After also holds every other
+    key, since throttling applies to the whole host. A permanent failure, or
+    running out of max_attempts, drops the key. Consecutive attempts are at
+    least min_interval apart. With time_left (a callable returning remaining
+    milliseconds, like a Lambda context's get_remaining_time_in_millis), next()
+    stops handing out keys once waiting for the next one would eat into the
+    last reserve seconds.
+    """
+
+    def __init__(self, keys, max_attempts=3, base_delay=5.0, max_delay=60.0, min_interval=0.0,
+                 time_left=None, reserve=0.0, rng=None, clock=time.monotonic, sleep=time.sleep):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.min_interval = min_interval
+        self.time_left = time_left
+        self.reserve = reserve
+        self.rng = rng or random.Random()
+        self.clock = clock
+        self.sleep = sleep
+        self.sequence = itertools.count()
+        now = clock()
+        self.queue = [(now, next(self.sequence), key) for key in keys]
+        heapq.heapify(self.queue)
+        self.attempts = Counter()
+        self.done = set()
+        self.permanent = {}
+        self.exhausted = {}
+        self.out_of_time = set()
+        self.hold_until = now
+        self.last_attempt = None
+
+    def budget(self):
+        """Seconds left before the reserve, or None without a time limit"""
+        if self.time_left is None:
+            return None
+        return self.time_left() / 1000 - self.reserve
+
+    def request_timeout(self, default):
+        """default, shortened so a single request can't run past the budget"""
+        budget = self.budget()
+        return default if budget is None else max(0.1, min(default, budget))
+
+    def next(self):
+        """Wait until the next key is due and return it; None once nothing is left or time has run out"""
+        if not self.queue:
+            return None
+        ready = max(self.queue[0][0], self.hold_until)
+        if self.last_attempt is not None:
+            ready = max(ready, self.last_attempt + self.min_interval)
+        wait = max(0.0, ready - self.clock())
+        budget = self.budget()
+        if budget is not None and wait >= budget:
+            self.out_of_time.update(key for _, _, key in self.queue)
+            self.queue = []
+            return None
+        if wait:
+            self.sleep(wait)
+        _, _, key = heapq.heappop(self.queue)
+        self.attempts[key] += 1
+        self.last_attempt = self.clock()
+        return key
+
+    def succeeded(self, key):
+        self.done.add(key)
+
+    def failed(self, key, reason, permanent=False, retry_after=None):
+        """Record a failed attempt and reschedule key unless it is permanent or out of attempts"""
+        if permanent:
+            self.permanent[key] = reason
+            return
+        if self.attempts[key] >= self.max_attempts:
+            self.exhausted[key] = reason
+            return
+        if retry_after is not None and retry_after > self.max_delay:
+            self.exhausted[key] = f"{reason}, Retry-After {retry_after:.0f}s exceeds {self.max_delay:.0f}s"
+            return
+        delay = self.rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** (self.attempts[key] - 1)))
+        now = self.clock()
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+            self.hold_until = max(self.hold_until, now + retry_after)
+        heapq.heappush(self.queue, (now + delay, next(self.sequence), key))
+
+    def summary(self):
+        return {
+            'succeeded': len(self.done),
+            'permanent': len(self.permanent),
+            'exhausted': len(self.exhausted),
+            'out_of_time': len(self.out_of_time),
+            'attempts': sum(self.attempts.values()),
+        }
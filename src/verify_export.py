@@ -0,0 +1,233 @@
+"""
+Verify exported CSVs against the database and re-export only what differs.
+
+Run from the directory export_tables.py wrote to:
+    python src/verify_export.py
+
+Every metadata/<name>.csv.partitions.json there is checked partition by partition:
+  - the partition's bytes on disk must still hash to the recorded SHA-256,
+  - the rows written must match the server count recorded at export time, and
+  - the server's COUNT and CHECKSUM_AGG for the partition must be unchanged.
+Game days added since the export become new partitions. When anything
+differs the CSV is rebuilt, copying verified partitions byte for byte and
+re-querying only the rest; whole tables are re-exported, since they have
+no date to partition on. VERIFY_REPAIR=0 only reports.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import pandas as pd
+from utils.db_utils import get_db_connection
+from utils.metrics import get_logger
+from utils.csv_index import index_path
+from utils.export_manifest import PartitionManifest, load_partitions, partitions_path
+from utils.output_writer import (METADATA_DIR, SequentialReader, data_directory, find_output_manifest,
+                                 open_output, stream_volumes)
+from export_tables import (build_view_query, export_regular_table, gameteams_table, get_date_histogram,
+                           get_table_stats, read_hint, window_day_stats, write_window)
+
+STAGING_DIR = 'verify_staging'
+
+
+logger = get_logger('nba_verify.log')
+
+def log_message(message):
+    logger.info(message)
+
+
+def open_existing(csv_path):
+    """Sequential reader over the CSV as exported, or None if its output is missing"""
+    output_manifest = find_output_manifest(csv_path)
+    if output_manifest is None:
+        return None
+    return SequentialReader(stream_volumes(output_manifest))
+
+
+def check_file(csv_path, manifest):
+    """Return the indexes of partitions whose bytes on disk are missing or changed"""
+    partitions = manifest['partitions']
+    reader = open_existing(csv_path)
+    if reader is None or manifest['header'] is None:
+        return set(range(len(partitions)))
+    bad = set()
+    try:
+        header = reader.read_at(0, manifest['header']['bytes'])
+        if hashlib.sha256(header).hexdigest() != manifest['header']['sha256']:
+            return set(range(len(partitions)))
+        for index, partition in enumerate(partitions):
+            data = reader.read_at(partition['offset'], partition['bytes'])
+            if hashlib.sha256(data).hexdigest() != partition['sha256']:
+                bad.add(index)
+    except ValueError as e:
+        log_message(f"{csv_path}: {str(e)}")
+        return set(range(len(partitions)))
+    return bad
+
+
+def partition_ok(partition, current, file_bad):
+    """A partition is current when its bytes, its row count and the server's stats all still agree"""
+    expected_rows = sum(count for count, _ in partition['server'].values())
+    return not file_bad and partition['rows'] == expected_rows and current == partition['server']
+
+
+def plan_view(conn, manifest, bad_files):
+    """
+    Return the rebuilt CSV's partitions newest first: each has its date bounds,
+    the server's current stats for them and the verified partition to copy, or
+    None when the range must be re-queried from the server
+    """
+    histogram = get_date_histogram(conn, manifest['source'])
+    plan = []
+    covered = set()
+    for index, partition in enumerate(manifest['partitions']):
+        lower = pd.Timestamp(partition['lower'])
+        upper = pd.Timestamp(partition['upper'])
+        current = window_day_stats(histogram, lower, upper)
+        covered.update(current)
+        ok = partition_ok(partition, current, index in bad_files)
+        plan.append({'lower': partition['lower'], 'upper': partition['upper'],
+                     'partition': partition if ok else None, 'server': current, 'new': False})
+
+    # Days on the server outside every exported partition, e.g. games loaded since
+    for day in histogram['gameDay']:
+        day_str = day.strftime('%Y-%m-%d')
+        if day_str not in covered:
+            upper = day + pd.Timedelta(days=1)
+            plan.append({'lower': day_str, 'upper': upper.strftime('%Y-%m-%d'), 'partition': None,
+                         'server': window_day_stats(histogram, day, upper), 'new': True})
+    plan.sort(key=lambda item: item['lower'], reverse=True)
+
+    # Neighbouring new days have no exported partition between them; query them together
+    merged = []
+    for item in plan:
+        if merged and merged[-1]['new'] and item['new']:
+            merged[-1]['lower'] = item['lower']
+            merged[-1]['server'].update(item['server'])
+        else:
+            merged.append(item)
+    return merged
+
+
+def rebuild_view(conn, csv_path, manifest, plan):
+    """Write a new CSV from plan in the staging directory and swap it in"""
+    hint = read_hint()
+    gameteams_source = gameteams_table()
+    os.makedirs(STAGING_DIR, exist_ok=True)
+    out = open_output(os.path.join(STAGING_DIR, os.path.basename(csv_path)))
+    rebuilt = PartitionManifest(out, manifest['source'], 'view')
+    reader = open_existing(csv_path)
+    try:
+        empty = pd.read_sql(build_view_query(manifest['source'], '1900-01-01', '1900-01-01',
+                                             hint, gameteams_source), conn)
+        rebuilt.write_header(empty.head(0).to_csv(index=False))
+        for item in plan:
+            partition = item['partition']
+            if partition is not None:
+                rebuilt.copy_partition(partition, reader.read_at(partition['offset'], partition['bytes']))
+            else:
+                query = build_view_query(manifest['source'], item['lower'], item['upper'],
+                                         hint, gameteams_source)
+                chunk_df = pd.read_sql(query, conn)
+                write_window(rebuilt, chunk_df, item['lower'], item['upper'], item['server'])
+                log_message(f"{manifest['file']}: re-exported {item['upper']} to {item['lower']}, "
+                            f"{len(chunk_df)} rows")
+        out.close()
+        rebuilt.save()
+    except Exception:
+        out.close()
+        shutil.rmtree(STAGING_DIR, ignore_errors=True)
+        raise
+
+    remove_output(csv_path)
+    directory = os.path.dirname(csv_path)
+    for name in os.listdir(STAGING_DIR):
+        if name != METADATA_DIR:
+            os.replace(os.path.join(STAGING_DIR, name), os.path.join(directory, name))
+    os.makedirs(os.path.join(directory, METADATA_DIR), exist_ok=True)
+    for name in os.listdir(os.path.join(STAGING_DIR, METADATA_DIR)):
+        os.replace(os.path.join(STAGING_DIR, METADATA_DIR, name), os.path.join(directory, METADATA_DIR, name))
+    shutil.rmtree(STAGING_DIR)
+    return rebuilt.rows
+
+
+def remove_output(csv_path):
+    """Delete every file of a previous export of csv_path: volumes, output manifest, partitions and index"""
+    output_manifest = find_output_manifest(csv_path)
+    if output_manifest is not None:
+        directory = data_directory(output_manifest)
+        with open(output_manifest, encoding='utf-8') as f:
+            for volume in json.load(f)['volumes']:
+                path = os.path.join(directory, volume['file'])
+                if os.path.exists(path):
+                    os.remove(path)
+        os.remove(output_manifest)
+    for path in (partitions_path(csv_path), index_path(csv_path)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def verify_file(conn, csv_path, repair):
+    """Verify one exported CSV, repairing it if asked; returns True when it ends up current"""
+    manifest = load_partitions(csv_path)
+    bad_files = check_file(csv_path, manifest)
+
+    if manifest['kind'] == 'table':
+        count, checksum = get_table_stats(conn, manifest['source'])
+        partitions = manifest['partitions']
+        ok = (len(partitions) == 1 and partition_ok(partitions[0], {'table': [count, checksum]}, bool(bad_files))) \
+            or (not partitions and count == 0)
+        if ok:
+            log_message(f"{manifest['file']}: {manifest['rows']} rows verified")
+            return True
+        log_message(f"{manifest['file']}: table changed or export incomplete")
+        if not repair:
+            return False
+        remove_output(csv_path)
+        return export_regular_table(conn, manifest['source'])
+
+    plan = plan_view(conn, manifest, bad_files)
+    stale = [item for item in plan if item['partition'] is None]
+    if not stale:
+        log_message(f"{manifest['file']}: {manifest['rows']} rows in "
+                    f"{len(plan)} partitions verified")
+        return True
+    log_message(f"{manifest['file']}: {len(stale)} of {len(plan)} partitions need re-export")
+    if not repair:
+        return False
+    rows = rebuild_view(conn, csv_path, manifest, plan)
+    log_message(f"{manifest['file']}: rebuilt with {rows} rows")
+    return True
+
+
+def main():
+    repair = os.getenv('VERIFY_REPAIR', '1') == '1'
+    csv_paths = sorted(name[:-len('.partitions.json')]
+                       for name in (os.listdir(METADATA_DIR) if os.path.isdir(METADATA_DIR) else [])
+                       if name.endswith('.csv.partitions.json'))
+    if not csv_paths:
+        log_message("No export manifests found")
+        sys.exit(1)
+
+    conn = get_db_connection()
+    try:
+        results = {}
+        for csv_path in csv_paths:
+            try:
+                results[csv_path] = verify_file(conn, csv_path, repair)
+            except Exception as e:
+                log_message(f"{csv_path}: verification failed: {str(e)}")
+                results[csv_path] = False
+    finally:
+        conn.close()
+
+    failed = [csv_path for csv_path, ok in results.items() if not ok]
+    if failed:
+        log_message(f"Not current: {', '.join(failed)}")
+        sys.exit(1)
+    log_message(f"All {len(results)} exports current")
+
+
+if __name__ == "__main__":
+    main()